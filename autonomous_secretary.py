@@ -1,21 +1,60 @@
 import os
 import asyncio
+import hashlib
+import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 from crewai import Agent, Crew, Task, Process
 from dotenv import load_dotenv
+from context_builder import (
+    ContextBuilder, Section, describe_usage, format_conversation,
+    format_insight, format_pattern, format_routine, format_task
+)
+from crew_pool import CrewPool, CrewCancelled, CrewRun
+from decision import Decision, merge_decisions, parse_decision
+from intent_router import IntentRouter
 from memory_store import MemoryStore, TaskStatus, TaskType
+from response_cache import ResponseCache
+from sqlite_memory_store import SQLiteMemoryStore
 from tools.gmail_tool import GmailTool
 from tools.gmail_read_tool import GmailReadTool, CheckEmailResponsesTool
 from tools.calendar_tool import GoogleCalendarTool, ListCalendarEventsTool
 from tools.weather_tool import WeatherTool
+from tools.change_markers import mail_marker, calendar_marker
+from tools.google_auth import credential_manager
 
 load_dotenv()
 
 class AutonomousSecretary:
     def __init__(self, telegram_chat_id: Optional[str] = None):
-        self.memory = MemoryStore()
+        # Load configuration
+        self.followup_hours = int(os.getenv('FOLLOWUP_HOURS', '24'))
+        self.enable_routines = os.getenv('ENABLE_ROUTINES', 'True').lower() == 'true'
+        self.enable_learning = os.getenv('ENABLE_LEARNING', 'True').lower() == 'true'
+        self.enable_fast_path = os.getenv('ENABLE_FAST_PATH', 'True').lower() == 'true'
+        
+        retention = {
+            "task_retention_days": float(os.getenv('TASK_RETENTION_DAYS', '30')),
+            "max_completed_tasks": int(os.getenv('MAX_COMPLETED_TASKS', '1000'))
+        }
+        
+        if os.getenv('MEMORY_BACKEND', 'json').lower() == 'sqlite':
+            self.memory = SQLiteMemoryStore(
+                os.getenv('MEMORY_DB_PATH', 'secretary_memory.db'),
+                default_followup_hours=self.followup_hours,
+                **retention
+            )
+        else:
+            self.memory = MemoryStore(
+                journal=os.getenv('MEMORY_JOURNAL', 'False').lower() == 'true',
+                compact_every=int(os.getenv('MEMORY_COMPACT_EVERY', '500')),
+                default_followup_hours=self.followup_hours,
+                flush_interval=float(os.getenv('MEMORY_FLUSH_SECONDS', '0')),
+                codec=os.getenv('MEMORY_CODEC', 'json'),
+                **retention
+            )
         self.telegram_chat_id = telegram_chat_id
         self.gmail_tool = GmailTool()
         self.gmail_read_tool = GmailReadTool()
@@ -24,109 +63,143 @@ class AutonomousSecretary:
         self.list_events_tool = ListCalendarEventsTool()
         self.weather_tool = WeatherTool()
         self.last_proactive_check = datetime.now()
+        self.last_retention_run = datetime.min
+        # Greetings and memory lookups are answered without the LLM
+        self.intent_router = IntentRouter(self.memory)
+        # Prompt context is rendered compactly within a token budget
+        self.context_builder = ContextBuilder(int(os.getenv('CONTEXT_MAX_TOKENS', '1500')))
+        # Repeated routine runs reuse the last answer while mail and calendar are unchanged
+        self.response_cache = ResponseCache({
+            "routine": float(os.getenv('ROUTINE_CACHE_TTL_SECONDS', '3600')),
+            "chat": float(os.getenv('CHAT_CACHE_TTL_SECONDS', '0'))
+        })
         
-        # Load configuration
-        self.followup_hours = int(os.getenv('FOLLOWUP_HOURS', '24'))
-        self.enable_routines = os.getenv('ENABLE_ROUTINES', 'True').lower() == 'true'
-        self.enable_learning = os.getenv('ENABLE_LEARNING', 'True').lower() == 'true'
+        # Agents are built once (tool bindings and LLM clients included) and
+        # each workflow keeps a pool of ready crews built from them
+        self._agents: Dict[str, Agent] = {}
+        self.crews = {
+            "think": CrewPool("think", self._build_think_crew),
+            "monitor": CrewPool("monitor", self._build_monitor_crew),
+            "execute": CrewPool("execute", self._build_execute_crew),
+            "chat": CrewPool("chat", self._build_chat_crew)
+        }
         
-    def thinking_agent(self) -> Agent:
-        return Agent(
-            role='Strategic Thinking Secretary',
-            goal='Continuously analyze situations, identify needed actions, and make proactive decisions',
-            backstory="""You are an intelligent secretary with the ability to think ahead and anticipate needs.
-            You analyze patterns, remember past interactions, and proactively take actions to help.
-            You can identify when follow-ups are needed, when reminders should be sent, and when to check on pending tasks.
-            You think like a human assistant would - considering context, timing, and relationships.""",
-            verbose=True,
-            allow_delegation=True,
-            max_iter=5
+        # Crews run on a bounded thread pool so a slow LLM call never blocks
+        # the bot's event loop; runs past the timeout are cancelled
+        self.crew_timeout = float(os.getenv('CREW_TIMEOUT_SECONDS', '60'))
+        self._crew_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CREW_MAX_CONCURRENCY', '4')),
+            thread_name_prefix="crew"
         )
+        self._active_runs: Set[CrewRun] = set()
+        self.thinking_timeout = float(os.getenv('THINKING_TIMEOUT_SECONDS', str(self.crew_timeout)))
+        self.monitoring_timeout = float(os.getenv('MONITORING_TIMEOUT_SECONDS', str(self.crew_timeout)))
+        
+        # Thinking cycles are skipped while their inputs are unchanged, but
+        # never more than max_skipped_cycles in a row (0 disables skipping)
+        self.max_skipped_cycles = int(os.getenv('MAX_SKIPPED_CYCLES', '10'))
+        self._last_fingerprint: Optional[str] = None
+        self.skipped_cycles = 0
+        
+    def thinking_agent(self) -> Agent:
+        if "thinking" not in self._agents:
+            self._agents["thinking"] = Agent(
+                role='Strategic Thinking Secretary',
+                goal='Continuously analyze situations, identify needed actions, and make proactive decisions',
+                backstory="""You are an intelligent secretary with the ability to think ahead and anticipate needs.
+                You analyze patterns, remember past interactions, and proactively take actions to help.
+                You can identify when follow-ups are needed, when reminders should be sent, and when to check on pending tasks.
+                You think like a human assistant would - considering context, timing, and relationships.""",
+                verbose=True,
+                allow_delegation=True,
+                max_iter=5
+            )
+        return self._agents["thinking"]
     
     def execution_agent(self) -> Agent:
-        return Agent(
-            role='Task Execution Specialist',
-            goal='Execute tasks efficiently based on strategic decisions',
-            backstory="""You execute tasks with precision. You handle emails, calendar events, 
-            and other actions. You report back on success or failure of tasks.""",
-            tools=[
-                self.gmail_tool,
-                self.gmail_read_tool,
-                self.check_responses_tool,
-                self.calendar_tool,
-                self.list_events_tool,
-                self.weather_tool
-            ],
-            verbose=True,
-            allow_delegation=False
-        )
+        if "execution" not in self._agents:
+            self._agents["execution"] = Agent(
+                role='Task Execution Specialist',
+                goal='Execute tasks efficiently based on strategic decisions',
+                backstory="""You execute tasks with precision. You handle emails, calendar events, 
+                and other actions. You report back on success or failure of tasks.""",
+                tools=[
+                    self.gmail_tool,
+                    self.gmail_read_tool,
+                    self.check_responses_tool,
+                    self.calendar_tool,
+                    self.list_events_tool,
+                    self.weather_tool
+                ],
+                verbose=True,
+                allow_delegation=False
+            )
+        return self._agents["execution"]
     
     def monitoring_agent(self) -> Agent:
-        return Agent(
-            role='Task Monitor',
-            goal='Monitor ongoing tasks and identify what needs attention',
-            backstory="""You continuously monitor all ongoing tasks, check for responses, 
-            track deadlines, and identify when intervention is needed. You're like a radar 
-            system that never misses anything important.""",
-            tools=[
-                self.gmail_read_tool,
-                self.check_responses_tool,
-                self.list_events_tool
-            ],
-            verbose=True,
-            allow_delegation=False
-        )
+        if "monitoring" not in self._agents:
+            self._agents["monitoring"] = Agent(
+                role='Task Monitor',
+                goal='Monitor ongoing tasks and identify what needs attention',
+                backstory="""You continuously monitor all ongoing tasks, check for responses, 
+                track deadlines, and identify when intervention is needed. You're like a radar 
+                system that never misses anything important.""",
+                tools=[
+                    self.gmail_read_tool,
+                    self.check_responses_tool,
+                    self.list_events_tool
+                ],
+                verbose=True,
+                allow_delegation=False
+            )
+        return self._agents["monitoring"]
     
-    async def think_and_act(self) -> Dict:
-        """
-        Main autonomous thinking process that decides what to do next
-        """
-        # Get current context
-        pending_tasks = self.memory.get_pending_tasks()
-        followup_tasks = self.memory.get_tasks_requiring_followup(self.followup_hours)
-        due_routines = self.memory.get_due_routines() if self.enable_routines else []
-        
-        # Build context for decision making
-        context = {
-            "current_time": datetime.now().isoformat(),
-            "pending_tasks": pending_tasks,
-            "tasks_needing_followup": followup_tasks,
-            "due_routines": due_routines,
-            "recent_insights": self.memory.memory.get("insights", [])[-5:]
-        }
-        
-        # Create thinking task
+    def _build_think_crew(self) -> Crew:
         thinking_task = Task(
-            description=f"""
+            description="""
             Analyze the current situation and decide what actions to take:
             
+            Current time: {current_time}
+            
             Current Context:
             {context}
             
+            A separate monitoring pass checks email responses, unread mail and the
+            calendar at the same time, so work from the context above.
+            
             Consider:
-            1. Check emails for any responses to pending requests (use Check Email Responses tool)
-            2. Are there any tasks that haven't received responses and need follow-up?
-            3. Are there upcoming calendar events that need preparation?
-            4. Check for new unread emails that might need attention (use Read Gmail tool)
-            5. Are there patterns suggesting routine tasks that should be done?
-            6. Is there anything proactive that would be helpful?
-            7. Should any pending tasks be escalated or modified?
+            1. Are there any tasks that haven't received responses and need follow-up?
+            2. Are there upcoming calendar events that need preparation?
+            3. Are there patterns suggesting routine tasks that should be done?
+            4. Is there anything proactive that would be helpful?
+            5. Should any pending tasks be escalated or modified?
             
             Provide a structured decision about what to do next, including:
-            - Primary action to take (if any)
+            - Whether an action is needed right now (false if nothing needs doing)
+            - Primary action to take (if any) and who or what it targets
             - Reasoning for the action
             - Priority level (high/medium/low)
             - Any follow-up actions needed
             """,
-            expected_output="Structured decision about next actions with reasoning",
-            agent=self.thinking_agent()
+            expected_output="Decision with action_needed, primary_action, targets, priority, reasoning and follow_up_actions",
+            agent=self.thinking_agent(),
+            output_pydantic=Decision
         )
         
+        return Crew(
+            agents=[self.thinking_agent()],
+            tasks=[thinking_task],
+            process=Process.sequential,
+            verbose=True
+        )
+    
+    def _build_monitor_crew(self) -> Crew:
         monitoring_task = Task(
-            description=f"""
+            description="""
             Monitor and check status of all ongoing tasks:
             
-            Pending Tasks: {pending_tasks}
+            Pending Tasks:
+            {pending_tasks}
             
             Actions to take:
             1. Check for email responses from people we're waiting to hear from
@@ -139,68 +212,193 @@ class AutonomousSecretary:
             - Failed tasks that should be retried
             - Patterns of similar requests
             - Opportunities for optimization
+            
+            Report the single most important action, if any, as a decision; list the
+            rest of what needs attention in the reasoning.
+            """,
+            expected_output="Decision with action_needed, primary_action, targets, priority, reasoning and follow_up_actions",
+            agent=self.monitoring_agent(),
+            output_pydantic=Decision
+        )
+        
+        return Crew(
+            agents=[self.monitoring_agent()],
+            tasks=[monitoring_task],
+            process=Process.sequential,
+            verbose=True
+        )
+    
+    def _build_execute_crew(self) -> Crew:
+        execution_task = Task(
+            description="""
+            Execute the following action: {action}
+            
+            Targets: {targets}
+            Context: {reasoning}
+            Priority: {priority}
+            Follow-up actions: {follow_up_actions}
+            
+            Use the appropriate tools to complete this action and report the result.
             """,
-            expected_output="List of tasks requiring attention with recommendations",
-            agent=self.monitoring_agent()
+            expected_output="Confirmation of action completion with details",
+            agent=self.execution_agent()
+        )
+        
+        return Crew(
+            agents=[self.execution_agent()],
+            tasks=[execution_task],
+            process=Process.sequential,
+            verbose=True
+        )
+    
+    def _build_chat_crew(self) -> Crew:
+        process_task = Task(
+            description="""
+            Process this message from the user: {message}
+            
+            User context:
+            {context}
+            
+            Analyze the message and decide:
+            1. Is this a greeting, question, request, or conversation?
+            2. Does it require using tools (email, calendar, weather, etc.)?
+            3. What is the appropriate response?
+            
+            If action is needed, use the available tools to complete it.
+            If it's a question, provide a helpful answer.
+            If it's a greeting or conversation, respond naturally.
+            
+            Remember: You are a virtual secretary. Be helpful, professional, and proactive.
+            """,
+            expected_output="Appropriate response to the user based on the context and request",
+            agent=self.execution_agent()
         )
         
+        return Crew(
+            agents=[self.execution_agent()],
+            tasks=[process_task],
+            process=Process.sequential,
+            verbose=True
+        )
+    
+    async def _kickoff(self, workflow: str, inputs: Dict[str, Any], timeout: Optional[float] = None,
+                       run: Optional[CrewRun] = None) -> Any:
+        """
+        Run a pooled crew on the crew executor. On timeout (or when the caller
+        is cancelled) the run is flagged and stops at its next agent step.
+        """
+        run = run or CrewRun()
+        self._active_runs.add(run)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._crew_executor, self.crews[workflow].kickoff, inputs, run)
+        try:
+            return await asyncio.wait_for(future, timeout or self.crew_timeout)
+        except BaseException:
+            run.cancel()
+            raise
+        finally:
+            self._active_runs.discard(run)
+    
+    def close(self):
+        """
+        Cancel running crews and persist memory
+        """
+        for run in list(self._active_runs):
+            run.cancel()
+        self._crew_executor.shutdown(wait=False, cancel_futures=True)
+        credential_manager.stop()
+        self.memory.close()
+    
+    def _context_fingerprint(self, pending_tasks: List[Dict], followup_tasks: List[Dict], due_routines: List[Dict]) -> str:
+        """
+        Cheap hash of everything a thinking cycle looks at: tasks, due
+        follow-ups and routines, plus mailbox and upcoming-event markers
+        """
+        inputs = {
+            "pending": [(t["task_id"], t.get("status"), t.get("updated_at")) for t in pending_tasks],
+            "followups": [t["task_id"] for t in followup_tasks],
+            "routines": [(r["routine_id"], r.get("next_run_at")) for r in due_routines],
+            "mail": mail_marker(),
+            "events": calendar_marker()
+        }
+        return hashlib.sha256(json.dumps(inputs, default=str).encode('utf-8')).hexdigest()
+    
+    async def think_and_act(self) -> Dict:
+        """
+        Main autonomous thinking process that decides what to do next
+        """
+        # Get current context
+        pending_tasks = self.memory.get_pending_tasks()
+        followup_tasks = self.memory.get_tasks_requiring_followup(self.followup_hours)
+        due_routines = self.memory.get_due_routines() if self.enable_routines else []
+        
+        # Skip the crew when nothing changed since the last cycle
+        fingerprint = None
+        if self.max_skipped_cycles > 0:
+            fingerprint = await asyncio.to_thread(self._context_fingerprint, pending_tasks, followup_tasks, due_routines)
+            if fingerprint == self._last_fingerprint and self.skipped_cycles < self.max_skipped_cycles:
+                self.skipped_cycles += 1
+                return {"action_needed": False, "skipped": True}
+        
+        # Build context for decision making; follow-ups are listed once,
+        # and the newest tasks are kept first when the budget runs out
+        followup_ids = {task["task_id"] for task in followup_tasks}
+        newest_pending = [format_task(task) for task in reversed(pending_tasks)]
+        context = self._build_context("thinking", [
+            Section("Tasks needing follow-up", [format_task(task) for task in followup_tasks], weight=3),
+            Section("Due routines", [format_routine(routine) for routine in due_routines], weight=2),
+            Section("Pending tasks", [
+                format_task(task) for task in reversed(pending_tasks) if task["task_id"] not in followup_ids
+            ], weight=3),
+            Section("Recent insights", [format_insight(insight) for insight in reversed(self.memory.get_insights(5))])
+        ])
+        monitoring_context = self._build_context("monitoring", [Section("Pending tasks", newest_pending)])
+        
         try:
-            crew = Crew(
-                agents=[self.thinking_agent(), self.monitoring_agent()],
-                tasks=[thinking_task, monitoring_task],
-                process=Process.sequential,
-                verbose=True
+            # Monitoring does not need the thinking output, so both branches
+            # run at once, each with its own timeout
+            thinking, monitoring = await asyncio.gather(
+                self._kickoff("think", {
+                    "current_time": datetime.now().strftime('%Y-%m-%d %H:%M (%A)'),
+                    "context": context
+                }, timeout=self.thinking_timeout),
+                self._kickoff("monitor", {"pending_tasks": monitoring_context}, timeout=self.monitoring_timeout),
+                return_exceptions=True
             )
+            failed = [branch for branch in (thinking, monitoring) if isinstance(branch, BaseException)]
+            if len(failed) == 2:
+                raise failed[0]
+            for branch_name, branch in (("thinking", thinking), ("monitoring", monitoring)):
+                if isinstance(branch, BaseException):
+                    print(f"⚠️ {branch_name.capitalize()} branch failed: {branch!r}")
             
-            result = crew.kickoff()
+            # Only a completed cycle counts as having seen this context
+            if not failed:
+                self._last_fingerprint = fingerprint
+                self.skipped_cycles = 0
             
             # Parse and execute decisions
-            decision = self._parse_decision(str(result))
+            decision = self._parse_decision(thinking, monitoring)
             
             if decision.get("action_needed"):
                 await self._execute_decision(decision)
             
             return decision
             
-        except Exception as e:
+        except (Exception, CrewCancelled) as e:
             return {"error": str(e), "action_needed": False}
     
-    def _parse_decision(self, result: str) -> Dict:
+    def _build_context(self, workflow: str, sections: List[Section]) -> str:
+        context, usage = self.context_builder.build(sections)
+        print(f"📏 {workflow.capitalize()} context: {describe_usage(usage, self.context_builder.max_tokens)}")
+        return context
+    
+    def _parse_decision(self, *results: Any) -> Dict:
         """
-        Parse the AI's decision into actionable items
+        Merge the structured decisions of the branches that finished
         """
-        # This is a simplified parser - in production, you'd want more sophisticated parsing
-        decision = {
-            "action_needed": False,
-            "primary_action": None,
-            "priority": "medium",
-            "reasoning": result,
-            "follow_up_actions": []
-        }
-        
-        result_lower = result.lower()
-        
-        # Detect if action is needed
-        if any(keyword in result_lower for keyword in ["send", "schedule", "remind", "follow up", "check", "create"]):
-            decision["action_needed"] = True
-            
-            # Determine action type
-            if "follow up" in result_lower or "follow-up" in result_lower or "reminder" in result_lower:
-                decision["primary_action"] = "send_followup"
-            elif "schedule" in result_lower or "calendar" in result_lower:
-                decision["primary_action"] = "schedule_event"
-            elif "email" in result_lower or "send" in result_lower:
-                decision["primary_action"] = "send_email"
-            elif "check" in result_lower and "weather" in result_lower:
-                decision["primary_action"] = "check_weather"
-            
-            # Determine priority
-            if "urgent" in result_lower or "immediately" in result_lower or "asap" in result_lower:
-                decision["priority"] = "high"
-            elif "low priority" in result_lower or "when possible" in result_lower:
-                decision["priority"] = "low"
-        
-        return decision
+        decisions = [parse_decision(result) for result in results if not isinstance(result, BaseException)]
+        return merge_decisions(*decisions).model_dump()
     
     async def _execute_decision(self, decision: Dict) -> Dict:
         """
@@ -211,28 +409,14 @@ class AutonomousSecretary:
         if not action:
             return {"status": "no_action"}
         
-        execution_task = Task(
-            description=f"""
-            Execute the following action: {action}
-            
-            Context: {decision.get('reasoning', '')}
-            Priority: {decision.get('priority', 'medium')}
-            
-            Use the appropriate tools to complete this action and report the result.
-            """,
-            expected_output="Confirmation of action completion with details",
-            agent=self.execution_agent()
-        )
-        
         try:
-            crew = Crew(
-                agents=[self.execution_agent()],
-                tasks=[execution_task],
-                process=Process.sequential,
-                verbose=True
-            )
-            
-            result = crew.kickoff()
+            result = await self._kickoff("execute", {
+                "action": action,
+                "targets": ", ".join(decision.get('targets', [])) or "not specified",
+                "reasoning": decision.get('reasoning', ''),
+                "priority": decision.get('priority', 'medium'),
+                "follow_up_actions": "; ".join(decision.get('follow_up_actions', [])) or "none"
+            })
             
             # Log the execution
             task_id = str(uuid.uuid4())
@@ -245,64 +429,77 @@ class AutonomousSecretary:
             
             return {"status": "completed", "result": str(result)}
             
-        except Exception as e:
+        except (Exception, CrewCancelled) as e:
             return {"status": "failed", "error": str(e)}
     
-    async def process_user_message(self, user_id: str, message: str) -> str:
+    @staticmethod
+    def _tool_state() -> str:
+        """
+        Markers for what read-only tools would see; a change invalidates cached answers
+        """
+        return f"{datetime.now().date()}|{mail_marker()}|{calendar_marker()}"
+    
+    async def process_user_message(self, user_id: str, message: str, workflow: str = "chat",
+                                   on_progress: Optional[Callable[[str], None]] = None) -> str:
         """
-        Process a message from a user and respond
+        Process a message from a user (or a routine, with workflow="routine") and respond.
+        `on_progress` receives a description of each agent step while the crew works.
         """
         try:
+            if self.enable_fast_path:
+                reply = self.intent_router.route(user_id, message)
+                if reply is not None:
+                    self.memory.add_conversation(user_id, message, reply)
+                    return reply
+            
+            cache_key = None
+            if self.response_cache.enabled(workflow):
+                # Chat answers depend on the conversation so far; routine answers do not
+                prompt = message if workflow == "routine" else f"{user_id}\n{message}"
+                cache_key = self.response_cache.make_key(workflow, prompt, await asyncio.to_thread(self._tool_state))
+                cached = self.response_cache.get(workflow, cache_key)
+                if cached is not None:
+                    self.memory.add_conversation(user_id, message, cached)
+                    return cached
+            
             # Get user context
             user_context = self.memory.get_user_context(user_id)
             
             # Let the AI decide what to do with EVERY message
-            process_task = Task(
-                description=f"""
-                Process this message from the user: {message}
-                
-                User context:
-                - Recent conversations: {user_context.get('conversations', [])}
-                - Known preferences: {user_context.get('preferences', {})}
-                - Pending tasks: {self.memory.get_pending_tasks()}
-                
-                Analyze the message and decide:
-                1. Is this a greeting, question, request, or conversation?
-                2. Does it require using tools (email, calendar, weather, etc.)?
-                3. What is the appropriate response?
-                
-                If action is needed, use the available tools to complete it.
-                If it's a question, provide a helpful answer.
-                If it's a greeting or conversation, respond naturally.
-                
-                Remember: You are a virtual secretary. Be helpful, professional, and proactive.
-                """,
-                expected_output="Appropriate response to the user based on the context and request",
-                agent=self.execution_agent()
-            )
-            
-            crew = Crew(
-                agents=[self.execution_agent()],
-                tasks=[process_task],
-                process=Process.sequential,
-                verbose=True
-            )
-            
-            result = crew.kickoff()
+            context = self._build_context("chat", [
+                Section("Recent conversations", [
+                    format_conversation(entry) for entry in reversed(user_context.get('conversations', []))
+                ], weight=3, chronological=True),
+                Section("Known preferences", [
+                    f"{key}: {value}" for key, value in user_context.get('preferences', {}).items()
+                ]),
+                Section("Usage patterns", [
+                    format_pattern(pattern_type, summary) for pattern_type, summary in user_context.get('patterns', {}).items()
+                ]),
+                Section("Pending tasks", [format_task(task) for task in reversed(self.memory.get_pending_tasks())], weight=2)
+            ])
+            run = CrewRun(on_progress)
+            result = await self._kickoff("chat", {"message": message, "context": context}, run=run)
             response = str(result)
+            if cache_key is not None:
+                self.response_cache.put(workflow, cache_key, response, run.tools_used)
             
-            # Store conversation
-            self.memory.add_conversation(user_id, message, response)
-            
-            # Let the AI's response determine if this created a task
-            # The AI will mention if it scheduled something, sent an email, etc.
-            # We can parse the response to understand what was done
-            
-            # Learn from interaction
-            self._learn_from_interaction(user_id, message, response)
+            # Store conversation and learned patterns in a single write
+            with self.memory.batch():
+                self.memory.add_conversation(user_id, message, response)
+                
+                # Let the AI's response determine if this created a task
+                # The AI will mention if it scheduled something, sent an email, etc.
+                # We can parse the response to understand what was done
+                
+                # Learn from interaction
+                self._learn_from_interaction(user_id, message, response)
             
             return response
             
+        except (asyncio.TimeoutError, CrewCancelled):
+            print(f"⏱️ Crew timed out processing message from {user_id}")
+            return "I'm taking longer than expected on this one and had to stop. Please try again, or break the request into smaller steps."
         except Exception as e:
             error_msg = f"I apologize, but I encountered an error processing your message: {str(e)}\n\nPlease try rephrasing your request or type /help for available commands."
             print(f"Error in process_user_message: {e}")
@@ -366,6 +563,19 @@ class AutonomousSecretary:
                 print(f"Error in thinking cycle: {e}")
                 await asyncio.sleep(60)
     
+    def run_maintenance(self) -> Optional[Dict]:
+        """
+        Apply the memory retention policy, at most once an hour
+        """
+        if datetime.now() - self.last_retention_run < timedelta(hours=1):
+            return None
+        
+        self.last_retention_run = datetime.now()
+        result = self.memory.apply_retention()
+        if result.get("archived_tasks"):
+            print(f"🧹 Archived {result['archived_tasks']} old tasks")
+        return result
+    
     def create_routine(self, routine_data: Dict):
         """
         Create a new routine task
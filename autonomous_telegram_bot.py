@@ -5,13 +5,16 @@ import asyncio
 import signal
 import sys
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Set, Optional
 from telegram import Update, Bot
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 from autonomous_secretary import AutonomousSecretary
 from memory_store import TaskType
+from message_dispatcher import MessageDispatcher
+from routine_scheduler import parse_schedule
+from streaming_reply import StreamingReply
 
 load_dotenv()
 
@@ -25,10 +28,19 @@ class AutonomousTelegramBot:
         self.thinking_interval_minutes = int(os.getenv('THINKING_INTERVAL_MINUTES', '3'))
         
         self.secretary: AutonomousSecretary = AutonomousSecretary()
-        self.application: Application = Application.builder().token(self.token).build()
+        self.application: Application = Application.builder().token(self.token).post_shutdown(self._on_shutdown).build()
         self.bot: Bot = Bot(self.token)
         self.thinking_task: Optional[asyncio.Task] = None
         self.admin_chat_ids: Set[int] = set()  # Store admin chat IDs
+        # Messages are queued per user: in order within a chat, in parallel across users
+        self.dispatcher = MessageDispatcher(
+            self._process_message,
+            max_workers=int(os.getenv('MESSAGE_WORKERS', '8')),
+            max_queue_per_user=int(os.getenv('MAX_QUEUED_MESSAGES_PER_USER', '20'))
+        )
+        # Post a placeholder and edit it with the crew's progress while it works
+        self.stream_replies = os.getenv('STREAM_REPLIES', 'true').lower() == 'true'
+        self.stream_edit_interval = float(os.getenv('STREAM_EDIT_INTERVAL_SECONDS', '1.5'))
         self._setup_handlers()
     
     def _setup_handlers(self):
@@ -115,6 +127,11 @@ I understand context and will act accordingly. For example, if you ask me to sen
         pending_tasks = self.secretary.memory.get_pending_tasks()
         followup_tasks = self.secretary.memory.get_tasks_requiring_followup(self.secretary.followup_hours)
         routines = self.secretary.memory.get_due_routines() if self.secretary.enable_routines else []
+        stats = self.secretary.memory.get_stats()
+        queue = self.dispatcher.metrics()
+        cache = self.secretary.response_cache.stats()
+        cache_hits = sum(counters['hits'] for counters in cache.values())
+        cache_misses = sum(counters['misses'] for counters in cache.values())
         
         status_message = f"""
 📊 **Autonomous Secretary Status**
@@ -130,9 +147,18 @@ I understand context and will act accordingly. For example, if you ask me to sen
 • Due Routines: {len(routines)}
 
 **Memory Stats:**
-• Total Tasks: {len(self.secretary.memory.memory['tasks'])}
-• Learned Patterns: {len(self.secretary.memory.memory['patterns'])}
-• Insights: {len(self.secretary.memory.memory['insights'])}
+• Total Tasks: {stats['tasks']}
+• Learned Patterns: {stats['patterns']}
+• Insights: {stats['insights']}
+
+**Message Queue:**
+• Queued: {queue['queued']} ({queue['users_waiting']} users waiting, busiest {queue['busiest_queue']})
+• Processing: {queue['users_running']}/{queue['max_workers']} workers
+• Handled: {queue['processed']} ({queue['failed']} failed, {queue['dropped']} dropped)
+• Avg Wait: {queue['avg_wait_seconds']:.1f}s
+
+**Response Cache:**
+• Hits: {cache_hits} / Misses: {cache_misses}
 
 I'm continuously monitoring and will act when needed.
         """
@@ -159,7 +185,7 @@ I'm continuously monitoring and will act when needed.
         await update.message.reply_text(message, parse_mode='Markdown')
     
     async def show_insights(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        insights = self.secretary.memory.memory.get('insights', [])[-5:]
+        insights = self.secretary.memory.get_insights(5)
         
         if not insights:
             await update.message.reply_text("No insights gathered yet. I'll learn as we interact!")
@@ -173,7 +199,7 @@ I'm continuously monitoring and will act when needed.
         await update.message.reply_text(message, parse_mode='Markdown')
     
     async def manage_routines(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        routines = self.secretary.memory.memory.get('routines', {})
+        routines = self.secretary.memory.get_routines()
         
         if not routines:
             message = "No routines set up yet.\n\nUse /add_routine to create one!"
@@ -183,6 +209,7 @@ I'm continuously monitoring and will act when needed.
                 message += f"• **{routine.get('name', 'Unnamed')}**\n"
                 message += f"  Frequency: {routine.get('frequency', 'Unknown')}\n"
                 message += f"  Last Run: {routine.get('last_executed', 'Never')[:16] if routine.get('last_executed') else 'Never'}\n"
+                message += f"  Next Run: {routine.get('next_run_at', 'Not scheduled')[:16] if routine.get('next_run_at') else 'Not scheduled'}\n"
                 message += f"  Executions: {routine.get('execution_count', 0)}\n\n"
         
         await update.message.reply_text(message, parse_mode='Markdown')
@@ -193,10 +220,13 @@ To add a routine, send a message in this format:
 
 "Create routine: [name] | [frequency] | [action]"
 
-**Frequency options:** hourly, daily, weekly
+**Frequency options:**
+• hourly, daily, weekly
+• A time of day: daily at 7:00, weekdays at 9am, every friday at 17:30
+• A cron expression: cron: 0 7 * * *
 
 **Examples:**
-• "Create routine: Morning Brief | daily | Check weather and list today's calendar events"
+• "Create routine: Morning Brief | daily at 7:00 | Check weather and list today's calendar events"
 • "Create routine: Team Update | weekly | Send status report to team@company.com"
 • "Create routine: Inbox Check | hourly | Check for urgent emails"
         """
@@ -210,29 +240,41 @@ To add a routine, send a message in this format:
         # Log the incoming message
         print(f"📨 Received message from {user_id}: {message[:100]}...")
         
+        if not self.dispatcher.submit(user_id, (update, context)):
+            await update.message.reply_text(
+                "I'm still working through your earlier messages. Please wait for my replies before sending more."
+            )
+    
+    async def _process_message(self, user_id: str, item):
+        """
+        Handle one queued message; called by the dispatcher in order per user
+        """
+        update, context = item
+        message = update.message.text
+        
         # Check if it's a routine creation request
         if message.lower().startswith("create routine:"):
             await self._create_routine_from_message(update, message)
             return
         
-        # Show typing indicator
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+        # Keeps the typing indicator alive and streams progress into a placeholder
+        reply = StreamingReply(
+            send=update.message.reply_text,
+            send_typing=lambda: context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing"),
+            edit_interval=self.stream_edit_interval if self.stream_replies else None
+        )
+        reply.start()
         
         try:
             # Process the message with a timeout
             response = await asyncio.wait_for(
-                self.secretary.process_user_message(user_id, message),
-                timeout=30.0  # 30 second timeout
+                self.secretary.process_user_message(user_id, message, on_progress=reply.update),
+                # The crew itself times out first; this only guards the rest
+                timeout=self.secretary.crew_timeout + 10
             )
             
-            # Send response (split if too long for Telegram)
-            if len(response) > 4000:
-                # Split long responses
-                parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-                for part in parts:
-                    await update.message.reply_text(part)
-            else:
-                await update.message.reply_text(response)
+            # Replace the placeholder with the answer (split if too long for Telegram)
+            await reply.finish(response)
             
             # If this looks like it needs follow-up, note it
             if any(phrase in message.lower() for phrase in ["follow up", "remind", "check back", "if no response"]):
@@ -243,14 +285,16 @@ To add a routine, send a message in this format:
                 
         except asyncio.TimeoutError:
             print(f"⏱️ Timeout processing message from {user_id}")
-            await update.message.reply_text(
+            await reply.finish(
                 "I'm taking a bit longer to process your request. Please wait a moment and I'll get back to you soon!"
             )
         except Exception as e:
             print(f"❌ Error handling message: {e}")
-            await update.message.reply_text(
+            await reply.finish(
                 "I apologize, but I encountered an issue processing your message. Please try again or type /help for assistance."
             )
+        finally:
+            await reply.stop()
     
     async def _create_routine_from_message(self, update: Update, message: str):
         try:
@@ -265,8 +309,10 @@ To add a routine, send a message in this format:
             frequency = parts[1].strip().lower()
             action = parts[2].strip()
             
-            if frequency not in ["hourly", "daily", "weekly"]:
-                await update.message.reply_text("❌ Frequency must be: hourly, daily, or weekly")
+            try:
+                parse_schedule(frequency)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {e}")
                 return
             
             routine_id = self.secretary.create_routine({
@@ -291,46 +337,77 @@ To add a routine, send a message in this format:
         """
         await asyncio.sleep(10)  # Initial delay
         
+        cycle_started = None
+        next_cycle = datetime.now()
+        
         while True:
             try:
-                print(f"🤔 Autonomous thinking cycle started at {datetime.now()}")
-                
-                # Run the thinking process
-                decision = await self.secretary.think_and_act()
-                
-                # Notify admin if important action was taken
-                if decision.get("action_needed") and decision.get("priority") == "high":
-                    notification = f"""
+                if datetime.now() >= next_cycle:
+                    cycle_started = datetime.now()
+                    next_cycle = cycle_started + timedelta(minutes=self.thinking_interval_minutes)
+                    print(f"🤔 Autonomous thinking cycle started at {cycle_started}")
+                    
+                    # Run the thinking process
+                    decision = await self.secretary.think_and_act()
+                    if decision.get("skipped"):
+                        print(f"💤 Nothing changed, skipped thinking cycle ({self.secretary.skipped_cycles}/{self.secretary.max_skipped_cycles})")
+                    
+                    # Notify admin if important action was taken
+                    if decision.get("action_needed") and decision.get("priority") == "high":
+                        notification = f"""
 🚨 **Autonomous Action Taken**
 
 **Action:** {decision.get('primary_action')}
 **Priority:** {decision.get('priority')}
 **Reasoning:** {decision.get('reasoning', 'No reasoning provided')[:200]}...
-                    """
-                    
-                    # Send notification to all admin chats
-                    for admin_chat_id in self.admin_chat_ids:
-                        try:
-                            await self.bot.send_message(
-                                chat_id=admin_chat_id,
-                                text=notification,
-                                parse_mode='Markdown'
-                            )
-                        except Exception as e:
-                            print(f"Failed to send notification to {admin_chat_id}: {e}")
+                        """
+                        
+                        # Send notification to all admin chats
+                        for admin_chat_id in self.admin_chat_ids:
+                            try:
+                                await self.bot.send_message(
+                                    chat_id=admin_chat_id,
+                                    text=notification,
+                                    parse_mode='Markdown'
+                                )
+                            except Exception as e:
+                                print(f"Failed to send notification to {admin_chat_id}: {e}")
                 
                 # Check and execute due routines
                 due_routines = self.secretary.memory.get_due_routines()
                 for routine in due_routines:
                     await self._execute_routine(routine)
                 
-                # Wait before next thinking cycle
-                await asyncio.sleep(self.thinking_interval_minutes * 60)
+                # Keep memory bounded: archive old finished tasks
+                self.secretary.run_maintenance()
+                
+                # Follow-ups that become due after the last cycle started pull
+                # the next cycle forward; ones already due were seen by it
+                next_followup = self.secretary.memory.next_followup_due(after=cycle_started)
+                if next_followup is not None:
+                    next_cycle = min(next_cycle, next_followup)
+                
+                await asyncio.sleep(self._seconds_until_wakeup(next_cycle))
                 
             except Exception as e:
                 print(f"Error in autonomous thinking: {e}")
                 await asyncio.sleep(60)  # Wait a minute before retrying
     
+    def _seconds_until_wakeup(self, next_cycle: datetime) -> float:
+        """
+        Sleep until the next thinking cycle or the next scheduled routine
+        """
+        now = datetime.now()
+        wakeup = next_cycle
+        
+        # A routine that is still due right after running failed; it is
+        # retried with the next thinking cycle instead of in a tight loop
+        next_routine = self.secretary.memory.next_routine_due()
+        if next_routine is not None and next_routine > now:
+            wakeup = min(wakeup, next_routine)
+        
+        return max((wakeup - now).total_seconds(), 1)
+    
     async def _execute_routine(self, routine: Dict):
         """
         Execute a routine task
@@ -343,7 +420,8 @@ To add a routine, send a message in this format:
             # Process the routine action
             result = await self.secretary.process_user_message(
                 user_id=f"routine_{routine_id}",
-                message=action
+                message=action,
+                workflow="routine"
             )
             
             # Update routine execution
@@ -360,6 +438,11 @@ To add a routine, send a message in this format:
         except Exception as e:
             print(f"Error executing routine {routine.get('name')}: {e}")
     
+    async def _on_shutdown(self, application: Application):
+        # Persist anything still buffered in memory before the process exits
+        await self.dispatcher.close()
+        await asyncio.to_thread(self.secretary.close)
+    
     def run(self):
         """
         Start the bot
@@ -374,6 +457,7 @@ To add a routine, send a message in this format:
             print("\n👋 Shutting down gracefully...")
             if self.thinking_task:
                 self.thinking_task.cancel()
+            self.secretary.close()
             sys.exit(0)
         
         signal.signal(signal.SIGINT, signal_handler)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark MemoryStore snapshot codecs: save time, load time and file size
+on a synthetic store.
+
+Usage: python bench_memory_store.py [--tasks 100000] [--users 50]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from memory_codecs import msgpack, orjson
+from memory_store import MemoryStore, TaskStatus
+
+def build_memory(tasks: int, users: int) -> dict:
+    """A store shaped like a long-running bot: mostly completed decision logs"""
+    now = datetime.now()
+    memory = MemoryStore._initialize_memory()
+    
+    for i in range(tasks):
+        created = (now - timedelta(minutes=3 * i)).isoformat()
+        status = TaskStatus.WAITING_RESPONSE.value if i % 50 == 0 else TaskStatus.COMPLETED.value
+        memory["tasks"][str(uuid.uuid4())] = {
+            "type": "send_followup",
+            "decision": {
+                "action_needed": True,
+                "primary_action": "send_followup",
+                "priority": "medium",
+                "reasoning": "The user is waiting for a reply from the vendor about the quarterly invoice. " * 3,
+                "follow_up_actions": []
+            },
+            "result": "Follow-up email sent to vendor@example.com regarding the quarterly invoice.",
+            "status": status,
+            "last_action_time": created,
+            "created_at": created,
+            "updated_at": created
+        }
+    
+    for u in range(users):
+        memory["conversations"][str(u)] = [{
+            "timestamp": now.isoformat(),
+            "user_message": "Schedule a meeting with the team tomorrow at 3 PM",
+            "assistant_response": "I've scheduled the team meeting for tomorrow at 3 PM and sent invites."
+        } for _ in range(100)]
+    
+    return memory
+
+def bench_codec(codec: str, memory: dict, directory: str, repeat: int) -> dict:
+    path = os.path.join(directory, f"memory.{codec}")
+    store = MemoryStore(path, codec=codec, background_writes=False)
+    store.memory = memory
+    
+    save_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        store.save()
+        save_times.append(time.perf_counter() - start)
+    
+    load_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        MemoryStore(path, codec=codec, background_writes=False)
+        load_times.append(time.perf_counter() - start)
+    
+    return {
+        "codec": codec,
+        "save": min(save_times),
+        "load": min(load_times),
+        "size": os.path.getsize(path)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    codecs = ["json"]
+    if orjson is not None:
+        codecs.append("orjson")
+    if msgpack is not None:
+        codecs.append("msgpack")
+    
+    print(f"Building synthetic store: {args.tasks} tasks, {args.users} users x 100 messages")
+    memory = build_memory(args.tasks, args.users)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        results = [bench_codec(codec, memory, directory, args.repeat) for codec in codecs]
+    
+    baseline = results[0]
+    print(f"\n{'codec':<10}{'save (s)':>10}{'load (s)':>10}{'size (MB)':>12}{'save x':>9}{'load x':>9}{'size %':>9}")
+    for r in results:
+        print(
+            f"{r['codec']:<10}{r['save']:>10.3f}{r['load']:>10.3f}{r['size'] / 1e6:>12.1f}"
+            f"{baseline['save'] / r['save']:>9.1f}{baseline['load'] / r['load']:>9.1f}"
+            f"{100 * r['size'] / baseline['size']:>8.0f}%"
+        )
+    
+    missing = [name for name, module in (("orjson", orjson), ("msgpack", msgpack)) if module is None]
+    if missing:
+        print(f"\nNot installed, skipped: {', '.join(missing)}")
+
+if __name__ == "__main__":
+    main()
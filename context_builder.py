@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional, Tuple
+
+# Exact token counts when tiktoken is installed, otherwise ~4 chars a token
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # The encoding is downloaded on first use and may be unavailable
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def clip(text, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def format_task(task: Dict) -> str:
+    decision = task.get("decision") or {}
+    line = f"[{task.get('status', 'unknown')}] {task.get('type', 'task')} #{task.get('task_id', '')[:8]}"
+    line += f", created {str(task.get('created_at', ''))[:16]}"
+    if decision.get("priority"):
+        line += f", {decision['priority']} priority"
+    summary = task.get("description") or task.get("result") or decision.get("reasoning")
+    if summary:
+        line += f": {clip(summary, 120)}"
+    return line
+
+def format_routine(routine: Dict) -> str:
+    return (f"{routine.get('name', 'Unnamed')} ({routine.get('frequency', 'unknown')}): "
+            f"{clip(routine.get('action'), 120)}")
+
+def format_conversation(entry: Dict) -> str:
+    return f"User: {clip(entry.get('user_message'), 200)} | You: {clip(entry.get('assistant_response'), 200)}"
+
+def format_insight(insight: Dict) -> str:
+    return f"{clip(insight.get('insight'), 160)} ({str(insight.get('timestamp', ''))[:10]})"
+
+def format_pattern(pattern_type: str, summary: Dict) -> str:
+    line = f"{pattern_type}: {summary.get('count', 0)} requests"
+    if summary.get("peak_hours"):
+        line += f", usually around {', '.join(f'{hour}:00' for hour in summary['peak_hours'])}"
+    if summary.get("peak_weekdays"):
+        line += f", mostly on {', '.join(summary['peak_weekdays'])}"
+    return line
+
+class Section:
+    """
+    A titled list of prompt lines, most relevant first. Lines that do not
+    fit the budget are dropped from the end; `chronological` sections are
+    shown oldest first once trimmed (e.g. conversations).
+    """
+    
+    def __init__(self, title: str, items: List[str], weight: float = 1.0, chronological: bool = False):
+        self.title = title
+        self.items = list(dict.fromkeys(item for item in items if item))
+        self.weight = weight
+        self.chronological = chronological
+
+class ContextBuilder:
+    """
+    Render prompt context as compact text within a token budget. Each
+    section gets a share of the budget by weight; budget a section does not
+    use goes to the others, in section order.
+    """
+    
+    def __init__(self, max_tokens: int = 1500):
+        self.max_tokens = max_tokens
+    
+    def build(self, sections: List[Section]) -> Tuple[str, Dict[str, int]]:
+        """
+        Returns the context text and the tokens used per section
+        """
+        sections = [section for section in sections if section.items]
+        costs = {id(section): [count_tokens(item) + 1 for item in section.items] for section in sections}
+        headers = {id(section): count_tokens(section.title) + 2 for section in sections}
+        kept = {id(section): 0 for section in sections}
+        used = {id(section): 0 for section in sections}
+        
+        def take(section: Section, allowance: float) -> None:
+            key = id(section)
+            item_costs = costs[key]
+            while kept[key] < len(item_costs):
+                cost = item_costs[kept[key]] + (headers[key] if kept[key] == 0 else 0)
+                if used[key] + cost > allowance:
+                    break
+                used[key] += cost
+                kept[key] += 1
+        
+        total_weight = sum(section.weight for section in sections) or 1
+        for section in sections:
+            take(section, self.max_tokens * section.weight / total_weight)
+        for section in sections:
+            spare = self.max_tokens - sum(used.values())
+            take(section, used[id(section)] + spare)
+        
+        blocks = []
+        usage: Dict[str, int] = {}
+        for section in sections:
+            key = id(section)
+            if kept[key] == 0:
+                usage[section.title] = 0
+                continue
+            lines = section.items[:kept[key]]
+            if section.chronological:
+                lines.reverse()
+            omitted = len(section.items) - kept[key]
+            text = f"{section.title}:\n" + "\n".join(f"- {line}" for line in lines)
+            if omitted:
+                text += f"\n- ({omitted} more omitted)"
+            blocks.append(text)
+            usage[section.title] = count_tokens(text)
+        
+        return "\n\n".join(blocks) if blocks else "(nothing to report)", usage
+
+def describe_usage(usage: Dict[str, int], budget: Optional[int] = None) -> str:
+    parts = ", ".join(f"{title} {tokens}" for title, tokens in usage.items())
+    total = sum(usage.values())
+    return f"{total}{f'/{budget}' if budget else ''} tokens ({parts})"
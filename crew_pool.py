@@ -0,0 +1,139 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Set
+from crewai import Crew
+
+class CrewCancelled(BaseException):
+    """
+    Raised when a tool starts, or at the next agent step, of a crew run that
+    was cancelled. Like asyncio.CancelledError it is not an Exception:
+    crewai hands tool exceptions back to the LLM as text, which would let
+    the run carry on.
+    """
+
+class CrewRun:
+    """
+    State of one crew run shared with its agent steps: the cancel flag, the
+    tools the agents used and an optional progress listener. The listener
+    is called on the crew's worker threads with a short description of each
+    tool as it starts and of each agent step.
+    """
+    
+    def __init__(self, on_progress: Optional[Callable[[str], None]] = None):
+        self.cancelled = threading.Event()
+        self.tools_used: Set[str] = set()
+        self.on_progress = on_progress
+    
+    def cancel(self) -> None:
+        self.cancelled.set()
+    
+    def report(self, text: str) -> None:
+        if self.on_progress is None:
+            return
+        if text:
+            try:
+                self.on_progress(text)
+            except Exception as e:
+                # Progress is best effort and must never fail the run
+                print(f"⚠️ Progress listener failed: {e}")
+
+def describe_step(step: Any) -> str:
+    """
+    One agent step as user-facing text: the agent's thought and the tool it
+    is calling, or the answer it produced
+    """
+    thought = str(getattr(step, "thought", "") or "").strip()
+    tool = getattr(step, "tool", None)
+    if tool:
+        return f"{thought}\n\n🔧 Using {tool}…".strip()
+    output = str(getattr(step, "output", "") or "").strip()
+    return output or thought
+
+# The run being executed. A context variable rather than a thread-local:
+# crewai runs parallel native tool calls on its own threads, each in a
+# copy of the calling context.
+_current_run: ContextVar[Optional[CrewRun]] = ContextVar("crew_run", default=None)
+
+def tool_started(name: str) -> None:
+    """
+    Called by our tools as they start, with their display name, so the run
+    knows what it used however crewai names tools or calls them back. A
+    cancelled run stops here, before the tool does anything, and progress is
+    reported from here too: crewai's native tool calling only calls the step
+    callback with the final answer.
+    """
+    run = _current_run.get()
+    if run is None:
+        return
+    if run.cancelled.is_set():
+        raise CrewCancelled(f"Crew run cancelled before {name}")
+    run.tools_used.add(name)
+    run.report(f"🔧 Using {name}…")
+
+def on_step(step: Any) -> None:
+    """
+    Step callback installed on every pooled crew. Records tool use, reports
+    progress and, as threads cannot be killed, stops a cancelled run at its
+    next step.
+    """
+    run = _current_run.get()
+    if run is None:
+        return
+    tool = getattr(step, "tool", None)
+    if tool:
+        run.tools_used.add(tool)
+    if run.cancelled.is_set():
+        raise CrewCancelled("Crew run cancelled")
+    run.report(describe_step(step))
+
+class CrewPool:
+    """
+    Ready-built crews for one workflow. Task descriptions are templates with
+    {placeholders} that kickoff(inputs=...) fills in, so a crew is built once
+    and reused. The template built from the shared agents never runs itself:
+    pooled crews are copies with their own agents, since agents keep per-run
+    state and several workflows (or branches of one cycle) run at once.
+    Each pooled crew serves one run at a time.
+    """
+    
+    def __init__(self, name: str, factory: Callable[[], Crew]):
+        self.name = name
+        self._factory = factory
+        self._template: Optional[Crew] = None
+        self._idle: List[Crew] = []
+        self._lock = threading.Lock()
+        self.size = 0
+    
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            crew = self._idle.pop() if self._idle else None
+            if crew is None:
+                if self._template is None:
+                    self._template = self._factory()
+                # Crew.copy() copies the agents and tasks; templates stay uninterpolated
+                crew = self._template.copy()
+                crew.step_callback = on_step
+                self.size += 1
+        
+        try:
+            yield crew
+        finally:
+            with self._lock:
+                self._idle.append(crew)
+    
+    def kickoff(self, inputs: Optional[Dict[str, Any]] = None, run: Optional[CrewRun] = None):
+        """
+        Run a crew with the given inputs. Cancelling `run` stops the crew at
+        its next step, or before it starts if it is still queued.
+        """
+        if run is not None and run.cancelled.is_set():
+            raise CrewCancelled(f"{self.name} crew cancelled before it started")
+        
+        token = _current_run.set(run)
+        try:
+            with self.acquire() as crew:
+                return crew.kickoff(inputs=inputs or {})
+        finally:
+            _current_run.reset(token)
@@ -0,0 +1,58 @@
+import json
+import re
+from typing import Any, List, Literal, Optional
+from pydantic import BaseModel, Field, ValidationError
+
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+class Decision(BaseModel):
+    """Structured output of the thinking and monitoring tasks"""
+    action_needed: bool = Field(default=False, description="True only if an action should be executed now")
+    primary_action: Optional[str] = Field(
+        default=None,
+        description="What to do: send_followup, send_email, schedule_event, check_weather, or a short verb phrase"
+    )
+    targets: List[str] = Field(default_factory=list, description="Who or what the action is for: email addresses, task ids, event names")
+    priority: Literal["high", "medium", "low"] = "medium"
+    reasoning: str = Field(default="", description="Why this action (or no action) is right")
+    follow_up_actions: List[str] = Field(default_factory=list, description="Anything to do after the primary action")
+
+def parse_decision(output: Any) -> Decision:
+    """
+    Decision from a crew result: its pydantic output when the task produced
+    one, else a JSON object found in the raw text. Anything unparseable
+    means no action, so a rambling answer never triggers an execution.
+    """
+    structured = getattr(output, "pydantic", None)
+    if isinstance(structured, Decision):
+        return _validated(structured)
+    
+    raw = getattr(output, "raw", None) or str(output or "")
+    match = re.search(r"\{.*\}", raw, re.DOTALL)
+    if match:
+        try:
+            return _validated(Decision.model_validate(json.loads(match.group(0))))
+        except (ValueError, ValidationError):
+            pass
+    return Decision(reasoning=raw)
+
+def _validated(decision: Decision) -> Decision:
+    # An action flag without an action is not actionable
+    if decision.action_needed and not decision.primary_action:
+        decision.action_needed = False
+    return decision
+
+def merge_decisions(*decisions: Decision) -> Decision:
+    """
+    Combine branch decisions: the most urgent actionable one wins (earlier
+    branches on ties) and the others' reasoning is kept as context
+    """
+    if not decisions:
+        return Decision()
+    
+    actionable = [d for d in decisions if d.action_needed]
+    chosen = min(actionable, key=lambda d: PRIORITY_RANK[d.priority]) if actionable else decisions[0]
+    others = [d.reasoning for d in decisions if d is not chosen and d.reasoning]
+    if not others:
+        return chosen
+    return chosen.model_copy(update={"reasoning": "\n\n".join([chosen.reasoning, *others]).strip()})
@@ -0,0 +1,138 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Words that make a message a real request, even when it also looks like a
+# greeting or a lookup ("hi, email John", "show pending tasks and remind me")
+ACTION_WORDS = {
+    "email", "mail", "send", "reply", "forward", "schedule", "meeting", "calendar",
+    "remind", "reminder", "follow", "create", "add", "cancel", "delete", "book",
+    "weather", "call", "write", "draft", "invite", "move", "reschedule", "check"
+}
+
+GREETINGS = {
+    "hi", "hello", "hey", "hiya", "yo", "howdy", "good morning", "good afternoon",
+    "good evening", "morning", "hi there", "hello there", "hey there", "how are you"
+}
+
+THANKS = {
+    "thanks", "thank you", "thx", "ty", "cheers", "great thanks", "ok thanks",
+    "thanks a lot", "thank you so much", "perfect thanks", "awesome thanks"
+}
+
+# Lookups must match the whole message, so anything longer goes to the crew
+LOOKUPS: List[Tuple[str, str]] = [
+    ("pending", r"(what|which)( are| is)?( my| the)? (pending|open)( tasks?)?|(show|list)( me)?( my| the)?( pending| open)? tasks|what'?s pending|pending( tasks)?|any pending tasks"),
+    ("routines", r"(what|which)( are)?( my| the)? routines|(show|list)( me)?( my| the)? routines|my routines|routines"),
+    ("insights", r"(what|which)( are)?( my| the)? insights|(show|list)( me)?( my| the)? insights|what have you learned( about me)?|insights"),
+    ("status", r"status|(what'?s|what is)( your| the)? status|how are things|are you (there|awake|running|working)|(are you|you) (ok|okay)")
+]
+
+class IntentRouter:
+    """
+    Cheap local first stage for user messages. Greetings, thanks and memory
+    lookups (status, pending tasks, routines, insights) are answered straight
+    from the memory store; anything else returns None and goes to the crew.
+    """
+    
+    def __init__(self, memory):
+        self.memory = memory
+        self._lookups = [(intent, re.compile(pattern)) for intent, pattern in LOOKUPS]
+        self._handlers: Dict[str, Callable[[str], str]] = {
+            "greeting": self._greeting,
+            "thanks": self._thanks,
+            "status": self._status,
+            "pending": self._pending,
+            "routines": self._routines,
+            "insights": self._insights
+        }
+    
+    @staticmethod
+    def _normalize(message: str) -> str:
+        text = re.sub(r"[^\w\s']", " ", message.lower())
+        return " ".join(text.split())
+    
+    def classify(self, message: str) -> Optional[str]:
+        """
+        Intent name for messages that can be answered locally, else None
+        """
+        text = self._normalize(message)
+        words = text.split()
+        if not words or len(words) > 8 or ACTION_WORDS.intersection(words):
+            return None
+        
+        if text in GREETINGS:
+            return "greeting"
+        if text in THANKS:
+            return "thanks"
+        for intent, pattern in self._lookups:
+            if pattern.fullmatch(text):
+                return intent
+        return None
+    
+    def route(self, user_id: str, message: str) -> Optional[str]:
+        """
+        Reply for messages handled locally, or None to escalate to the crew
+        """
+        intent = self.classify(message)
+        if intent is None:
+            return None
+        return self._handlers[intent](user_id)
+    
+    def _greeting(self, user_id: str) -> str:
+        pending = len(self.memory.get_pending_tasks())
+        if pending:
+            return f"Hello! I'm here and keeping an eye on {pending} pending task{'s' if pending != 1 else ''}. What can I do for you?"
+        return "Hello! How can I help you today?"
+    
+    def _thanks(self, user_id: str) -> str:
+        return "You're welcome! Let me know if there's anything else I can do."
+    
+    def _status(self, user_id: str) -> str:
+        pending = self.memory.get_pending_tasks()
+        followups = self.memory.get_tasks_requiring_followup()
+        next_routine = self.memory.next_routine_due()
+        
+        lines = [
+            "I'm up and monitoring in the background.",
+            f"• Pending tasks: {len(pending)}",
+            f"• Awaiting response: {len(followups)}"
+        ]
+        if next_routine is not None:
+            lines.append(f"• Next routine: {next_routine.strftime('%Y-%m-%d %H:%M')}")
+        return "\n".join(lines)
+    
+    def _pending(self, user_id: str) -> str:
+        pending = self.memory.get_pending_tasks()
+        if not pending:
+            return "✅ No pending tasks at the moment!"
+        
+        lines = ["📋 Pending tasks:"]
+        for task in pending[:10]:
+            lines.append(f"• {task.get('type', 'Unknown')} ({task.get('status', 'unknown')}, created {task.get('created_at', '')[:16]})")
+        if len(pending) > 10:
+            lines.append(f"…and {len(pending) - 10} more")
+        return "\n".join(lines)
+    
+    def _routines(self, user_id: str) -> str:
+        routines = self.memory.get_routines()
+        if not routines:
+            return "No routines set up yet. Use /add_routine to create one!"
+        
+        lines = ["⏰ Routines:"]
+        for routine in routines.values():
+            next_run = routine.get('next_run_at')
+            lines.append(
+                f"• {routine.get('name', 'Unnamed')}: {routine.get('frequency', 'unknown')}"
+                f", next run {next_run[:16] if next_run else 'not scheduled'}"
+            )
+        return "\n".join(lines)
+    
+    def _insights(self, user_id: str) -> str:
+        insights = self.memory.get_insights(5)
+        if not insights:
+            return "No insights gathered yet. I'll learn as we interact!"
+        
+        lines = ["🧠 Recent insights:"]
+        for insight in insights:
+            lines.append(f"• {insight['insight']}")
+        return "\n".join(lines)
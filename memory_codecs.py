@@ -0,0 +1,85 @@
+import json
+from typing import Any
+
+# Faster codecs are optional; the stdlib json codec always works
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+class JsonCodec:
+    """Human-readable stdlib JSON, the original snapshot format"""
+    name = "json"
+    
+    def __init__(self, indent: int = 2):
+        self.indent = indent
+    
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, indent=self.indent, default=str).encode('utf-8')
+    
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class OrjsonCodec:
+    """Compact JSON via orjson; files stay readable by every JSON codec"""
+    name = "orjson"
+    
+    def encode(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+class MsgpackCodec:
+    """Binary MessagePack, the smallest snapshots"""
+    name = "msgpack"
+    
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, default=str, use_bin_type=True)
+    
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def get_codec(name: str = "json"):
+    """
+    Codec by name: json, orjson, msgpack, or auto (fastest installed JSON codec).
+    Falls back to stdlib json when the requested library is not installed.
+    """
+    name = (name or "json").lower()
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    
+    if name == "orjson":
+        if orjson is not None:
+            return OrjsonCodec()
+        print("⚠️ orjson is not installed, using json for memory snapshots (pip install orjson)")
+    elif name == "msgpack":
+        if msgpack is not None:
+            return MsgpackCodec()
+        print("⚠️ msgpack is not installed, using json for memory snapshots (pip install msgpack)")
+    elif name != "json":
+        raise ValueError(f"Unknown memory codec '{name}'. Use json, orjson, msgpack or auto")
+    
+    return JsonCodec()
+
+def detect_codec(data: bytes):
+    """
+    Pick the codec that can read an existing snapshot, whatever wrote it
+    """
+    stripped = data.lstrip()
+    if not stripped or stripped[:1] in (b'{', b'['):
+        return OrjsonCodec() if orjson is not None else JsonCodec()
+    
+    # MessagePack maps start with a fixmap (0x80-0x8f), map16 or map32 marker
+    first = data[0]
+    if 0x80 <= first <= 0x8f or first in (0xde, 0xdf):
+        if msgpack is None:
+            raise ImportError("Memory snapshot is in msgpack format but msgpack is not installed (pip install msgpack)")
+        return MsgpackCodec()
+    
+    raise ValueError("Unrecognized memory snapshot format")
@@ -1,8 +1,17 @@
+import asyncio
+import atexit
+import copy
+import heapq
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from enum import Enum
+from memory_codecs import get_codec, detect_codec
+from routine_scheduler import RoutineScheduler, next_run_time
 
 class TaskStatus(Enum):
     PENDING = "pending"
@@ -21,21 +30,198 @@ class TaskType(Enum):
     ROUTINE_CHECK = "routine_check"
     CUSTOM = "custom"
 
+# Tasks in these states are history only and subject to retention
+FINISHED_STATUSES = (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value, TaskStatus.CANCELLED.value)
+
+def fold_pattern_event(counters: Dict, event: Dict) -> Dict:
+    """
+    Add a learn_pattern event to a pattern histogram: total count plus
+    counts by hour, weekday, request type and weekday x hour slot
+    """
+    data = event.get("data", {})
+    timestamp = event.get("timestamp")
+    when = datetime.fromisoformat(timestamp) if timestamp else None
+    
+    hour = data.get("time_of_request", when.hour if when else None)
+    weekday = data.get("day_of_week", when.strftime("%A") if when else None)
+    request_type = data.get("request_type", "unknown")
+    
+    slot = f"{weekday} {hour}:00" if weekday is not None and hour is not None else None
+    
+    counters["count"] = counters.get("count", 0) + 1
+    for key, value in (("by_hour", hour), ("by_weekday", weekday),
+                       ("by_request_type", request_type), ("by_slot", slot)):
+        if value is not None:
+            bucket = counters.setdefault(key, {})
+            bucket[str(value)] = bucket.get(str(value), 0) + 1
+    
+    if timestamp:
+        counters["first_seen"] = min(counters.get("first_seen") or timestamp, timestamp)
+        counters["last_seen"] = max(counters.get("last_seen") or timestamp, timestamp)
+    return counters
+
+def _top(bucket: Dict[str, int], limit: int) -> List[str]:
+    return [key for key, _ in sorted(bucket.items(), key=lambda item: -item[1])[:limit]]
+
+def summarize_pattern(counters: Dict) -> Dict:
+    """
+    Compact view of a pattern histogram for prompts. Buckets are bounded
+    (24 hours, 7 weekdays), so this does not grow with the event count.
+    """
+    return {
+        "count": counters.get("count", 0),
+        "peak_hours": [int(hour) for hour in _top(counters.get("by_hour", {}), 3)],
+        "peak_weekdays": _top(counters.get("by_weekday", {}), 2),
+        "busiest_slot": next(iter(_top(counters.get("by_slot", {}), 1)), None),
+        "request_types": counters.get("by_request_type", {}),
+        "last_seen": counters.get("last_seen")
+    }
+
 class MemoryStore:
-    def __init__(self, storage_path: str = "secretary_memory.json"):
+    def __init__(self, storage_path: str = "secretary_memory.json",
+                 journal: bool = False, compact_every: int = 500,
+                 default_followup_hours: float = 24, flush_interval: float = 0,
+                 background_writes: bool = True, codec: str = "json",
+                 task_retention_days: float = 30, max_completed_tasks: int = 1000):
         self.storage_path = storage_path
+        # Snapshot serializer; loading detects whichever format is on disk
+        self.codec = get_codec(codec)
+        self.default_followup_hours = default_followup_hours
+        self.journal_path = f"{storage_path}.journal"
+        # In journal mode every mutation is appended as one small record and
+        # the full snapshot is only rewritten every `compact_every` records
+        self.journal = journal
+        self.compact_every = compact_every
+        self._journal_seq = 0
+        self._journal_records = 0
+        self._journal_file = None
+        self._pending_records: List[Dict] = []
+        
+        # Retention: finished tasks older than task_retention_days or beyond
+        # the newest max_completed_tasks move to the archive file
+        self.task_retention_days = task_retention_days
+        self.max_completed_tasks = max_completed_tasks
+        self.archive_path = f"{os.path.splitext(storage_path)[0]}_archive.jsonl"
+        
+        # With a flush interval, mutations only mark the store dirty and a
+        # background thread persists at most once per interval
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._batch_depth = 0
+        self._stop_flusher = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        
+        # Disk writes happen on a single writer thread so callers on the event
+        # loop never wait for the file; _write_lock keeps writes in order.
+        # Lock order is always _write_lock before _lock.
+        self.background_writes = background_writes
+        self._write_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+        self._flush_queued = False
+        self._closed = False
+        self._migrated = False
+        
         self.memory = self._load_memory()
+        
+        # Secondary index: task status -> task ids (dicts keep insertion order)
+        self._status_index: Dict[str, Dict[str, None]] = {}
+        # Min-heap of (follow-up due time, task id); entries are invalidated
+        # lazily, so every pop is checked against the task's current state
+        self._followup_heap: List[Tuple[datetime, str]] = []
+        # Follow-ups already handed out by pop_due_followups: task id -> due
+        # time. They leave the heap but stay due until their task changes
+        self._popped_followups: Dict[str, datetime] = {}
+        self.scheduler = RoutineScheduler()
+        self._rebuild_indexes()
+        
+        # A migrated store is written back right away so old-format journal
+        # records are never replayed onto the new format
+        if self._migrated or (self._journal_records and (not self.journal or self._journal_records >= self.compact_every)):
+            self.compact()
+        
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="memory-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
     
     def _load_memory(self) -> Dict:
+        memory = None
         if os.path.exists(self.storage_path):
             try:
-                with open(self.storage_path, 'r') as f:
-                    return json.load(f)
+                with open(self.storage_path, 'rb') as f:
+                    data = f.read()
+                memory = detect_codec(data).decode(data)
+            except ImportError:
+                # Never start empty and overwrite a snapshot we cannot read
+                raise
             except:
-                return self._initialize_memory()
-        return self._initialize_memory()
+                memory = None
+        if memory is None:
+            memory = self._initialize_memory()
+        
+        self._journal_seq = memory.pop("_journal_seq", 0)
+        self._replay_journal(memory)
+        self._migrated = self._migrate_patterns(memory)
+        return memory
     
-    def _initialize_memory(self) -> Dict:
+    @staticmethod
+    def _migrate_patterns(memory: Dict) -> bool:
+        """
+        Fold raw pattern event lists from older stores into histograms
+        """
+        legacy_counters = memory.pop("pattern_counters", None) or {}
+        migrated = bool(legacy_counters)
+        
+        for user_id, pattern_types in memory.setdefault("patterns", {}).items():
+            for pattern_type, events in pattern_types.items():
+                if isinstance(events, list):
+                    histogram = legacy_counters.get(user_id, {}).get(pattern_type, {})
+                    for event in events:
+                        fold_pattern_event(histogram, event)
+                    pattern_types[pattern_type] = histogram
+                    migrated = True
+        
+        # Counters rolled up from events that were then trimmed away
+        for user_id, pattern_types in legacy_counters.items():
+            for pattern_type, histogram in pattern_types.items():
+                memory["patterns"].setdefault(user_id, {}).setdefault(pattern_type, histogram)
+        return migrated
+    
+    def _replay_journal(self, memory: Dict) -> None:
+        """
+        Re-apply journal records written after the last snapshot
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        
+        valid_bytes = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append; everything
+                    # before it is intact
+                    break
+                valid_bytes += len(line)
+                
+                # Records already folded into the snapshot (crash between
+                # snapshot write and journal truncation) are skipped
+                if record.get("seq", 0) <= self._journal_seq:
+                    continue
+                
+                self._apply(memory, record)
+                self._journal_seq = record["seq"]
+                self._journal_records += 1
+        
+        # Drop the torn tail so new records are not appended onto it
+        if valid_bytes < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+    
+    @staticmethod
+    def _initialize_memory() -> Dict:
         return {
             "tasks": {},
             "conversations": {},
@@ -48,141 +234,479 @@ class MemoryStore:
             "insights": []
         }
     
+    def _snapshot(self) -> Dict:
+        """
+        Copy of memory that later mutations leave alone, cheap enough to take
+        under the lock so encoding can happen outside it. Task and routine
+        entries are replaced rather than changed, so only their containers
+        are copied; other sections are changed one level down (appends,
+        preference keys) and pattern histograms are folded in place.
+        """
+        snapshot: Dict[str, Any] = {}
+        for section, value in self.memory.items():
+            if section == "patterns":
+                snapshot[section] = copy.deepcopy(value)
+            elif section in ("tasks", "routines"):
+                snapshot[section] = dict(value)
+            elif isinstance(value, dict):
+                snapshot[section] = {key: item.copy() if isinstance(item, (dict, list)) else item
+                                     for key, item in value.items()}
+            elif isinstance(value, list):
+                snapshot[section] = list(value)
+            else:
+                snapshot[section] = value
+        
+        # Journal records up to _journal_seq (flushed or not) are contained in
+        # the snapshot, so replay after loading it skips them
+        if self.journal:
+            snapshot["_journal_seq"] = self._journal_seq
+        return snapshot
+    
+    def _write_atomic(self, data: bytes) -> None:
+        """
+        Write to a temp file and rename it over the snapshot, so a crash
+        mid-write leaves the previous snapshot intact
+        """
+        tmp_path = f"{self.storage_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_path)
+    
     def save(self):
-        with open(self.storage_path, 'w') as f:
-            json.dump(self.memory, f, indent=2, default=str)
+        with self._write_lock:
+            with self._lock:
+                snapshot = self._snapshot()
+            self._write_atomic(self.codec.encode(snapshot))
+    
+    async def save_async(self) -> None:
+        """
+        Persist pending changes on the writer thread without blocking the event loop
+        """
+        await asyncio.get_running_loop().run_in_executor(self._writer, self.flush)
+    
+    @staticmethod
+    def _apply(memory: Dict, record: Dict) -> None:
+        """
+        Apply a single mutation record to a memory dict
+        """
+        *parents, key = record["path"]
+        target = memory
+        for part in parents:
+            target = target.setdefault(part, {})
+        
+        if record["op"] == "set":
+            target[key] = record["value"]
+        elif record["op"] == "delete":
+            target.pop(key, None)
+        elif record["op"] == "fold":
+            fold_pattern_event(target.setdefault(key, {}), record["value"])
+        elif record["op"] == "append":
+            items = target.setdefault(key, [])
+            items.append(record["value"])
+            limit = record.get("limit")
+            if limit and len(items) > limit:
+                del items[:-limit]
+    
+    def _mutate(self, op: str, path: List[str], value: Any, limit: Optional[int] = None) -> None:
+        """
+        Apply a mutation in memory and persist it (journal record or full save)
+        """
+        record = {"op": op, "path": path, "value": value}
+        if limit:
+            record["limit"] = limit
+        
+        with self._lock:
+            self._apply(self.memory, record)
+            if self.journal:
+                self._journal_seq += 1
+                record["seq"] = self._journal_seq
+                self._pending_records.append(record)
+            self._dirty = True
+            
+            # Inside a batch or with a background flusher, persist later
+            persist_now = self._batch_depth == 0 and self.flush_interval <= 0
+        
+        if persist_now:
+            self._request_flush()
+    
+    def _request_flush(self) -> None:
+        if not self.background_writes or self._closed:
+            self.flush()
+            return
+        
+        # Coalesce: one queued flush picks up every change made before it runs
+        with self._lock:
+            if self._flush_queued:
+                return
+            self._flush_queued = True
+        self._writer.submit(self._background_flush)
+    
+    def _background_flush(self) -> None:
+        with self._lock:
+            self._flush_queued = False
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error saving memory: {e}")
+    
+    def flush(self, include_batches: bool = True) -> None:
+        """
+        Persist all changes made since the last flush
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty or (self._batch_depth and not include_batches):
+                    return
+                self._dirty = False
+                
+                # Copy under the lock; encoding and the write happen outside
+                # it, so mutations on the event loop never wait for them
+                if not self.journal:
+                    snapshot = self._snapshot()
+                else:
+                    lines = "".join(json.dumps(record, default=str) + "\n" for record in self._pending_records)
+                    count = len(self._pending_records)
+                    self._pending_records = []
+            
+            if not self.journal:
+                self._write_atomic(self.codec.encode(snapshot))
+                return
+            
+            if self._journal_file is None:
+                self._journal_file = open(self.journal_path, 'a')
+            self._journal_file.write(lines)
+            self._journal_file.flush()
+            self._journal_records += count
+            
+            if self._journal_records >= self.compact_every:
+                self._compact()
+    
+    @contextmanager
+    def batch(self):
+        """
+        Group several mutations into a single write when the block exits
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                persist_now = self._batch_depth == 0 and self.flush_interval <= 0 and self._dirty
+            if persist_now:
+                self._request_flush()
+    
+    def _flush_periodically(self) -> None:
+        while not self._stop_flusher.wait(self.flush_interval):
+            try:
+                # Never persist half of a batch
+                self.flush(include_batches=False)
+            except Exception as e:
+                print(f"Error flushing memory: {e}")
+    
+    def compact(self) -> None:
+        """
+        Fold the journal into a fresh snapshot and truncate it
+        """
+        with self._write_lock:
+            self._compact()
+    
+    def _compact(self) -> None:
+        # Callers hold _write_lock. Records not flushed yet are part of
+        # self.memory and so of the snapshot
+        with self._lock:
+            snapshot = self._snapshot()
+            self._pending_records = []
+            self._dirty = False
+        data = self.codec.encode(snapshot)
+        
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+        
+        # The snapshot is renamed into place before the journal goes away, so
+        # a crash in between only leaves records the snapshot already has
+        self._write_atomic(data)
+        
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_records = 0
+    
+    def close(self) -> None:
+        self._closed = True
+        self._stop_flusher.set()
+        self._writer.shutdown(wait=True)
+        self.flush()
+        if self._journal_file is not None or self._journal_records:
+            self.compact()
+    
+    def _rebuild_indexes(self) -> None:
+        self._status_index = {}
+        for task_id, task in self.memory["tasks"].items():
+            self._status_index.setdefault(task.get("status"), {})[task_id] = None
+        self._rebuild_followup_heap()
+        
+        self.scheduler = RoutineScheduler()
+        for routine_id, routine in self.memory["routines"].items():
+            self.scheduler.schedule(routine_id, self._routine_next_run(routine))
+    
+    def _reindex_task(self, task_id: str, old_status: Optional[str], old_due: Optional[datetime]) -> None:
+        task = self.memory["tasks"][task_id]
+        new_status = task.get("status")
+        if old_status != new_status or old_status is None:
+            self._status_index.get(old_status, {}).pop(task_id, None)
+            self._status_index.setdefault(new_status, {})[task_id] = None
+        
+        new_due = self._followup_due_at(task)
+        if new_due is not None and new_due != old_due:
+            heapq.heappush(self._followup_heap, (new_due, task_id))
+    
+    def _followup_due_at(self, task: Optional[Dict]) -> Optional[datetime]:
+        if not task or task.get("status") != TaskStatus.WAITING_RESPONSE.value:
+            return None
+        last_action = task.get("last_action_time")
+        if not last_action:
+            return None
+        followup_after = task.get("followup_after_hours", self.default_followup_hours)
+        return datetime.fromisoformat(last_action) + timedelta(hours=followup_after)
+    
+    def _rebuild_followup_heap(self) -> None:
+        self._followup_heap = []
+        for task_id in self._status_index.get(TaskStatus.WAITING_RESPONSE.value, {}):
+            due = self._followup_due_at(self.memory["tasks"][task_id])
+            if due is not None and self._popped_followups.get(task_id) != due:
+                self._followup_heap.append((due, task_id))
+        heapq.heapify(self._followup_heap)
+    
+    def _is_live_followup(self, entry: Tuple[datetime, str]) -> bool:
+        due, task_id = entry
+        return self._followup_due_at(self.memory["tasks"].get(task_id)) == due
+    
+    def _pop_followups_until(self, cutoff: datetime) -> List[Tuple[datetime, str]]:
+        """
+        Pop heap entries due before `cutoff`, discarding stale ones
+        """
+        popped = []
+        seen = set()
+        while self._followup_heap and self._followup_heap[0][0] < cutoff:
+            entry = heapq.heappop(self._followup_heap)
+            if entry[1] not in seen and self._is_live_followup(entry):
+                seen.add(entry[1])
+                popped.append(entry)
+        
+        # Stale entries pile up as tasks change; rebuild once they dominate
+        live = len(self._status_index.get(TaskStatus.WAITING_RESPONSE.value, {}))
+        if len(self._followup_heap) > 2 * live + 64:
+            self._rebuild_followup_heap()
+        return popped
+    
+    def next_followup_due(self, after: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Earliest follow-up due time, optionally only considering those due after `after`
+        """
+        popped = self._pop_followups_until(after) if after else []
+        while self._followup_heap and not self._is_live_followup(self._followup_heap[0]):
+            heapq.heappop(self._followup_heap)
+        next_due = self._followup_heap[0][0] if self._followup_heap else None
+        
+        for entry in popped:
+            heapq.heappush(self._followup_heap, entry)
+        return next_due
+    
+    def pop_due_followups(self, now: Optional[datetime] = None) -> List[Dict]:
+        """
+        Hand out tasks whose follow-up is due, each only once until its
+        follow-up state changes (e.g. a new last_action_time). They are still
+        listed by get_tasks_requiring_followup.
+        """
+        due_ids = []
+        for due, task_id in self._pop_followups_until(now or datetime.now()):
+            if self._popped_followups.get(task_id) != due:
+                self._popped_followups[task_id] = due
+                due_ids.append(task_id)
+        return [{**self.memory["tasks"][task_id], "task_id": task_id} for task_id in due_ids]
+    
+    def _tasks_with_status(self, *statuses: str) -> List[Dict]:
+        tasks = []
+        for status in statuses:
+            for task_id in self._status_index.get(status, {}):
+                tasks.append({**self.memory["tasks"][task_id], "task_id": task_id})
+        return tasks
     
     def add_task(self, task_id: str, task_data: Dict) -> None:
-        self.memory["tasks"][task_id] = {
+        old_task = self.memory["tasks"].get(task_id)
+        old_status = old_task.get("status") if old_task else None
+        old_due = self._followup_due_at(old_task)
+        self._mutate("set", ["tasks", task_id], {
             **task_data,
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
-            "status": TaskStatus.PENDING.value
-        }
-        self.save()
+            "status": task_data.get("status", TaskStatus.PENDING.value)
+        })
+        self._reindex_task(task_id, old_status, old_due)
     
     def update_task(self, task_id: str, updates: Dict) -> None:
         if task_id in self.memory["tasks"]:
-            self.memory["tasks"][task_id].update(updates)
-            self.memory["tasks"][task_id]["updated_at"] = datetime.now().isoformat()
-            self.save()
+            old_status = self.memory["tasks"][task_id].get("status")
+            old_due = self._followup_due_at(self.memory["tasks"][task_id])
+            self._mutate("set", ["tasks", task_id], {
+                **self.memory["tasks"][task_id],
+                **updates,
+                "updated_at": datetime.now().isoformat()
+            })
+            self._reindex_task(task_id, old_status, old_due)
     
     def get_task(self, task_id: str) -> Optional[Dict]:
         return self.memory["tasks"].get(task_id)
     
     def get_pending_tasks(self) -> List[Dict]:
-        pending = []
-        for task_id, task in self.memory["tasks"].items():
-            if task.get("status") in [TaskStatus.PENDING.value, TaskStatus.WAITING_RESPONSE.value]:
-                task["task_id"] = task_id
-                pending.append(task)
+        pending = self._tasks_with_status(TaskStatus.PENDING.value, TaskStatus.WAITING_RESPONSE.value)
+        pending.sort(key=lambda task: task.get("created_at", ""))
         return pending
     
     def add_conversation(self, user_id: str, message: str, response: str):
-        if user_id not in self.memory["conversations"]:
-            self.memory["conversations"][user_id] = []
-        
-        self.memory["conversations"][user_id].append({
+        # Keep only last 100 messages per user
+        self._mutate("append", ["conversations", user_id], {
             "timestamp": datetime.now().isoformat(),
             "user_message": message,
             "assistant_response": response
-        })
-        
-        # Keep only last 100 messages per user
-        if len(self.memory["conversations"][user_id]) > 100:
-            self.memory["conversations"][user_id] = self.memory["conversations"][user_id][-100:]
-        
-        self.save()
+        }, limit=100)
     
     def get_user_context(self, user_id: str) -> Dict:
         return {
             "conversations": self.memory["conversations"].get(user_id, [])[-10:],
             "preferences": self.memory["preferences"].get(user_id, {}),
-            "patterns": self.memory["patterns"].get(user_id, {})
+            "patterns": self.get_pattern_summary(user_id)
         }
     
     def learn_pattern(self, user_id: str, pattern_type: str, pattern_data: Dict):
-        if user_id not in self.memory["patterns"]:
-            self.memory["patterns"][user_id] = {}
-        
-        if pattern_type not in self.memory["patterns"][user_id]:
-            self.memory["patterns"][user_id][pattern_type] = []
-        
-        self.memory["patterns"][user_id][pattern_type].append({
+        # Folded into the histogram in place; the journal records only the event
+        self._mutate("fold", ["patterns", user_id, pattern_type], {
             "data": pattern_data,
-            "timestamp": datetime.now().isoformat(),
-            "confidence": 0.5
+            "timestamp": datetime.now().isoformat()
         })
-        
-        self.save()
+    
+    def get_pattern_summary(self, user_id: str) -> Dict[str, Dict]:
+        """
+        Peak hours, weekdays and request types per pattern type for a user
+        """
+        with self._lock:
+            return {
+                pattern_type: summarize_pattern(histogram)
+                for pattern_type, histogram in self.memory["patterns"].get(user_id, {}).items()
+            }
+    
+    @staticmethod
+    def _routine_next_run(routine: Dict) -> Optional[datetime]:
+        if not routine.get("enabled", True):
+            return None
+        if routine.get("next_run_at"):
+            return datetime.fromisoformat(routine["next_run_at"])
+        return next_run_time(routine)
+    
+    def _set_routine(self, routine_id: str, routine: Dict) -> None:
+        next_run = next_run_time(routine)
+        routine["next_run_at"] = next_run.isoformat() if next_run else None
+        self._mutate("set", ["routines", routine_id], routine)
+        self.scheduler.schedule(routine_id, next_run)
     
     def add_routine(self, routine_id: str, routine_data: Dict):
-        self.memory["routines"][routine_id] = {
+        self._set_routine(routine_id, {
             **routine_data,
             "created_at": datetime.now().isoformat(),
             "last_executed": None,
             "execution_count": 0
-        }
-        self.save()
+        })
     
     def update_routine_execution(self, routine_id: str):
         if routine_id in self.memory["routines"]:
-            self.memory["routines"][routine_id]["last_executed"] = datetime.now().isoformat()
-            self.memory["routines"][routine_id]["execution_count"] += 1
-            self.save()
+            routine = self.memory["routines"][routine_id]
+            self._set_routine(routine_id, {
+                **routine,
+                "last_executed": datetime.now().isoformat(),
+                "execution_count": routine.get("execution_count", 0) + 1
+            })
     
     def get_due_routines(self) -> List[Dict]:
-        due_routines = []
-        now = datetime.now()
-        
-        for routine_id, routine in self.memory["routines"].items():
-            if not routine.get("enabled", True):
-                continue
-            
-            last_executed = routine.get("last_executed")
-            frequency = routine.get("frequency", "daily")
-            
-            if last_executed is None:
-                due_routines.append({**routine, "routine_id": routine_id})
-                continue
-            
-            last_executed_dt = datetime.fromisoformat(last_executed)
-            
-            if frequency == "hourly" and (now - last_executed_dt) > timedelta(hours=1):
-                due_routines.append({**routine, "routine_id": routine_id})
-            elif frequency == "daily" and (now - last_executed_dt) > timedelta(days=1):
-                due_routines.append({**routine, "routine_id": routine_id})
-            elif frequency == "weekly" and (now - last_executed_dt) > timedelta(weeks=1):
-                due_routines.append({**routine, "routine_id": routine_id})
-        
-        return due_routines
+        return [
+            {**self.memory["routines"][routine_id], "routine_id": routine_id}
+            for routine_id in self.scheduler.due()
+        ]
+    
+    def next_routine_due(self) -> Optional[datetime]:
+        return self.scheduler.next_run_at()
+    
+    def get_routines(self) -> Dict[str, Dict]:
+        return self.memory["routines"]
     
     def add_insight(self, insight: str, category: str = "general"):
-        self.memory["insights"].append({
+        # Keep only last 50 insights
+        self._mutate("append", ["insights"], {
             "insight": insight,
             "category": category,
             "timestamp": datetime.now().isoformat()
-        })
+        }, limit=50)
+    
+    def get_insights(self, limit: int = 5) -> List[Dict]:
+        return self.memory["insights"][-limit:]
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "tasks": len(self.memory["tasks"]),
+            "patterns": len(self.memory["patterns"]),
+            "insights": len(self.memory["insights"])
+        }
+    
+    def apply_retention(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Archive old finished tasks
+        """
+        now = now or datetime.now()
+        with self.batch():
+            archived = self._archive_finished_tasks(now)
+        return {"archived_tasks": archived}
+    
+    def _archive_finished_tasks(self, now: datetime) -> int:
+        cutoff = (now - timedelta(days=self.task_retention_days)).isoformat()
+        finished = self._tasks_with_status(*FINISHED_STATUSES)
+        finished.sort(key=lambda task: task.get("updated_at", ""), reverse=True)
+        expired = [
+            task for position, task in enumerate(finished)
+            if position >= self.max_completed_tasks or task.get("updated_at", "") < cutoff
+        ]
+        if not expired:
+            return 0
         
-        # Keep only last 50 insights
-        if len(self.memory["insights"]) > 50:
-            self.memory["insights"] = self.memory["insights"][-50:]
+        # Archive first: a crash before the deletes are persisted only
+        # leaves duplicates in the cold file, never lost tasks
+        with open(self.archive_path, 'a') as f:
+            for task in expired:
+                f.write(json.dumps({**task, "archived_at": now.isoformat()}, default=str) + "\n")
         
-        self.save()
+        for task in expired:
+            self._mutate("delete", ["tasks", task["task_id"]], None)
+            self._status_index.get(task.get("status"), {}).pop(task["task_id"], None)
+        return len(expired)
     
-    def get_tasks_requiring_followup(self, default_hours: int = 24) -> List[Dict]:
-        followup_tasks = []
-        now = datetime.now()
+    def get_tasks_requiring_followup(self, default_hours: Optional[float] = None) -> List[Dict]:
+        if default_hours is not None and default_hours != self.default_followup_hours:
+            self.default_followup_hours = default_hours
+            self._rebuild_followup_heap()
         
-        for task_id, task in self.memory["tasks"].items():
-            if task.get("status") == TaskStatus.WAITING_RESPONSE.value:
-                last_action = task.get("last_action_time")
-                if last_action:
-                    last_action_dt = datetime.fromisoformat(last_action)
-                    followup_after = task.get("followup_after_hours", default_hours)
-                    
-                    if (now - last_action_dt) > timedelta(hours=followup_after):
-                        task["task_id"] = task_id
-                        followup_tasks.append(task)
-        
-        return followup_tasks
\ No newline at end of file
+        # Peek without consuming: pop everything due, then put it back
+        due = self._pop_followups_until(datetime.now())
+        for entry in due:
+            heapq.heappush(self._followup_heap, entry)
+        
+        # Handed-out follow-ups are due until their task changes
+        for task_id, popped_due in list(self._popped_followups.items()):
+            if self._is_live_followup((popped_due, task_id)):
+                due.append((popped_due, task_id))
+            else:
+                del self._popped_followups[task_id]
+        
+        task_ids = dict.fromkeys(task_id for _, task_id in sorted(due))
+        return [{**self.memory["tasks"][task_id], "task_id": task_id} for task_id in task_ids]
\ No newline at end of file
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Set, Tuple
+
+class MessageDispatcher:
+    """
+    Ordered message queue per user. Messages from one user are handled one
+    at a time in arrival order; different users are handled concurrently,
+    at most `max_workers` at a time.
+    """
+    
+    def __init__(self, handler: Callable[[str, Any], Awaitable[None]],
+                 max_workers: int = 8, max_queue_per_user: int = 20):
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_queue_per_user = max_queue_per_user
+        self._queues: Dict[str, Deque[Tuple[float, Any]]] = {}
+        self._drainers: Dict[str, asyncio.Task] = {}
+        self._running: Set[str] = set()
+        self._semaphore = asyncio.Semaphore(max_workers)
+        
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._total_wait = 0.0
+    
+    def submit(self, user_id: str, item: Any) -> bool:
+        """
+        Queue a message for its user. Returns False when the user's queue is full.
+        """
+        queue = self._queues.setdefault(user_id, deque())
+        if len(queue) >= self.max_queue_per_user:
+            self.dropped += 1
+            return False
+        
+        queue.append((time.monotonic(), item))
+        self.max_depth = max(self.max_depth, len(queue))
+        
+        # One drainer per user keeps that user's messages in order
+        if user_id not in self._drainers:
+            self._drainers[user_id] = asyncio.create_task(self._drain(user_id))
+        return True
+    
+    async def _drain(self, user_id: str) -> None:
+        queue = self._queues[user_id]
+        try:
+            while queue:
+                # Workers are taken per message, so a user with a long backlog
+                # does not hold a slot while other users wait
+                async with self._semaphore:
+                    queued_at, item = queue.popleft()
+                    self._total_wait += time.monotonic() - queued_at
+                    self._running.add(user_id)
+                    try:
+                        await self.handler(user_id, item)
+                        self.processed += 1
+                    except Exception as e:
+                        self.failed += 1
+                        print(f"❌ Error handling queued message for {user_id}: {e}")
+                    finally:
+                        self._running.discard(user_id)
+        finally:
+            del self._drainers[user_id]
+            if not queue:
+                self._queues.pop(user_id, None)
+    
+    def metrics(self) -> Dict[str, Any]:
+        depths = [len(queue) for queue in self._queues.values()]
+        handled = self.processed + self.failed
+        return {
+            "queued": sum(depths),
+            "users_waiting": sum(1 for depth in depths if depth),
+            "users_running": len(self._running),
+            "busiest_queue": max(depths, default=0),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "avg_wait_seconds": self._total_wait / handled if handled else 0.0,
+            "max_workers": self.max_workers
+        }
+    
+    async def close(self) -> None:
+        """
+        Stop processing; messages still queued are discarded
+        """
+        drainers = list(self._drainers.values())
+        for task in drainers:
+            task.cancel()
+        await asyncio.gather(*drainers, return_exceptions=True)
+        self._queues.clear()
@@ -0,0 +1,82 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Responses produced by these tools had side effects and must run again
+MUTATING_TOOLS = {"Send Gmail", "Schedule Google Calendar Event"}
+
+def tool_key(name: str) -> str:
+    """
+    Tool name as crewai shows it to the LLM ("Send Gmail" -> "send_gmail"),
+    so display names and the names agents report compare equal
+    """
+    return "_".join(re.sub(r"[^a-z0-9]+", " ", name.lower()).split())
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s@.:/-]", " ", text.lower()).split())
+
+class ResponseCache:
+    """
+    In-memory cache of crew responses with a TTL per workflow. Keys hash the
+    normalized prompt together with the state of the tools the answer
+    depends on (mailbox and calendar markers), so a changed inbox or
+    calendar is a miss even within the TTL. Workflows without a TTL are
+    never cached.
+    """
+    
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 500):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def enabled(self, workflow: str) -> bool:
+        return self.ttls.get(workflow, 0) > 0
+    
+    @staticmethod
+    def make_key(workflow: str, prompt: str, tool_state: str = "") -> str:
+        digest = hashlib.sha256()
+        for part in (workflow, normalize_prompt(prompt), tool_state):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def _count(self, workflow: str, outcome: str) -> None:
+        counters = self._stats.setdefault(workflow, {"hits": 0, "misses": 0, "stores": 0, "skipped": 0})
+        counters[outcome] += 1
+    
+    def get(self, workflow: str, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(workflow, "hits")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._count(workflow, "misses")
+            return None
+    
+    def put(self, workflow: str, key: str, response: str, tools_used=()) -> bool:
+        """
+        Store a response unless the run used a tool with side effects
+        """
+        with self._lock:
+            if {tool_key(name) for name in MUTATING_TOOLS} & {tool_key(name) for name in tools_used}:
+                self._count(workflow, "skipped")
+                return False
+            
+            self._entries[key] = (time.monotonic() + self.ttls[workflow], response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._count(workflow, "stores")
+            return True
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {workflow: dict(counters) for workflow, counters in self._stats.items()}
@@ -0,0 +1,206 @@
+import heapq
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+# Legacy frequencies run at a fixed interval after the last execution
+INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1)
+}
+
+WEEKDAYS = {
+    "sunday": 0, "monday": 1, "tuesday": 2, "wednesday": 3,
+    "thursday": 4, "friday": 5, "saturday": 6
+}
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week
+    (day-of-week 0-7, Sunday is 0 or 7)
+    """
+    
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(fields)}: '{expression}'")
+        
+        self.expression = expression
+        self.minutes = self._parse_field(fields[0], 0, 59)
+        self.hours = self._parse_field(fields[1], 0, 23)
+        self.days = self._parse_field(fields[2], 1, 31)
+        self.months = self._parse_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in self._parse_field(fields[4], 0, 7)}
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+    
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+            
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Invalid cron field '{field}' (allowed {low}-{high})")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, day: datetime) -> bool:
+        cron_weekday = (day.weekday() + 1) % 7
+        if self.days_restricted and self.weekdays_restricted:
+            # Cron treats a restricted day-of-month and day-of-week as OR
+            return day.day in self.days or cron_weekday in self.weekdays
+        return day.day in self.days and cron_weekday in self.weekdays
+    
+    def next_after(self, after: datetime) -> datetime:
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        hours = sorted(self.hours)
+        minutes = sorted(self.minutes)
+        
+        # Five years covers every satisfiable expression (e.g. Feb 29)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in hours:
+                    for minute in minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+def parse_schedule(spec: str):
+    """
+    Turn a routine frequency into a schedule. Accepts the legacy
+    hourly/daily/weekly intervals, times of day such as "daily at 7:00",
+    "weekdays at 9am" or "every friday at 17:30", and cron expressions
+    ("cron: 0 7 * * *" or the bare 5 fields).
+    Returns a timedelta for intervals or a CronSchedule otherwise.
+    """
+    text = spec.strip().lower()
+    if text in INTERVALS:
+        return INTERVALS[text]
+    
+    if text.startswith("cron:"):
+        return CronSchedule(text[len("cron:"):].strip())
+    if re.fullmatch(r"[\d*/,\-]+(\s+[\d*/,\-]+){4}", text):
+        return CronSchedule(text)
+    
+    match = re.fullmatch(
+        r"(?:every\s+)?(day|daily|weekdays?|weekends?|sunday|monday|tuesday|wednesday|thursday|friday|saturday)?"
+        r"\s*(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)?",
+        text
+    )
+    if not match or (match.group(3) is None and match.group(4) is None and not re.search(r"\bat\b", text)):
+        raise ValueError(
+            f"Unknown schedule '{spec}'. Use hourly, daily, weekly, a time like "
+            "'daily at 7:00', 'weekdays at 9am', 'every friday at 17:30', or 'cron: 0 7 * * *'"
+        )
+    
+    days, hour_str, minute_str, meridiem = match.groups()
+    hour = int(hour_str)
+    minute = int(minute_str or 0)
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Invalid time of day in schedule '{spec}'")
+    
+    if days in (None, "day", "daily"):
+        weekdays = "*"
+    elif days.startswith("weekday"):
+        weekdays = "1-5"
+    elif days.startswith("weekend"):
+        weekdays = "0,6"
+    else:
+        weekdays = str(WEEKDAYS[days])
+    
+    return CronSchedule(f"{minute} {hour} * * {weekdays}")
+
+def next_run_time(routine: Dict, after: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Next time a routine should run, based on its schedule and last execution
+    """
+    if not routine.get("enabled", True):
+        return None
+    
+    try:
+        schedule = parse_schedule(routine.get("frequency", "daily"))
+    except ValueError:
+        return None
+    
+    last_executed = routine.get("last_executed")
+    if isinstance(schedule, timedelta):
+        if last_executed is None:
+            # New interval routines run right away, as they always have
+            return datetime.fromisoformat(routine["created_at"]) if routine.get("created_at") else datetime.now()
+        return datetime.fromisoformat(last_executed) + schedule
+    
+    reference = last_executed or routine.get("created_at")
+    base = datetime.fromisoformat(reference) if reference else (after or datetime.now())
+    return schedule.next_after(base)
+
+class RoutineScheduler:
+    """
+    Min-heap of precomputed routine run times. Rescheduling pushes a new
+    entry; superseded entries are skipped when they reach the top.
+    """
+    
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._next_run: Dict[str, datetime] = {}
+    
+    def schedule(self, routine_id: str, run_at: Optional[datetime]) -> None:
+        if run_at is None:
+            self._next_run.pop(routine_id, None)
+            return
+        if self._next_run.get(routine_id) == run_at:
+            return
+        self._next_run[routine_id] = run_at
+        heapq.heappush(self._heap, (run_at, routine_id))
+        
+        if len(self._heap) > 2 * len(self._next_run) + 64:
+            self._heap = [(run_at, routine_id) for routine_id, run_at in self._next_run.items()]
+            heapq.heapify(self._heap)
+    
+    def remove(self, routine_id: str) -> None:
+        self._next_run.pop(routine_id, None)
+    
+    def _is_current(self, entry: Tuple[datetime, str]) -> bool:
+        return self._next_run.get(entry[1]) == entry[0]
+    
+    def next_run_at(self) -> Optional[datetime]:
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+    
+    def due(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Ids of routines due at `now`, earliest first. Routines stay scheduled
+        until they are rescheduled after running.
+        """
+        now = now or datetime.now()
+        popped = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_current(entry):
+                popped.append(entry)
+        
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return [routine_id for _, routine_id in popped]
@@ -0,0 +1,456 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from memory_store import MemoryStore, TaskStatus, FINISHED_STATUSES, fold_pattern_event, summarize_pattern
+from routine_scheduler import next_run_time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    user_id TEXT,
+    last_action_time TEXT,
+    followup_after_hours REAL,
+    created_at TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, last_action_time);
+CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (user_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_updated ON tasks (status, updated_at);
+
+CREATE TABLE IF NOT EXISTS routines (
+    routine_id TEXT PRIMARY KEY,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    frequency TEXT,
+    last_executed TEXT,
+    next_run_at TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_message TEXT,
+    assistant_response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, id);
+
+CREATE TABLE IF NOT EXISTS pattern_counters (
+    user_id TEXT NOT NULL,
+    pattern_type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, pattern_type)
+);
+
+CREATE TABLE IF NOT EXISTS preferences (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS insights (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    insight TEXT NOT NULL,
+    category TEXT,
+    timestamp TEXT NOT NULL
+);
+"""
+
+class SQLiteMemoryStore:
+    """
+    MemoryStore with the same public methods, backed by indexed SQLite tables
+    instead of a single nested dict that is rewritten on every change
+    """
+    
+    def __init__(self, db_path: str = "secretary_memory.db",
+                 import_path: Optional[str] = "secretary_memory.json",
+                 default_followup_hours: float = 24,
+                 task_retention_days: float = 30, max_completed_tasks: int = 1000):
+        self.db_path = db_path
+        self.task_retention_days = task_retention_days
+        self.max_completed_tasks = max_completed_tasks
+        self.archive_path = f"{os.path.splitext(db_path)[0]}_archive.jsonl"
+        self.default_followup_hours = default_followup_hours
+        # Follow-ups already handed out by pop_due_followups: task id -> due time
+        self._popped_followups: Dict[str, datetime] = {}
+        is_new = not os.path.exists(db_path)
+        
+        # The bot touches memory from the event loop and from worker threads
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        
+        # Carry over an existing JSON memory file (or its journal) the first time we run
+        if is_new and import_path and (os.path.exists(import_path) or os.path.exists(f"{import_path}.journal")):
+            self.import_json(import_path)
+    
+    def _migrate(self) -> None:
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(routines)")}
+        with self._transaction():
+            if "next_run_at" not in columns:
+                self.conn.execute("ALTER TABLE routines ADD COLUMN next_run_at TEXT")
+                for row in self.conn.execute("SELECT routine_id, data FROM routines").fetchall():
+                    self._write_routine(row["routine_id"], json.loads(row["data"]))
+            self.conn.execute("DROP INDEX IF EXISTS idx_routines_due")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_routines_next_run ON routines (enabled, next_run_at)")
+            
+            # Raw pattern events from older databases become histograms
+            tables = {row["name"] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "patterns" in tables:
+                histograms: Dict[tuple, Dict] = {}
+                for row in self.conn.execute("SELECT user_id, pattern_type, data FROM patterns ORDER BY id"):
+                    key = (row["user_id"], row["pattern_type"])
+                    if key not in histograms:
+                        histograms[key] = self._get_histogram(*key)
+                    fold_pattern_event(histograms[key], json.loads(row["data"]))
+                for (user_id, pattern_type), histogram in histograms.items():
+                    self._write_histogram(user_id, pattern_type, histogram)
+                self.conn.execute("DROP TABLE patterns")
+    
+    def import_json(self, path: str) -> None:
+        # Loaded through MemoryStore so any snapshot codec, journaled changes
+        # not compacted yet and old pattern formats all come across
+        source = MemoryStore(path, background_writes=False)
+        memory = source.memory
+        source.close()
+        
+        with self._transaction():
+            for task_id, task in memory.get("tasks", {}).items():
+                self._write_task(task_id, task)
+            for routine_id, routine in memory.get("routines", {}).items():
+                self._write_routine(routine_id, routine)
+            for user_id, conversations in memory.get("conversations", {}).items():
+                self.conn.executemany(
+                    "INSERT INTO conversations (user_id, timestamp, user_message, assistant_response) VALUES (?, ?, ?, ?)",
+                    [(user_id, c.get("timestamp"), c.get("user_message"), c.get("assistant_response")) for c in conversations]
+                )
+            for user_id, pattern_types in memory["patterns"].items():
+                for pattern_type, histogram in pattern_types.items():
+                    self._write_histogram(user_id, pattern_type, histogram)
+            for user_id, preferences in memory.get("preferences", {}).items():
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO preferences (user_id, data) VALUES (?, ?)",
+                    (user_id, json.dumps(preferences, default=str))
+                )
+            self.conn.executemany(
+                "INSERT INTO insights (insight, category, timestamp) VALUES (?, ?, ?)",
+                [(i.get("insight"), i.get("category"), i.get("timestamp")) for i in memory.get("insights", [])]
+            )
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        Commit when the outermost block exits, so nested writes and batch()
+        blocks end up in a single transaction
+        """
+        with self._lock:
+            self._transaction_depth += 1
+            try:
+                yield
+            except Exception:
+                if self._transaction_depth == 1:
+                    self.conn.rollback()
+                raise
+            else:
+                if self._transaction_depth == 1:
+                    self.conn.commit()
+            finally:
+                self._transaction_depth -= 1
+    
+    @contextmanager
+    def batch(self):
+        with self._transaction():
+            yield self
+    
+    def save(self):
+        with self._lock:
+            self.conn.commit()
+    
+    def flush(self) -> None:
+        self.save()
+    
+    async def save_async(self) -> None:
+        await asyncio.to_thread(self.save)
+    
+    def compact(self) -> None:
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def close(self) -> None:
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+    
+    def _write_task(self, task_id: str, task: Dict) -> None:
+        self.conn.execute(
+            """INSERT OR REPLACE INTO tasks
+               (task_id, status, user_id, last_action_time, followup_after_hours, created_at, updated_at, data)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                task_id,
+                task.get("status", TaskStatus.PENDING.value),
+                task.get("user_id"),
+                task.get("last_action_time"),
+                task.get("followup_after_hours"),
+                task.get("created_at"),
+                task.get("updated_at"),
+                json.dumps(task, default=str)
+            )
+        )
+    
+    def _write_routine(self, routine_id: str, routine: Dict) -> None:
+        next_run = next_run_time(routine)
+        routine["next_run_at"] = next_run.isoformat() if next_run else None
+        self.conn.execute(
+            """INSERT OR REPLACE INTO routines
+               (routine_id, enabled, frequency, last_executed, next_run_at, created_at, data)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                routine_id,
+                1 if routine.get("enabled", True) else 0,
+                routine.get("frequency", "daily"),
+                routine.get("last_executed"),
+                routine["next_run_at"],
+                routine.get("created_at"),
+                json.dumps(routine, default=str)
+            )
+        )
+    
+    @staticmethod
+    def _task_from_row(row: sqlite3.Row) -> Dict:
+        return {**json.loads(row["data"]), "task_id": row["task_id"]}
+    
+    @staticmethod
+    def _routine_from_row(row: sqlite3.Row) -> Dict:
+        return {**json.loads(row["data"]), "routine_id": row["routine_id"]}
+    
+    def add_task(self, task_id: str, task_data: Dict) -> None:
+        with self._transaction():
+            self._write_task(task_id, {
+                **task_data,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat(),
+                "status": task_data.get("status", TaskStatus.PENDING.value)
+            })
+    
+    def update_task(self, task_id: str, updates: Dict) -> None:
+        with self._transaction():
+            task = self.get_task(task_id)
+            if task is not None:
+                task.pop("task_id", None)
+                self._write_task(task_id, {
+                    **task,
+                    **updates,
+                    "updated_at": datetime.now().isoformat()
+                })
+    
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT task_id, data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+    
+    def get_pending_tasks(self) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT task_id, data FROM tasks WHERE status IN (?, ?) ORDER BY created_at",
+                (TaskStatus.PENDING.value, TaskStatus.WAITING_RESPONSE.value)
+            ).fetchall()
+        return [self._task_from_row(row) for row in rows]
+    
+    def get_tasks_requiring_followup(self, default_hours: Optional[float] = None) -> List[Dict]:
+        if default_hours is not None:
+            self.default_followup_hours = default_hours
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT task_id, data FROM tasks
+                   WHERE status = ? AND last_action_time IS NOT NULL
+                     AND julianday(last_action_time) + COALESCE(followup_after_hours, ?) / 24.0 < julianday(?)""",
+                (TaskStatus.WAITING_RESPONSE.value, self.default_followup_hours, datetime.now().isoformat())
+            ).fetchall()
+        return [self._task_from_row(row) for row in rows]
+    
+    def _followup_schedule(self) -> List[tuple]:
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT task_id, last_action_time, COALESCE(followup_after_hours, ?) AS hours FROM tasks
+                   WHERE status = ? AND last_action_time IS NOT NULL""",
+                (self.default_followup_hours, TaskStatus.WAITING_RESPONSE.value)
+            ).fetchall()
+        return [
+            (datetime.fromisoformat(row["last_action_time"]) + timedelta(hours=row["hours"]), row["task_id"])
+            for row in rows
+        ]
+    
+    def next_followup_due(self, after: Optional[datetime] = None) -> Optional[datetime]:
+        due_times = [due for due, _ in self._followup_schedule() if after is None or due >= after]
+        return min(due_times) if due_times else None
+    
+    def pop_due_followups(self, now: Optional[datetime] = None) -> List[Dict]:
+        now = now or datetime.now()
+        due_ids = []
+        for due, task_id in self._followup_schedule():
+            if due < now and self._popped_followups.get(task_id) != due:
+                self._popped_followups[task_id] = due
+                due_ids.append(task_id)
+        return [{**self.get_task(task_id), "task_id": task_id} for task_id in due_ids]
+    
+    def add_conversation(self, user_id: str, message: str, response: str):
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO conversations (user_id, timestamp, user_message, assistant_response) VALUES (?, ?, ?, ?)",
+                (user_id, datetime.now().isoformat(), message, response)
+            )
+            # Keep only last 100 messages per user
+            self.conn.execute(
+                """DELETE FROM conversations WHERE user_id = ? AND id <= (
+                       SELECT id FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET 100)""",
+                (user_id, user_id)
+            )
+    
+    def get_user_context(self, user_id: str) -> Dict:
+        with self._lock:
+            conversations = self.conn.execute(
+                """SELECT timestamp, user_message, assistant_response FROM (
+                       SELECT * FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT 10)
+                   ORDER BY id""",
+                (user_id,)
+            ).fetchall()
+            preferences = self.conn.execute(
+                "SELECT data FROM preferences WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        
+        return {
+            "conversations": [dict(row) for row in conversations],
+            "preferences": json.loads(preferences["data"]) if preferences else {},
+            "patterns": self.get_pattern_summary(user_id)
+        }
+    
+    def _get_histogram(self, user_id: str, pattern_type: str) -> Dict:
+        row = self.conn.execute(
+            "SELECT data FROM pattern_counters WHERE user_id = ? AND pattern_type = ?", (user_id, pattern_type)
+        ).fetchone()
+        return json.loads(row["data"]) if row else {}
+    
+    def _write_histogram(self, user_id: str, pattern_type: str, histogram: Dict) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pattern_counters (user_id, pattern_type, data) VALUES (?, ?, ?)",
+            (user_id, pattern_type, json.dumps(histogram))
+        )
+    
+    def learn_pattern(self, user_id: str, pattern_type: str, pattern_data: Dict):
+        event = {"data": pattern_data, "timestamp": datetime.now().isoformat()}
+        with self._transaction():
+            histogram = fold_pattern_event(self._get_histogram(user_id, pattern_type), event)
+            self._write_histogram(user_id, pattern_type, histogram)
+    
+    def get_pattern_summary(self, user_id: str) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT pattern_type, data FROM pattern_counters WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        return {row["pattern_type"]: summarize_pattern(json.loads(row["data"])) for row in rows}
+    
+    def add_routine(self, routine_id: str, routine_data: Dict):
+        with self._transaction():
+            self._write_routine(routine_id, {
+                **routine_data,
+                "created_at": datetime.now().isoformat(),
+                "last_executed": None,
+                "execution_count": 0
+            })
+    
+    def update_routine_execution(self, routine_id: str):
+        with self._transaction():
+            row = self.conn.execute("SELECT routine_id, data FROM routines WHERE routine_id = ?", (routine_id,)).fetchone()
+            if row:
+                routine = json.loads(row["data"])
+                routine["last_executed"] = datetime.now().isoformat()
+                routine["execution_count"] = routine.get("execution_count", 0) + 1
+                self._write_routine(routine_id, routine)
+    
+    def get_routines(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT routine_id, data FROM routines ORDER BY created_at").fetchall()
+        return {row["routine_id"]: json.loads(row["data"]) for row in rows}
+    
+    def get_due_routines(self) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT routine_id, data FROM routines
+                   WHERE enabled = 1 AND next_run_at <= ? ORDER BY next_run_at""",
+                (datetime.now().isoformat(),)
+            ).fetchall()
+        return [self._routine_from_row(row) for row in rows]
+    
+    def next_routine_due(self) -> Optional[datetime]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_run_at) FROM routines WHERE enabled = 1 AND next_run_at IS NOT NULL"
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row[0] else None
+    
+    def add_insight(self, insight: str, category: str = "general"):
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO insights (insight, category, timestamp) VALUES (?, ?, ?)",
+                (insight, category, datetime.now().isoformat())
+            )
+            # Keep only last 50 insights
+            self.conn.execute(
+                "DELETE FROM insights WHERE id <= (SELECT id FROM insights ORDER BY id DESC LIMIT 1 OFFSET 50)"
+            )
+    
+    def get_insights(self, limit: int = 5) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT insight, category, timestamp FROM (SELECT * FROM insights ORDER BY id DESC LIMIT ?) ORDER BY id",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tasks": self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0],
+                "patterns": self.conn.execute("SELECT COUNT(DISTINCT user_id) FROM pattern_counters").fetchone()[0],
+                "insights": self.conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+            }
+    
+    def apply_retention(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Archive old finished tasks
+        """
+        now = now or datetime.now()
+        task_cutoff = (now - timedelta(days=self.task_retention_days)).isoformat()
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        
+        with self._transaction():
+            expired = self.conn.execute(
+                f"""SELECT task_id, data FROM (
+                        SELECT task_id, data, updated_at,
+                               ROW_NUMBER() OVER (ORDER BY updated_at DESC) AS position
+                        FROM tasks WHERE status IN ({placeholders}))
+                    WHERE position > ? OR updated_at < ?""",
+                (*FINISHED_STATUSES, self.max_completed_tasks, task_cutoff)
+            ).fetchall()
+            
+            # Archive before deleting so a failure never loses tasks
+            if expired:
+                with open(self.archive_path, 'a') as f:
+                    for row in expired:
+                        f.write(json.dumps({**self._task_from_row(row), "archived_at": now.isoformat()}, default=str) + "\n")
+                self.conn.executemany("DELETE FROM tasks WHERE task_id = ?", [(row["task_id"],) for row in expired])
+        
+        return {"archived_tasks": len(expired)}
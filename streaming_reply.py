@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+TELEGRAM_LIMIT = 4000
+PLACEHOLDER = "⏳ Working on it…"
+
+def split_message(text: str, limit: int = TELEGRAM_LIMIT) -> List[str]:
+    return [text[i:i + limit] for i in range(0, len(text), limit)] or [""]
+
+class StreamingReply:
+    """
+    Reply to one message while the crew is still working. A placeholder is
+    posted once progress arrives (or after `placeholder_delay` seconds) and
+    edited with the latest progress at most every `edit_interval` seconds;
+    the typing indicator is renewed until the reply is finished. finish()
+    turns the placeholder into the final answer. With `edit_interval=None`
+    only the typing indicator is kept alive and the answer is sent as usual.
+    
+    start() calls tick() every `poll_interval` seconds (by default the
+    shortest of the intervals above); all timing decisions use `clock`.
+    """
+    
+    def __init__(self, send: Callable[[str], Awaitable[Any]], send_typing: Callable[[], Awaitable[Any]],
+                 edit_interval: Optional[float] = 1.5, placeholder_delay: float = 1.0,
+                 typing_interval: float = 4.0, poll_interval: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.send = send
+        self.send_typing = send_typing
+        self.edit_interval = edit_interval
+        self.placeholder_delay = placeholder_delay
+        self.typing_interval = typing_interval
+        self.poll_interval = poll_interval or min(typing_interval, edit_interval or typing_interval, placeholder_delay)
+        self.clock = clock
+        self.edits = 0
+        
+        self._started = 0.0
+        self._last_typing = self._last_edit = float("-inf")
+        self._message = None
+        self._placeholder: Optional[asyncio.Future] = None
+        self._latest: Optional[str] = None
+        self._shown: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._started = self.clock()
+        self._task = asyncio.create_task(self._run())
+    
+    def update(self, text: str) -> None:
+        """
+        Latest progress text; safe to call from the crew's worker thread
+        """
+        if self.edit_interval is None or self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._set_latest, text)
+    
+    def _set_latest(self, text: str) -> None:
+        self._latest = text
+    
+    async def _run(self) -> None:
+        while True:
+            await self.tick()
+            await asyncio.sleep(self.poll_interval)
+    
+    async def tick(self) -> None:
+        """
+        Renew the typing indicator and post or edit the placeholder if due
+        """
+        now = self.clock()
+        # Telegram clears the typing indicator after about five seconds
+        if now - self._last_typing >= self.typing_interval:
+            self._last_typing = now
+            await self._quietly(self.send_typing())
+        
+        if self.edit_interval is None:
+            return
+        if self._message is None and (self._latest is not None or now - self._started >= self.placeholder_delay):
+            # Shielded so finish() can still edit a placeholder that was mid-send
+            self._placeholder = asyncio.ensure_future(self._quietly(self.send(self._render(self._latest))))
+            self._message = await asyncio.shield(self._placeholder)
+            self._shown, self._last_edit = self._latest, now
+        elif (self._message is not None and self._latest != self._shown
+              and now - self._last_edit >= self.edit_interval):
+            # Edits are throttled to stay within Telegram's rate limits
+            self._shown, self._last_edit = self._latest, now
+            await self._quietly(self._message.edit_text(self._render(self._latest)))
+            self.edits += 1
+    
+    @staticmethod
+    def _render(progress: Optional[str]) -> str:
+        if not progress:
+            return PLACEHOLDER
+        return f"{PLACEHOLDER}\n\n{progress}"[:TELEGRAM_LIMIT]
+    
+    @staticmethod
+    async def _quietly(request: Awaitable[Any]) -> Any:
+        try:
+            return await request
+        except Exception as e:
+            print(f"⚠️ Progress update failed: {e}")
+            return None
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def finish(self, response: str) -> None:
+        """
+        Stop streaming and deliver the final response, split to fit Telegram
+        """
+        await self.stop()
+        if self._placeholder is not None:
+            self._message = await self._placeholder
+        parts = split_message(response)
+        if self._message is not None:
+            try:
+                await self._message.edit_text(parts[0])
+                parts = parts[1:]
+            except Exception as e:
+                print(f"⚠️ Could not replace progress message: {e}")
+        for part in parts:
+            await self.send(part)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the secretary's thinking cycles, with the crews stubbed out
+"""
+
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("googleapiclient")
+
+from autonomous_secretary import AutonomousSecretary
+from crew_pool import CrewCancelled, CrewPool, CrewRun
+from test_crew_pool import CALLS, FakeCrew
+
+@pytest.fixture
+def secretary(tmp_path, monkeypatch):
+    """
+    A secretary with its memory in a temporary directory, a settable context
+    fingerprint and crews that record their runs instead of calling an LLM
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MEMORY_BACKEND", "json")
+    monkeypatch.setenv("MAX_SKIPPED_CYCLES", "2")
+    secretary = AutonomousSecretary()
+    secretary.fingerprint = "a"
+    secretary.runs = []
+    secretary.failing = set()
+    
+    async def kickoff(workflow, inputs, timeout=None, run=None):
+        secretary.runs.append(workflow)
+        if workflow in secretary.failing:
+            raise asyncio.TimeoutError()
+        return '{"action_needed": false, "reasoning": "all quiet"}'
+    
+    monkeypatch.setattr(secretary, "_kickoff", kickoff)
+    monkeypatch.setattr(secretary, "_context_fingerprint", lambda *args: secretary.fingerprint)
+    yield secretary
+    secretary.close()
+
+def cycle(secretary):
+    before = len(secretary.runs)
+    result = asyncio.run(secretary.think_and_act())
+    return result, secretary.runs[before:]
+
+def test_unchanged_context_is_skipped_up_to_the_ceiling(secretary):
+    result, runs = cycle(secretary)
+    assert sorted(runs) == ["monitor", "think"] and not result.get("skipped")
+    
+    for skipped in (1, 2):
+        result, runs = cycle(secretary)
+        assert result == {"action_needed": False, "skipped": True} and runs == []
+        assert secretary.skipped_cycles == skipped
+    
+    # Two skips in a row: the third unchanged cycle runs anyway and resets the count
+    result, runs = cycle(secretary)
+    assert sorted(runs) == ["monitor", "think"] and secretary.skipped_cycles == 0
+    result, runs = cycle(secretary)
+    assert result.get("skipped") and runs == []
+    
+    secretary.fingerprint = "b"
+    result, runs = cycle(secretary)
+    assert sorted(runs) == ["monitor", "think"] and secretary.skipped_cycles == 0
+
+def test_partial_failure_does_not_mark_the_context_as_seen(secretary):
+    secretary.failing = {"monitor"}
+    result, runs = cycle(secretary)
+    # The thinking branch still decides
+    assert result["action_needed"] is False and result["reasoning"] == "all quiet"
+    
+    secretary.failing = set()
+    result, runs = cycle(secretary)
+    assert sorted(runs) == ["monitor", "think"]
+    result, runs = cycle(secretary)
+    assert result.get("skipped")
+
+def test_both_branches_failing_reports_an_error(secretary):
+    secretary.failing = {"think", "monitor"}
+    result, runs = cycle(secretary)
+    assert result["action_needed"] is False and "error" in result
+    
+    secretary.failing = set()
+    result, runs = cycle(secretary)
+    assert sorted(runs) == ["monitor", "think"]
+
+def test_zero_ceiling_disables_skipping(secretary):
+    secretary.max_skipped_cycles = 0
+    for _ in range(3):
+        result, runs = cycle(secretary)
+        assert sorted(runs) == ["monitor", "think"]
+
+def test_timed_out_crew_is_cancelled_before_its_next_tool(secretary):
+    gate = threading.Event()
+    crew = FakeCrew(CALLS, gate)
+    secretary.crews["think"] = CrewPool("think", lambda: crew)
+    run = CrewRun()
+    
+    # The fixture stubs _kickoff on the instance; run the real one
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(AutonomousSecretary._kickoff(secretary, "think", {}, timeout=0.05, run=run))
+    assert run.cancelled.is_set() and not secretary._active_runs
+    
+    # The worker thread carries on until the crew's first tool call, then stops
+    gate.set()
+    secretary._crew_executor.shutdown(wait=True)
+    pooled = secretary.crews["think"]._idle[0]
+    assert isinstance(pooled.outcome, CrewCancelled) and pooled.kickoffs == [{}]
+    assert pooled.results == [] and run.tools_used == set()
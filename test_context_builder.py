@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the token-budgeted prompt context builder
+"""
+
+from context_builder import ContextBuilder, Section, count_tokens, format_task
+
+def test_small_context_is_kept_whole():
+    text, usage = ContextBuilder(500).build([
+        Section("Pending tasks", ["email Bob", "book a room"]),
+        Section("Recent insights", ["user prefers mornings", "user prefers mornings"]),
+        Section("Due routines", [])
+    ])
+    
+    assert text == "Pending tasks:\n- email Bob\n- book a room\n\nRecent insights:\n- user prefers mornings"
+    assert set(usage) == {"Pending tasks", "Recent insights"}
+
+def test_budget_drops_least_relevant_items_first():
+    items = [f"task number {i} " + "details " * 10 for i in range(50)]
+    text, usage = ContextBuilder(200).build([
+        Section("Pending tasks", items, weight=3),
+        Section("Recent conversations", [f"message {i}" for i in range(5)], chronological=True)
+    ])
+    
+    assert count_tokens(text) <= 220
+    assert "task number 0 " in text and "task number 49 " not in text
+    assert "more omitted" in text
+    # Conversations are given newest first and shown oldest first
+    assert text.index("message 4") < text.index("message 0")
+    assert sum(usage.values()) == sum(count_tokens(block) for block in text.split("\n\n"))
+
+def test_unused_share_goes_to_other_sections():
+    items = [f"task {i} " + "x" * 40 for i in range(30)]
+    text, _ = ContextBuilder(400).build([
+        Section("Recent insights", ["one insight"], weight=5),
+        Section("Pending tasks", items, weight=1)
+    ])
+    
+    assert text.count("- task ") > 15
+
+def test_format_task_is_compact():
+    line = format_task({
+        "task_id": "0123456789abcdef", "type": "send_email", "status": "completed",
+        "created_at": "2024-01-01T10:00:00.123", "decision": {"priority": "high", "reasoning": "why " * 200},
+        "result": "Sent the quarterly report to Bob " * 20
+    })
+    
+    assert line.startswith("[completed] send_email #01234567, created 2024-01-01T10:00, high priority: Sent")
+    assert len(line) < 220
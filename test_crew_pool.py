@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Tests for pooled crews and cancelling their runs, with fake crews
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("crewai")
+
+from crew_pool import CrewCancelled, CrewPool, CrewRun, _current_run, tool_started
+from response_cache import ResponseCache
+
+class FakeTool:
+    """
+    Tool that reports its start like ours do, then runs `action`
+    """
+    
+    def __init__(self, name, action=None):
+        self.name = name
+        self.action = action
+    
+    def _run(self, **kwargs):
+        tool_started(self.name)
+        if self.action is not None:
+            self.action()
+        return f"{self.name} done"
+
+class FakeCrew:
+    """
+    Crew that calls back the way crewai's native tool calling does: each
+    tool call goes straight to the tool's _run on a worker thread, in a copy
+    of the caller's context, with tool errors handed back to the LLM as
+    text. The step callback only sees the final answer. `gate`, if given,
+    holds the crew before its first call.
+    """
+    
+    def __init__(self, calls, gate=None):
+        self.calls = calls
+        self.gate = gate
+        self.step_callback = None
+        self.kickoffs = []
+        self.results = []
+        self.outcome = None
+    
+    def copy(self):
+        return FakeCrew(self.calls, self.gate)
+    
+    def _call(self, tool, kwargs):
+        try:
+            return tool._run(**kwargs)
+        except Exception as e:
+            return f"Error executing tool: {e}"
+    
+    def kickoff(self, inputs):
+        self.kickoffs.append(inputs)
+        if self.gate is not None:
+            self.gate.wait(5)
+        try:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                for tool, kwargs in self.calls:
+                    self.results.append(pool.submit(contextvars.copy_context().run, self._call, tool, kwargs).result())
+            self.step_callback(SimpleNamespace(thought="", tool=None, output="All quiet"))
+        except CrewCancelled as e:
+            self.outcome = e
+            raise
+        self.outcome = "finished"
+        return f"done with {inputs}"
+
+CALLS = [(FakeTool("Read Gmail"), {}), (FakeTool("List Calendar Events"), {})]
+
+def make_pool(calls=CALLS, gate=None):
+    built = []
+    
+    def factory():
+        built.append(FakeCrew(calls, gate))
+        return built[-1]
+    pool = CrewPool("think", factory)
+    pool.built = built
+    return pool
+
+def test_runs_record_tools_and_report_progress():
+    pool = make_pool()
+    progress = []
+    run = CrewRun(on_progress=progress.append)
+    
+    assert pool.kickoff({"context": "x"}, run) == "done with {'context': 'x'}"
+    # Recorded by the tools themselves, on crewai's worker threads
+    assert run.tools_used == {"Read Gmail", "List Calendar Events"}
+    # Native tool calls only reach the step callback with the final answer
+    assert progress == ["🔧 Using Read Gmail…", "🔧 Using List Calendar Events…", "All quiet"]
+    assert _current_run.get() is None
+    
+    # The crew goes back to the pool and serves the next run
+    pool.kickoff({}, CrewRun())
+    assert pool.size == 1 and len(pool.built) == 1
+
+def test_queued_run_cancelled_before_it_starts():
+    pool = make_pool()
+    run = CrewRun()
+    run.cancel()
+    
+    with pytest.raises(CrewCancelled):
+        pool.kickoff({}, run)
+    # No crew was built or taken from the pool
+    assert pool.built == [] and pool.size == 0
+
+def test_cancelled_run_stops_before_its_next_tool():
+    run = CrewRun()
+    sent = []
+    pool = make_pool([(FakeTool("Read Gmail", action=run.cancel), {}),
+                      (FakeTool("Send Gmail", action=lambda: sent.append(True)), {})])
+    
+    # Not turned into a tool error the LLM could carry on from
+    with pytest.raises(CrewCancelled):
+        pool.kickoff({}, run)
+    assert sent == [] and run.tools_used == {"Read Gmail"}
+    crew = pool._idle[0]
+    assert isinstance(crew.outcome, CrewCancelled) and crew.results == ["Read Gmail done"]
+    assert _current_run.get() is None
+    
+    # The crew is back in the pool and runs normally afterwards
+    assert pool.kickoff({}, CrewRun()) == "done with {}"
+    assert sent == [True] and pool.size == 1
+
+def test_cancelled_run_stops_at_its_final_step():
+    run = CrewRun()
+    progress = []
+    run.on_progress = progress.append
+    pool = make_pool([(FakeTool("Read Gmail", action=run.cancel), {})])
+    
+    with pytest.raises(CrewCancelled):
+        pool.kickoff({}, run)
+    assert progress == ["🔧 Using Read Gmail…"]
+
+def test_progress_listener_errors_do_not_fail_the_run():
+    pool = make_pool()
+    
+    def broken(text):
+        raise RuntimeError("chat went away")
+    assert pool.kickoff({}, CrewRun(on_progress=broken)) == "done with {}"
+
+def test_real_tools_with_side_effects_keep_the_answer_out_of_the_cache(monkeypatch):
+    pytest.importorskip("googleapiclient")
+    from tools.gmail_tool import GmailTool
+    
+    class FakeGmail:
+        def users(self):
+            return self
+        
+        def messages(self):
+            return self
+        
+        def send(self, userId, body):
+            return SimpleNamespace(execute=lambda: {'id': 'sent-1'})
+    
+    monkeypatch.setattr(GmailTool, "_get_service", lambda self: (FakeGmail(), None))
+    pool = make_pool([(GmailTool(), {"to": "bob@x.com", "subject": "Weekly report", "body": "Attached"})])
+    run = CrewRun()
+    
+    pool.kickoff({}, run)
+    assert pool._idle[0].results == ["Email sent successfully! Message ID: sent-1"]
+    assert run.tools_used == {"Send Gmail"}
+    cache = ResponseCache({"routine": 60})
+    assert not cache.put("routine", cache.make_key("routine", "email the weekly report"), "Sent!", run.tools_used)
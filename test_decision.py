@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""
+Tests for structured decision parsing
+"""
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from decision import Decision, merge_decisions, parse_decision
+
+class CrewResult:
+    def __init__(self, raw, pydantic=None):
+        self.raw = raw
+        self.pydantic = pydantic
+
+def test_prefers_structured_output():
+    structured = Decision(action_needed=True, primary_action="send_followup", targets=["bob@example.com"], priority="high")
+    assert parse_decision(CrewResult("I should check and send things", structured)) == structured
+
+def test_json_in_raw_text_is_validated():
+    raw = 'Decision:\n{"action_needed": true, "primary_action": "send_email", "priority": "low", "reasoning": "Invoice"}'
+    decision = parse_decision(CrewResult(raw))
+    assert (decision.action_needed, decision.primary_action, decision.priority) == (True, "send_email", "low")
+
+@pytest.mark.parametrize("raw", [
+    "I will check email and send a follow-up if needed, and schedule the review.",
+    '{"action_needed": true, "priority": "urgent!!"}',
+    '{"action_needed": true, "primary_action": null}'
+])
+def test_unstructured_or_invalid_output_means_no_action(raw):
+    assert parse_decision(CrewResult(raw)).action_needed is False
+
+def test_merge_picks_most_urgent_action_and_keeps_context():
+    thinking = Decision(action_needed=True, primary_action="schedule_event", priority="medium", reasoning="Prep for review")
+    monitoring = Decision(action_needed=True, primary_action="send_followup", priority="high", reasoning="Bob is overdue")
+    idle = Decision(reasoning="Nothing else")
+    
+    merged = merge_decisions(thinking, monitoring, idle)
+    assert merged.primary_action == "send_followup"
+    assert "Prep for review" in merged.reasoning and "Nothing else" in merged.reasoning
+    assert merge_decisions(idle).action_needed is False
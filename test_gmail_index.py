@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the local Gmail mailbox index, against a fake Gmail service
+"""
+
+import copy
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("googleapiclient")
+
+import httplib2
+from googleapiclient.errors import HttpError
+from tools.gmail_index import MailboxIndex, parse_query
+
+NOW = datetime(2026, 3, 10, 12, 0)
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'')
+
+def make_message(message_id, sender, subject, days_ago, labels=('INBOX',)):
+    received = datetime.now() - timedelta(days=days_ago)
+    return {
+        'id': message_id,
+        'threadId': f"t-{message_id}",
+        'labelIds': list(labels),
+        'internalDate': str(int(received.timestamp() * 1000)),
+        'payload': {'headers': [{'name': 'From', 'value': sender}, {'name': 'Subject', 'value': subject}]}
+    }
+
+class FakeRequest:
+    def __init__(self, run):
+        self.run = run
+    
+    def execute(self):
+        return self.run()
+
+class FakeBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+    
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+    
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+class FakeGmail:
+    """
+    users().getProfile / messages().list / messages().get / history().list
+    and batches, over an in-memory mailbox
+    """
+    
+    def __init__(self, mailbox):
+        self.mailbox = {message['id']: message for message in mailbox}
+        self.history_id = '100'
+        self.history_pages = []
+        self.history_expired = False
+        self.calls = []
+    
+    def users(self):
+        return self
+    
+    def messages(self):
+        return self
+    
+    def history(self):
+        return FakeHistory(self)
+    
+    def getProfile(self, userId):
+        self.calls.append('getProfile')
+        return FakeRequest(lambda: {'historyId': self.history_id})
+    
+    def list(self, userId, q, maxResults, pageToken=None):
+        self.calls.append('list')
+        ids = sorted(self.mailbox, key=lambda i: self.mailbox[i]['internalDate'], reverse=True)[:maxResults]
+        return FakeRequest(lambda: {'messages': [{'id': i} for i in ids]})
+    
+    def get(self, userId, id, format, metadataHeaders=None):
+        def run():
+            if id not in self.mailbox:
+                raise http_error(404)
+            return copy.deepcopy(self.mailbox[id])
+        return FakeRequest(run)
+    
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback)
+
+class FakeHistory:
+    def __init__(self, gmail):
+        self.gmail = gmail
+    
+    def list(self, userId, startHistoryId, historyTypes, pageToken=None):
+        self.gmail.calls.append(('history', startHistoryId))
+        def run():
+            if self.gmail.history_expired:
+                raise http_error(404)
+            return self.gmail.history_pages.pop(0) if self.gmail.history_pages else {'historyId': self.gmail.history_id}
+        return FakeRequest(run)
+
+def ids(messages):
+    return [message['id'] for message in messages]
+
+def test_parse_query_accepts_only_simple_searches():
+    assert parse_query("is:unread from:bob@x.com", now=NOW) == {'unread': True, 'senders': ['bob@x.com']}
+    assert parse_query('subject:"weekly report" in:inbox newer_than:2d', now=NOW) == {
+        'subject': 'weekly report', 'label': 'INBOX', 'since': NOW - timedelta(days=2)}
+    assert parse_query("after:2026/03/01", now=NOW) == {'since': datetime(2026, 3, 1)}
+    assert parse_query("", now=NOW) == {}
+    
+    for query in ("invoice", "from:a from:b", "from:(a OR b)", "label:Receipts", "newer_than:2w",
+                  "newer_than:1d after:2026/03/01", "has:attachment", 'subject:"unclosed'):
+        assert parse_query(query, now=NOW) is None, query
+
+def test_history_replays_adds_deletes_and_label_changes():
+    gmail = FakeGmail([
+        make_message('m1', 'Bob <bob@x.com>', 'Lunch', 1, ['INBOX', 'UNREAD']),
+        make_message('m2', 'alice@y.com', 'Report', 2),
+        make_message('old', 'carol@z.com', 'Archive', 30),
+    ])
+    index = MailboxIndex(window_days=7, min_sync_interval=0)
+    since = datetime.now() - timedelta(days=3)
+    
+    assert ids(index.query(gmail, since=since)) == ['m1', 'm2']
+    assert ids(index.query(gmail, unread=True)) == ['m1']
+    assert index.bootstraps == 1
+    
+    gmail.mailbox['m3'] = make_message('m3', 'dave@x.com', 'New', 0, ['INBOX', 'UNREAD'])
+    del gmail.mailbox['m2']
+    gmail.mailbox['old']['labelIds'] = ['INBOX', 'UNREAD']
+    gmail.history_id = '120'
+    gmail.history_pages = [
+        {'history': [
+            {'messagesAdded': [{'message': {'id': 'm3'}}]},
+            {'messagesDeleted': [{'message': {'id': 'm2'}}]},
+            {'labelsRemoved': [{'message': {'id': 'm1', 'labelIds': ['INBOX']}, 'labelIds': ['UNREAD']}]},
+        ], 'nextPageToken': 'p2'},
+        # Older mail marked unread again joins the index
+        {'history': [{'labelsAdded': [{'message': {'id': 'old', 'labelIds': ['INBOX', 'UNREAD']},
+                                       'labelIds': ['UNREAD']}]}],
+         'historyId': '120'},
+    ]
+    
+    assert ids(index.query(gmail, since=since)) == ['m3', 'm1']
+    assert ids(index.query(gmail, unread=True)) == ['m3', 'old']
+    assert ids(index.query(gmail, since=since, senders=['bob@x.com'], unread=False)) == ['m1']
+    assert index.bootstraps == 1 and ('history', '120') in gmail.calls
+
+def test_senders_with_an_address_match_it_exactly():
+    gmail = FakeGmail([
+        make_message('bob', 'Bob <bob@x.com>', 'Hi', 1, ['INBOX', 'UNREAD']),
+        make_message('jim', 'Jim Bob <jimbob@x.com>', 'Hey', 1, ['INBOX', 'UNREAD']),
+        make_message('ann', 'Ann <ann@y.com>', 'Yo', 1),
+    ])
+    index = MailboxIndex(window_days=7, min_sync_interval=0)
+    since = datetime.now() - timedelta(days=2)
+    
+    # Gmail would not return jimbob@x.com for from:bob@x.com
+    assert ids(index.query(gmail, since=since, senders=['bob@x.com'])) == ['bob']
+    assert ids(index.query(gmail, since=since, senders=['BOB@X.COM'])) == ['bob']
+    # Names and domains still match part of the header
+    assert sorted(ids(index.query(gmail, since=since, senders=['bob']))) == ['bob', 'jim']
+    assert sorted(ids(index.query(gmail, since=since, senders=['x.com']))) == ['bob', 'jim']
+    assert sorted(ids(index.query(gmail, since=since, senders=['@x.com']))) == ['bob', 'jim']
+    
+    # As GmailReadTool asks for it
+    assert ids(index.query_string(gmail, "from:bob@x.com is:unread")) == ['bob']
+
+def test_expired_history_rebuilds_the_index():
+    gmail = FakeGmail([make_message('m1', 'bob@x.com', 'Hi', 1)])
+    index = MailboxIndex(window_days=7, min_sync_interval=0)
+    assert ids(index.query(gmail, unread=False, since=datetime.now() - timedelta(days=2))) == ['m1']
+    
+    gmail.mailbox = {'m2': make_message('m2', 'bob@x.com', 'Hello', 0)}
+    gmail.history_expired = True
+    assert ids(index.query(gmail, since=datetime.now() - timedelta(days=2))) == ['m2']
+    assert index.bootstraps == 2
+
+def test_searches_outside_the_index_go_to_the_api_without_syncing():
+    gmail = FakeGmail([make_message(f"m{i}", 'bob@x.com', 'Hi', i, ['INBOX', 'UNREAD']) for i in range(5)])
+    index = MailboxIndex(window_days=7, max_messages=3, min_sync_interval=0)
+    
+    # Older than the window, or with no bound at all: not even a sync
+    assert index.query(gmail, since=datetime.now() - timedelta(days=30)) is None
+    assert index.query(gmail, senders=['bob@x.com']) is None
+    assert gmail.calls == []
+    
+    # Truncated to the newest three: unread mail is not complete, and only
+    # the span those three cover is
+    assert index.query(gmail, unread=True) is None
+    assert index.bootstraps == 1
+    assert ids(index.query(gmail, since=datetime.now() - timedelta(days=1, hours=12))) == ['m0', 'm1']
+    assert index.query(gmail, since=datetime.now() - timedelta(days=4)) is None
+
+def test_searches_during_a_sync_fall_back_to_the_api():
+    gmail = FakeGmail([make_message('m1', 'bob@x.com', 'Hi', 1, ['INBOX', 'UNREAD'])])
+    index = MailboxIndex(window_days=7, min_sync_interval=0)
+    
+    index._sync_lock.acquire()
+    try:
+        assert index.query(gmail, unread=True) is None
+    finally:
+        index._sync_lock.release()
+    assert gmail.calls == []
+    assert ids(index.query(gmail, unread=True)) == ['m1']
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""
+Tests for batched Gmail fetches and response checks, against a fake Gmail service
+"""
+
+import json
+import re
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("googleapiclient")
+
+import httplib2
+from googleapiclient.errors import HttpError
+from tools import gmail_index, gmail_read_tool
+from tools.gmail_read_tool import (
+    ADDRESSES_PER_QUERY, MESSAGES_PER_ADDRESS, CheckEmailResponsesTool, fetch_messages
+)
+
+def http_error(status, reason=None):
+    content = b''
+    if reason is not None:
+        content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}]}}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+def header(message, name):
+    return next((h['value'] for h in message.get('payload', {}).get('headers', []) if h['name'] == name), '')
+
+def make_message(message_id, sender, subject, received):
+    return {
+        'id': message_id,
+        'internalDate': str(received),
+        'payload': {'headers': [{'name': 'From', 'value': sender}, {'name': 'Subject', 'value': subject},
+                                {'name': 'Date', 'value': f"day {received}"}]}
+    }
+
+class FakeRequest:
+    def __init__(self, gmail, message_id):
+        self.gmail = gmail
+        self.message_id = message_id
+    
+    def execute(self):
+        self.gmail.single_calls += 1
+        return self.gmail.respond(self.message_id)
+
+class FakeListRequest:
+    def __init__(self, response):
+        self.response = response
+    
+    def execute(self):
+        return self.response
+
+class FakeBatch:
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.requests = []
+    
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+    
+    def execute(self):
+        self.gmail.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, self.gmail.respond(request.message_id), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+class FakeGmail:
+    """
+    messages().get() and batches over an in-memory mailbox; `errors` maps a
+    message id to the statuses its next calls fail with
+    """
+    
+    def __init__(self, mailbox, errors=None):
+        self.mailbox = mailbox
+        self.errors = errors or {}
+        self.batches = []
+        self.single_calls = 0
+        self.queries = []
+    
+    def users(self):
+        return self
+    
+    def messages(self):
+        return self
+    
+    def get(self, userId, id, format, metadataHeaders=None):
+        return FakeRequest(self, id)
+    
+    def list(self, userId, q, maxResults, pageToken=None):
+        # Like Gmail, from: matches any part of the From header
+        self.queries.append(q)
+        terms = re.search(r"from:\((.*?)\)", q).group(1).lower().split(" or ")
+        matches = [{'id': message_id} for message_id, message in self.mailbox.items()
+                   if any(term in header(message, 'From').lower() for term in terms)]
+        matches.sort(key=lambda match: int(self.mailbox[match['id']]['internalDate']), reverse=True)
+        return FakeListRequest({'messages': matches[:maxResults]})
+    
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+    
+    def respond(self, message_id):
+        statuses = self.errors.get(message_id)
+        if statuses:
+            status = statuses.pop(0)
+            raise http_error(*status) if isinstance(status, tuple) else http_error(status)
+        if message_id not in self.mailbox:
+            raise http_error(404)
+        return self.mailbox[message_id]
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(gmail_read_tool.time, "sleep", sleeps.append)
+    return sleeps
+
+def mailbox(count):
+    return {f"m{i}": {'id': f"m{i}"} for i in range(count)}
+
+def test_throttled_calls_are_retried_as_a_smaller_batch(sleeps):
+    gmail = FakeGmail(mailbox(120), errors={'m3': [429], 'm60': [429, 503], 'm61': [429]})
+    del gmail.mailbox['m7']
+    
+    messages = fetch_messages(gmail, [f"m{i}" for i in range(120)] + ['m3'])
+    
+    # Deleted messages are skipped, every other one arrives
+    assert sorted(messages) == sorted(f"m{i}" for i in range(120) if i != 7)
+    # Three retry calls go out as one batch, then m60 alone, never one by one
+    assert gmail.batches == [50, 50, 20, 3, 1]
+    assert gmail.single_calls == 0
+    assert sleeps == [1.0, 2.0]
+
+def test_persistent_throttling_gives_up_after_the_last_round(sleeps):
+    gmail = FakeGmail(mailbox(3), errors={'m1': [429] * 10})
+    with pytest.raises(HttpError) as error:
+        fetch_messages(gmail, ['m0', 'm1', 'm2'])
+    assert error.value.resp.status == 429
+    assert sleeps == [1.0, 2.0, 4.0, 8.0]
+    assert len(gmail.batches) == gmail_read_tool.RETRY_ROUNDS + 1
+
+def test_other_errors_are_raised_without_retrying(sleeps):
+    for status in (400, (403, 'insufficientPermissions'), (403, 'forbidden'), 403):
+        gmail = FakeGmail(mailbox(3), errors={'m2': [status]})
+        with pytest.raises(HttpError) as error:
+            fetch_messages(gmail, ['m0', 'm1', 'm2'])
+        assert error.value.resp.status in (400, 403)
+        assert sleeps == [] and gmail.batches == [3]
+
+def test_rate_limit_403s_are_retried(sleeps):
+    gmail = FakeGmail(mailbox(3), errors={'m1': [(403, 'userRateLimitExceeded')], 'm2': [(403, 'rateLimitExceeded')]})
+    assert sorted(fetch_messages(gmail, ['m0', 'm1', 'm2'])) == ['m0', 'm1', 'm2']
+    assert sleeps == [1.0] and gmail.batches == [3, 2]
+
+@pytest.fixture
+def check_responses(monkeypatch):
+    """
+    Run CheckEmailResponsesTool against a fake mailbox, with the local
+    index turned off so every search goes through the API
+    """
+    monkeypatch.setattr(gmail_index.mailbox_index, "window_days", 0)
+    
+    def check(gmail, email_addresses, **kwargs):
+        monkeypatch.setattr(CheckEmailResponsesTool, "_get_service", lambda self: (gmail, None))
+        return CheckEmailResponsesTool()._run(email_addresses, **kwargs)
+    return check
+
+def test_responses_are_attributed_to_the_requested_address(check_responses):
+    gmail = FakeGmail({message['id']: message for message in [
+        make_message('a', 'Bob <bob@x.com>', 'Newest', 300),
+        make_message('b', 'Bob <bob@x.com>', 'Older', 100),
+        make_message('c', 'Jim Bob <jimbob@x.com>', 'Not Bob', 400),
+        make_message('d', 'Alice Smith <alice@z.com>', 'Hello', 200),
+    ]})
+    
+    output = check_responses(gmail, "bob@x.com, Alice, carol@y.com")
+    
+    # jimbob@x.com contains "bob@x.com" but is a different address
+    assert "✅ bob@x.com: 2 email(s) - Latest: Newest (day 300)" in output
+    assert "✅ Alice: 1 email(s) - Latest: Hello (day 200)" in output
+    assert "❌ carol@y.com: No response yet" in output
+    assert "Not Bob" not in output
+    assert len(gmail.queries) == 1 and gmail.queries[0].startswith("from:(bob@x.com OR Alice OR carol@y.com) after:")
+
+def test_many_addresses_are_searched_in_chunks(check_responses):
+    addresses = [f"person{i}@x.com" for i in range(2 * ADDRESSES_PER_QUERY + 5)]
+    gmail = FakeGmail({f"m{i}": make_message(f"m{i}", address, f"Re {i}", i) for i, address in enumerate(addresses)})
+    
+    output = check_responses(gmail, ", ".join(addresses + addresses[:3]), subject_keyword="report")
+    
+    chunks = [query.split(")")[0].split("(")[1].split(" OR ") for query in gmail.queries]
+    assert [len(chunk) for chunk in chunks] == [ADDRESSES_PER_QUERY, ADDRESSES_PER_QUERY, 5]
+    assert sum(chunks, []) == addresses
+    assert all(query.endswith(" subject:report") for query in gmail.queries)
+    # Every match is fetched in one batch, not one call each
+    assert gmail.batches == [len(addresses)] and gmail.single_calls == 0
+    assert output.count("✅") == len(addresses) and "❌" not in output
+
+def test_busy_senders_are_fetched_up_to_a_cap(check_responses):
+    gmail = FakeGmail({f"m{i}": make_message(f"m{i}", 'Bob <bob@x.com>', f"Re {i}", i) for i in range(50)})
+    gmail.mailbox['ann'] = make_message('ann', 'ann@y.com', 'Hi', 45)
+    
+    output = check_responses(gmail, "bob@x.com, ann@y.com", since_hours=24 * 30)
+    
+    # The newest matches of the group, not every one of them
+    assert gmail.batches == [2 * MESSAGES_PER_ADDRESS]
+    assert f"✅ bob@x.com: {2 * MESSAGES_PER_ADDRESS - 1}+ email(s) - Latest: Re 49 (day 49)" in output
+    assert "✅ ann@y.com: 1+ email(s)" in output
+
+def test_exact_addresses_win_over_partial_matches():
+    match = CheckEmailResponsesTool._match_sender
+    assert match("Bob <bob@x.com>", ["x.com", "bob@x.com"]) == "bob@x.com"
+    assert match("Bob <BOB@X.COM>", ["bob@x.com"]) == "bob@x.com"
+    assert match("Jim Bob <jimbob@x.com>", ["bob@x.com", "x.com"]) == "x.com"
+    assert match("Jim Bob <jimbob@x.com>", ["bob@x.com"]) is None
+    assert match("Alice Smith <alice@z.com>", ["carol@y.com", "alice smith"]) == "alice smith"
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the per-thread Google API clients and re-authentication
+"""
+
+import threading
+import pytest
+
+pytest.importorskip("googleapiclient")
+pytest.importorskip("google_auth_httplib2")
+
+from google.auth.exceptions import RefreshError
+from tools import google_auth, google_clients
+
+class FakeCredentials:
+    def __init__(self, name, refuse=False):
+        self.name = name
+        self.valid = True
+        self.expired = False
+        self.refresh_token = None
+        self.expiry = None
+        self.refuse = refuse
+    
+    def before_request(self, request, method, uri, headers):
+        if self.refuse:
+            raise RefreshError("invalid_grant: Token has been expired or revoked.")
+
+class FakeFlow:
+    def __init__(self, creds):
+        self.creds = creds
+    
+    def run_local_server(self, port):
+        return self.creds.pop(0)
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """
+    A fresh credential manager whose browser sign-ins hand out the
+    credentials appended to `manager.sign_ins`
+    """
+    manager = google_auth.CredentialManager(token_path=str(tmp_path / "token.pickle"))
+    manager.sign_ins = []
+    (tmp_path / "credentials.json").write_text("{}")
+    monkeypatch.setenv("GOOGLE_CREDENTIALS_PATH", str(tmp_path / "credentials.json"))
+    monkeypatch.setattr(google_auth.InstalledAppFlow, "from_client_secrets_file",
+                        lambda path, scopes: FakeFlow(manager.sign_ins))
+    monkeypatch.setattr(manager, "_start_refresher", lambda: None)
+    monkeypatch.setattr(google_auth, "credential_manager", manager)
+    monkeypatch.setattr(google_clients, "credential_manager", manager)
+    
+    monkeypatch.setattr(google_clients, "_local", threading.local())
+    monkeypatch.setattr(google_clients, "_discovery_document", lambda api, version: {})
+    monkeypatch.setattr(google_clients, "build_from_document", lambda document, http: {"http": http})
+    return manager
+
+def test_service_is_rebuilt_when_credentials_are_replaced(manager):
+    first = FakeCredentials("first")
+    manager.sign_ins.append(first)
+    service = google_clients.get_service("gmail", "v1")
+    assert service["http"].credentials is first
+    assert google_clients.get_service("gmail", "v1") is service
+    
+    # Expired with no refresh token: get() signs in again with new credentials
+    generation = google_clients._generation
+    first.valid = False
+    second = FakeCredentials("second")
+    manager.sign_ins.append(second)
+    rebuilt = google_clients.get_service("gmail", "v1")
+    assert rebuilt is not service and rebuilt["http"].credentials is second
+    # Other threads drop their services too
+    assert google_clients._generation > generation
+
+def test_refused_refresh_forces_reauthentication(manager):
+    revoked = FakeCredentials("revoked", refuse=True)
+    manager.sign_ins.append(revoked)
+    service = google_clients.get_service("gmail", "v1")
+    
+    with pytest.raises(RefreshError):
+        service["http"].request("https://gmail.googleapis.com/gmail/v1/users/me/profile")
+    
+    # The token file still holds the revoked credentials; they are not reloaded
+    fresh = FakeCredentials("fresh")
+    manager.sign_ins.append(fresh)
+    rebuilt = google_clients.get_service("gmail", "v1")
+    assert rebuilt["http"].credentials is fresh
+    assert manager.get() is fresh and not manager.sign_ins
+
+def test_no_credentials_means_no_service(manager, tmp_path, monkeypatch):
+    monkeypatch.setenv("GOOGLE_CREDENTIALS_PATH", str(tmp_path / "missing.json"))
+    assert google_clients.get_service("gmail", "v1") is None
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the fast-path intent router
+"""
+
+import pytest
+from intent_router import IntentRouter
+from memory_store import MemoryStore
+
+@pytest.fixture
+def router(tmp_path):
+    store = MemoryStore(str(tmp_path / "memory.json"), background_writes=False)
+    store.add_task("task", {"type": "email"})
+    store.add_routine("routine", {"name": "Morning Brief", "frequency": "daily at 7:00", "action": "Check weather"})
+    return IntentRouter(store)
+
+@pytest.mark.parametrize("message, intent", [
+    ("hi", "greeting"),
+    ("Hello there!", "greeting"),
+    ("thanks 🙏", "thanks"),
+    ("status?", "status"),
+    ("What are my pending tasks?", "pending"),
+    ("what's pending", "pending"),
+    ("show my routines", "routines"),
+    ("What have you learned about me?", "insights")
+])
+def test_classifies_local_intents(router, message, intent):
+    assert router.classify(message) == intent
+
+@pytest.mark.parametrize("message", [
+    "hi, email John about the report",
+    "show pending tasks and remind me tomorrow",
+    "Schedule a meeting tomorrow at 3 PM",
+    "what's the weather like",
+    "can you summarize what happened with the vendor invoice last week please"
+])
+def test_real_requests_escalate(router, message):
+    assert router.route("user", message) is None
+
+def test_lookups_answer_from_memory(router):
+    assert "email" in router.route("user", "pending tasks")
+    assert "Morning Brief" in router.route("user", "routines")
+    assert "Pending tasks: 1" in router.route("user", "status")
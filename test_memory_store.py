@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+Tests for MemoryStore persistence and indexes
+"""
+
+import asyncio
+import json
+import pytest
+import threading
+import time
+from datetime import datetime, timedelta
+from memory_store import MemoryStore, TaskStatus
+
+def _scan_by_status(store: MemoryStore) -> dict:
+    """Rebuild the status -> task ids mapping the slow way"""
+    expected = {}
+    for task_id, task in store.memory["tasks"].items():
+        expected.setdefault(task["status"], set()).add(task_id)
+    return expected
+
+def _indexed_by_status(store: MemoryStore) -> dict:
+    return {status: set(ids) for status, ids in store._status_index.items() if ids}
+
+def _populate(store: MemoryStore) -> None:
+    for i in range(20):
+        store.add_task(f"task-{i}", {"type": "email"})
+    for i in range(0, 20, 3):
+        store.update_task(f"task-{i}", {
+            "status": TaskStatus.WAITING_RESPONSE.value,
+            "last_action_time": (datetime.now() - timedelta(hours=30)).isoformat()
+        })
+    for i in range(1, 20, 4):
+        store.update_task(f"task-{i}", {"status": TaskStatus.COMPLETED.value})
+    store.add_task("logged", {"type": "send_email", "status": TaskStatus.COMPLETED.value})
+
+def test_status_index_tracks_updates(tmp_path):
+    store = MemoryStore(str(tmp_path / "memory.json"))
+    _populate(store)
+    
+    assert _indexed_by_status(store) == _scan_by_status(store)
+    assert "logged" not in {task["task_id"] for task in store.get_pending_tasks()}
+    assert {task["task_id"] for task in store.get_tasks_requiring_followup(24)} == \
+        _scan_by_status(store)[TaskStatus.WAITING_RESPONSE.value]
+
+def test_status_index_consistent_after_reload(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path)
+    _populate(store)
+    pending_before = [task["task_id"] for task in store.get_pending_tasks()]
+    store.flush()
+    
+    reloaded = MemoryStore(path)
+    
+    assert _indexed_by_status(reloaded) == _scan_by_status(reloaded) == _indexed_by_status(store)
+    assert [task["task_id"] for task in reloaded.get_pending_tasks()] == pending_before
+
+def test_status_index_consistent_after_journal_replay(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, journal=True, compact_every=10)
+    _populate(store)
+    store.flush()
+    
+    # Reopen without compacting so part of the state comes from the journal
+    reloaded = MemoryStore(path, journal=True, compact_every=10)
+    
+    assert _indexed_by_status(reloaded) == _scan_by_status(reloaded) == _indexed_by_status(store)
+
+def _crash(store: MemoryStore) -> None:
+    """Leave the store as a killed process would: flushed, never closed"""
+    store.flush()
+    if store._journal_file is not None:
+        store._journal_file.close()
+
+def test_journal_replay_drops_a_torn_last_line(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, journal=True, compact_every=1000, background_writes=False)
+    store.add_task("a", {"type": "email"})
+    store.add_task("b", {"type": "email"})
+    _crash(store)
+    intact = (tmp_path / "memory.json.journal").stat().st_size
+    
+    # Killed halfway through appending a record
+    with open(store.journal_path, 'a') as f:
+        f.write('{"op": "set", "path": ["tasks", "c"], "val')
+    
+    reloaded = MemoryStore(path, journal=True, compact_every=1000, background_writes=False)
+    assert set(reloaded.memory["tasks"]) == {"a", "b"}
+    # The torn tail is cut off so new records start on a line of their own
+    assert (tmp_path / "memory.json.journal").stat().st_size == intact
+    reloaded.add_task("c", {"type": "email"})
+    _crash(reloaded)
+    
+    again = MemoryStore(path, journal=True, compact_every=1000, background_writes=False)
+    assert set(again.memory["tasks"]) == {"a", "b", "c"}
+
+def test_journal_replay_skips_records_already_in_the_snapshot(tmp_path):
+    path = str(tmp_path / "memory.json")
+    journal = tmp_path / "memory.json.journal"
+    store = MemoryStore(path, journal=True, compact_every=1000, background_writes=False)
+    for i in range(5):
+        store.add_conversation("user", f"message {i}", "ok")
+    store.flush()
+    folded = journal.read_bytes()
+    
+    # Crash after the snapshot was written but before the journal was removed,
+    # then one more record on top
+    store.compact()
+    store.add_conversation("user", "message 5", "ok")
+    _crash(store)
+    journal.write_bytes(folded + journal.read_bytes())
+    
+    reloaded = MemoryStore(path, journal=True, compact_every=1000, background_writes=False)
+    messages = [entry["user_message"] for entry in reloaded.memory["conversations"]["user"]]
+    # Appends would show up twice if the folded records were applied again
+    assert messages == [f"message {i}" for i in range(6)]
+    assert reloaded._journal_records == 1
+
+def test_followup_heap_orders_and_pops_due(tmp_path):
+    store = MemoryStore(str(tmp_path / "memory.json"), default_followup_hours=24)
+    now = datetime.now()
+    for task_id, hours_ago in [("late", 30), ("later", 26), ("soon", 20), ("fresh", 1)]:
+        store.add_task(task_id, {"type": "email"})
+        store.update_task(task_id, {
+            "status": TaskStatus.WAITING_RESPONSE.value,
+            "last_action_time": (now - timedelta(hours=hours_ago)).isoformat()
+        })
+    store.update_task("later", {"status": TaskStatus.COMPLETED.value})
+    
+    assert store.next_followup_due() == now - timedelta(hours=6)
+    assert store.next_followup_due(after=now) == now + timedelta(hours=4)
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup()] == ["late"]
+    
+    # Popping hands a follow-up out once; it comes back when the task changes
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["late"]
+    assert store.pop_due_followups() == []
+    store.update_task("late", {"last_action_time": (now - timedelta(hours=25)).isoformat()})
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["late"]
+
+def test_popped_followups_stay_in_followup_queries(tmp_path):
+    store = MemoryStore(str(tmp_path / "memory.json"), default_followup_hours=24)
+    now = datetime.now()
+    for task_id, hours_ago in [("a", 30), ("b", 28)]:
+        store.add_task(task_id, {"type": "email"})
+        store.update_task(task_id, {
+            "status": TaskStatus.WAITING_RESPONSE.value,
+            "last_action_time": (now - timedelta(hours=hours_ago)).isoformat()
+        })
+    
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["a", "b"]
+    # Handing a follow-up out does not hide it from the read-only query
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup()] == ["a", "b"]
+    assert store.pop_due_followups() == []
+    # A new default moves the due times, so they are handed out again
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup(20)] == ["a", "b"]
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["a", "b"]
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup(20)] == ["a", "b"]
+    
+    store.update_task("b", {"status": TaskStatus.COMPLETED.value})
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup()] == ["a"]
+
+def test_batch_writes_once(tmp_path, monkeypatch):
+    store = MemoryStore(str(tmp_path / "memory.json"), background_writes=False)
+    saves = []
+    monkeypatch.setattr(store, "_write_atomic", lambda data: saves.append(data))
+    
+    with store.batch():
+        store.add_conversation("user", "schedule a meeting", "Done")
+        store.learn_pattern("user", "scheduling_preferences", {"request_type": "scheduling"})
+        store.add_insight("User schedules in the morning")
+    
+    assert len(saves) == 1
+
+def test_debounced_store_flushes_on_close(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, flush_interval=3600)
+    store.add_task("task", {"type": "email"})
+    store.add_conversation("user", "hi", "hello")
+    
+    assert MemoryStore(path).get_task("task") is None
+    store.close()
+    assert MemoryStore(path).get_task("task") is not None
+
+def test_debounced_journal_flushes_pending_records(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, journal=True, flush_interval=3600)
+    for i in range(5):
+        store.add_conversation("user", f"message {i}", "ok")
+    store.flush()
+    
+    reloaded = MemoryStore(path, journal=True)
+    assert len(reloaded.get_user_context("user")["conversations"]) == 5
+
+def test_background_writes_are_atomic(tmp_path):
+    path = tmp_path / "memory.json"
+    store = MemoryStore(str(path))
+    store.add_task("task", {"type": "email"})
+    store.close()
+    
+    # Writes go through a temp file that is renamed over the snapshot
+    assert not (tmp_path / "memory.json.tmp").exists()
+    assert MemoryStore(str(path)).get_task("task")["type"] == "email"
+    
+    # A torn temp file from a crash mid-write does not affect the snapshot
+    (tmp_path / "memory.json.tmp").write_text('{"tasks": {')
+    assert MemoryStore(str(path)).get_task("task") is not None
+
+def test_mutations_do_not_wait_for_snapshot_encoding(tmp_path):
+    path = tmp_path / "memory.json"
+    store = MemoryStore(str(path))
+    encoding = threading.Event()
+    release = threading.Event()
+    codec = store.codec
+    
+    class SlowCodec:
+        def encode(self, snapshot):
+            encoding.set()
+            release.wait(5)
+            return codec.encode(snapshot)
+    
+    store.codec = SlowCodec()
+    store.add_task("first", {"type": "email"})
+    assert encoding.wait(5)
+    
+    # The writer thread is mid-encode; the event loop's mutation goes through
+    started = time.monotonic()
+    store.add_task("second", {"type": "email"})
+    store.learn_pattern("user", "request_types", {"request_type": "email"})
+    assert time.monotonic() - started < 1
+    
+    release.set()
+    store.close()
+    reloaded = MemoryStore(str(path))
+    assert reloaded.get_task("first") and reloaded.get_task("second")
+    assert reloaded.get_pattern_summary("user")["request_types"]["count"] == 1
+
+def test_save_async(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, flush_interval=3600)
+    store.add_insight("Saved from the event loop")
+    
+    asyncio.run(store.save_async())
+    assert MemoryStore(path).get_insights(1)[0]["insight"] == "Saved from the event loop"
+
+@pytest.mark.parametrize("codec", ["json", "orjson", "msgpack"])
+def test_codec_round_trip_and_detection(tmp_path, codec):
+    pytest.importorskip(codec)
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, codec=codec)
+    _populate(store)
+    store.close()
+    
+    # Any codec setting reads whatever format is on disk
+    reloaded = MemoryStore(path, codec="json")
+    assert reloaded.memory["tasks"] == store.memory["tasks"]
+
+def test_retention_archives_old_finished_tasks(tmp_path):
+    store = MemoryStore(str(tmp_path / "memory.json"), max_completed_tasks=3)
+    for i in range(6):
+        store.add_task(f"done-{i}", {"type": "send_email", "status": TaskStatus.COMPLETED.value})
+    store.add_task("open", {"type": "email"})
+    
+    result = store.apply_retention(now=datetime.now() + timedelta(days=1))
+    store.flush()
+    
+    assert result == {"archived_tasks": 3}
+    assert set(store.memory["tasks"]) == {"done-3", "done-4", "done-5", "open"}
+    assert _indexed_by_status(store) == _scan_by_status(store)
+    archived = (tmp_path / "memory_archive.jsonl").read_text().splitlines()
+    assert len(archived) == 3
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_patterns_are_histograms(tmp_path, journal):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path, journal=journal)
+    for hour in (9, 9, 14):
+        store.learn_pattern("user", "scheduling_preferences", {
+            "time_of_request": hour, "day_of_week": "Monday", "request_type": "scheduling"
+        })
+    store.flush()
+    
+    summary = MemoryStore(path, journal=journal).get_pattern_summary("user")["scheduling_preferences"]
+    assert summary["count"] == 3
+    assert summary["peak_hours"] == [9, 14]
+    assert summary["busiest_slot"] == "Monday 9:00"
+    assert summary["request_types"] == {"scheduling": 3}
+
+def test_raw_pattern_events_are_migrated(tmp_path):
+    path = tmp_path / "memory.json"
+    legacy = MemoryStore._initialize_memory()
+    legacy["patterns"] = {"user": {"communication_preferences": [
+        {"data": {"time_of_request": 8, "request_type": "email"}, "timestamp": "2024-01-01T08:00:00", "confidence": 0.5}
+        for _ in range(4)
+    ]}}
+    path.write_text(json.dumps(legacy))
+    
+    store = MemoryStore(str(path))
+    histogram = store.memory["patterns"]["user"]["communication_preferences"]
+    assert histogram["count"] == 4 and histogram["by_hour"] == {"8": 4}
+    assert json.loads(path.read_text())["patterns"] == store.memory["patterns"]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Tests for per-user message queues
+"""
+
+import asyncio
+from message_dispatcher import MessageDispatcher
+
+def test_orders_per_user_and_runs_users_in_parallel():
+    async def scenario():
+        handled = []
+        running = set()
+        overlap = []
+        
+        async def handler(user_id, item):
+            running.add(user_id)
+            overlap.append(len(running))
+            await asyncio.sleep(0.01)
+            handled.append((user_id, item))
+            running.discard(user_id)
+        
+        dispatcher = MessageDispatcher(handler, max_workers=2)
+        for i in range(3):
+            for user in ("alice", "bob", "carol"):
+                assert dispatcher.submit(user, i)
+        assert dispatcher.metrics()["queued"] == 9
+        
+        while dispatcher.metrics()["processed"] < 9:
+            await asyncio.sleep(0.01)
+        return handled, overlap, dispatcher.metrics()
+    
+    handled, overlap, metrics = asyncio.run(scenario())
+    
+    for user in ("alice", "bob", "carol"):
+        assert [item for who, item in handled if who == user] == [0, 1, 2]
+    assert max(overlap) == 2
+    assert metrics["queued"] == 0 and metrics["failed"] == 0
+
+def test_full_queue_drops_and_failures_are_counted():
+    async def scenario():
+        release = asyncio.Event()
+        
+        async def handler(user_id, item):
+            await release.wait()
+            if item == "bad":
+                raise RuntimeError("boom")
+        
+        dispatcher = MessageDispatcher(handler, max_queue_per_user=2)
+        assert dispatcher.submit("alice", "bad")
+        await asyncio.sleep(0)
+        assert dispatcher.submit("alice", "ok")
+        assert dispatcher.submit("alice", "ok")
+        assert not dispatcher.submit("alice", "overflow")
+        
+        release.set()
+        while dispatcher.metrics()["processed"] + dispatcher.metrics()["failed"] < 3:
+            await asyncio.sleep(0.01)
+        await dispatcher.close()
+        return dispatcher.metrics()
+    
+    metrics = asyncio.run(scenario())
+    assert (metrics["processed"], metrics["failed"], metrics["dropped"]) == (2, 1, 1)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the crew response cache
+"""
+
+from response_cache import ResponseCache
+
+def test_hits_on_normalized_prompt_and_same_tool_state():
+    cache = ResponseCache({"routine": 60})
+    key = cache.make_key("routine", "Check weather and list today's calendar events", "mail-1")
+    assert cache.get("routine", key) is None
+    cache.put("routine", key, "Sunny, two meetings", {"Get Weather", "List Calendar Events"})
+    
+    same = cache.make_key("routine", "  check WEATHER and list today's calendar events ", "mail-1")
+    changed = cache.make_key("routine", "Check weather and list today's calendar events", "mail-2")
+    assert cache.get("routine", same) == "Sunny, two meetings"
+    assert cache.get("routine", changed) is None
+    assert cache.stats()["routine"] == {"hits": 1, "misses": 2, "stores": 1, "skipped": 0}
+
+def test_expired_and_disabled_and_mutating_runs_are_not_served(monkeypatch):
+    cache = ResponseCache({"routine": 60, "chat": 0})
+    assert cache.enabled("routine") and not cache.enabled("chat")
+    
+    sent = cache.make_key("routine", "email the team the weekly report")
+    assert not cache.put("routine", sent, "Sent!", {"Send Gmail"})
+    assert cache.get("routine", sent) is None
+    # Agents report the names crewai gives the LLM
+    assert not cache.put("routine", sent, "Sent!", {"get_weather", "send_gmail"})
+    assert not cache.put("routine", sent, "Booked", {"schedule_google_calendar_event"})
+    
+    key = cache.make_key("routine", "check weather")
+    cache.put("routine", key, "Sunny")
+    clock = __import__("time").monotonic() + 61
+    monkeypatch.setattr("response_cache.time.monotonic", lambda: clock)
+    assert cache.get("routine", key) is None
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache({"routine": 60}, max_entries=2)
+    keys = [cache.make_key("routine", f"action {i}") for i in range(3)]
+    cache.put("routine", keys[0], "a")
+    cache.put("routine", keys[1], "b")
+    cache.get("routine", keys[0])
+    cache.put("routine", keys[2], "c")
+    
+    assert cache.get("routine", keys[1]) is None
+    assert cache.get("routine", keys[0]) == "a"
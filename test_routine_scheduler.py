@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+Tests for routine schedule parsing and the next-run heap
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from memory_store import MemoryStore
+from routine_scheduler import CronSchedule, RoutineScheduler, parse_schedule
+
+# A Friday evening
+FRIDAY = datetime(2026, 10, 16, 22, 43)
+
+@pytest.mark.parametrize("spec, expected", [
+    ("daily at 7:00", datetime(2026, 10, 17, 7, 0)),
+    ("at 7am", datetime(2026, 10, 17, 7, 0)),
+    ("weekdays at 9am", datetime(2026, 10, 19, 9, 0)),
+    ("every friday at 5:30pm", datetime(2026, 10, 23, 17, 30)),
+    ("cron: */15 9-17 * * 1-5", datetime(2026, 10, 19, 9, 0)),
+    ("0 0 29 2 *", datetime(2028, 2, 29, 0, 0)),
+])
+def test_time_of_day_and_cron_schedules(spec, expected):
+    assert parse_schedule(spec).next_after(FRIDAY) == expected
+
+def test_legacy_frequencies_and_invalid_specs():
+    assert parse_schedule("hourly") == timedelta(hours=1)
+    for spec in ["sometimes", "25:00", "monday", "0 7 * *", "61 * * * *"]:
+        with pytest.raises(ValueError):
+            parse_schedule(spec)
+
+def test_cron_day_of_month_or_day_of_week():
+    # Restricting both fields fires on either, like cron does
+    schedule = CronSchedule("0 0 13 * 5")
+    assert schedule.next_after(FRIDAY) == datetime(2026, 10, 23, 0, 0)
+
+def test_scheduler_skips_superseded_entries():
+    scheduler = RoutineScheduler()
+    scheduler.schedule("a", FRIDAY)
+    scheduler.schedule("b", FRIDAY + timedelta(hours=1))
+    scheduler.schedule("a", FRIDAY + timedelta(days=1))
+    
+    assert scheduler.due(FRIDAY + timedelta(hours=2)) == ["b"]
+    assert scheduler.next_run_at() == FRIDAY + timedelta(hours=1)
+
+def test_memory_store_due_routines(tmp_path):
+    path = str(tmp_path / "memory.json")
+    store = MemoryStore(path)
+    store.add_routine("inbox", {"name": "Inbox", "frequency": "hourly", "action": "Check email"})
+    store.add_routine("brief", {"name": "Brief", "frequency": "daily at 7:00", "action": "Weather"})
+    
+    assert [routine["routine_id"] for routine in store.get_due_routines()] == ["inbox"]
+    store.update_routine_execution("inbox")
+    assert store.get_due_routines() == []
+    store.flush()
+    
+    reloaded = MemoryStore(path)
+    assert reloaded.next_routine_due() == min(
+        datetime.fromisoformat(routine["next_run_at"]) for routine in reloaded.get_routines().values()
+    )
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the SQLite memory backend
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+from memory_store import MemoryStore, TaskStatus
+from sqlite_memory_store import SQLiteMemoryStore
+
+def _store(tmp_path, **kwargs) -> SQLiteMemoryStore:
+    return SQLiteMemoryStore(str(tmp_path / "memory.db"), import_path=None, **kwargs)
+
+def _waiting(store, task_id: str, hours_ago: float, now: datetime) -> None:
+    store.add_task(task_id, {"type": "email"})
+    store.update_task(task_id, {
+        "status": TaskStatus.WAITING_RESPONSE.value,
+        "last_action_time": (now - timedelta(hours=hours_ago)).isoformat()
+    })
+
+def test_followups_are_handed_out_once_and_stay_listed(tmp_path):
+    store = _store(tmp_path, default_followup_hours=24)
+    now = datetime.now()
+    for task_id, hours_ago in [("late", 30), ("soon", 20), ("fresh", 1)]:
+        _waiting(store, task_id, hours_ago, now)
+    
+    assert store.next_followup_due() == now - timedelta(hours=6)
+    assert store.next_followup_due(after=now) == now + timedelta(hours=4)
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["late"]
+    assert [task["task_id"] for task in store.get_tasks_requiring_followup()] == ["late"]
+    assert store.pop_due_followups() == []
+    
+    store.update_task("late", {"last_action_time": (now - timedelta(hours=25)).isoformat()})
+    assert [task["task_id"] for task in store.pop_due_followups()] == ["late"]
+    store.update_task("late", {"status": TaskStatus.COMPLETED.value})
+    assert store.get_tasks_requiring_followup() == []
+
+def test_due_routines_and_next_run(tmp_path):
+    store = _store(tmp_path)
+    store.add_routine("inbox", {"name": "Inbox", "frequency": "hourly", "action": "Check email"})
+    store.add_routine("brief", {"name": "Brief", "frequency": "daily at 7:00", "action": "Weather"})
+    
+    assert [routine["routine_id"] for routine in store.get_due_routines()] == ["inbox"]
+    store.update_routine_execution("inbox")
+    assert store.get_due_routines() == []
+    assert store.get_routines()["inbox"]["execution_count"] == 1
+    assert store.next_routine_due() == min(
+        datetime.fromisoformat(routine["next_run_at"]) for routine in store.get_routines().values()
+    )
+
+def test_retention_archives_old_finished_tasks(tmp_path):
+    store = _store(tmp_path, max_completed_tasks=3)
+    for i in range(6):
+        store.add_task(f"done-{i}", {"type": "send_email", "status": TaskStatus.COMPLETED.value})
+    store.add_task("open", {"type": "email"})
+    
+    assert store.apply_retention(now=datetime.now() + timedelta(days=1)) == {"archived_tasks": 3}
+    assert {task["task_id"] for task in store.get_pending_tasks()} == {"open"}
+    assert store.get_stats()["tasks"] == 4
+    archived = [json.loads(line) for line in (tmp_path / "memory_archive.jsonl").read_text().splitlines()]
+    assert {task["task_id"] for task in archived} == {"done-0", "done-1", "done-2"}
+    
+    # Age alone also archives, whatever the count
+    assert store.apply_retention(now=datetime.now() + timedelta(days=31)) == {"archived_tasks": 3}
+
+def test_batch_commits_once_and_rolls_back_on_error(tmp_path):
+    store = _store(tmp_path)
+    try:
+        with store.batch():
+            store.add_conversation("user", "schedule a meeting", "Done")
+            store.learn_pattern("user", "scheduling_preferences", {"request_type": "scheduling"})
+            raise RuntimeError("crew failed")
+    except RuntimeError:
+        pass
+    assert store.get_user_context("user") == {"conversations": [], "preferences": {}, "patterns": {}}
+    
+    with store.batch():
+        store.add_conversation("user", "schedule a meeting", "Done")
+        store.learn_pattern("user", "scheduling_preferences", {"request_type": "scheduling"})
+        store.add_insight("User schedules in the morning")
+    store.close()
+    
+    reloaded = _store(tmp_path)
+    context = reloaded.get_user_context("user")
+    assert [entry["user_message"] for entry in context["conversations"]] == ["schedule a meeting"]
+    assert context["patterns"]["scheduling_preferences"]["count"] == 1
+    assert [insight["insight"] for insight in reloaded.get_insights()] == ["User schedules in the morning"]
+
+def test_import_includes_journaled_changes(tmp_path):
+    json_path = str(tmp_path / "secretary_memory.json")
+    source = MemoryStore(json_path, journal=True, compact_every=1000, background_writes=False)
+    source.add_task("task", {"type": "email"})
+    source.add_routine("inbox", {"name": "Inbox", "frequency": "hourly", "action": "Check email"})
+    source.add_conversation("user", "hi", "Hello!")
+    source.learn_pattern("user", "request_types", {"request_type": "email"})
+    # Killed before compaction: everything is still only in the journal
+    source._journal_file.close()
+    
+    store = SQLiteMemoryStore(str(tmp_path / "memory.db"), import_path=json_path)
+    
+    assert store.get_task("task")["type"] == "email"
+    assert set(store.get_routines()) == {"inbox"}
+    context = store.get_user_context("user")
+    assert [entry["assistant_response"] for entry in context["conversations"]] == ["Hello!"]
+    assert context["patterns"]["request_types"]["count"] == 1
+
+def test_import_reads_msgpack_snapshots(tmp_path):
+    pytest.importorskip("msgpack")
+    json_path = str(tmp_path / "secretary_memory.json")
+    source = MemoryStore(json_path, codec="msgpack", background_writes=False)
+    source.add_task("task", {"type": "email"})
+    source.close()
+    
+    store = SQLiteMemoryStore(str(tmp_path / "memory.db"), import_path=json_path)
+    assert store.get_task("task")["type"] == "email"
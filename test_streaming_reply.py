@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Tests for streaming replies into an edited placeholder message
+"""
+
+import asyncio
+from streaming_reply import PLACEHOLDER, StreamingReply
+
+class FakeMessage:
+    def __init__(self, chat, text):
+        self.chat = chat
+        self.text = text
+    
+    async def edit_text(self, text):
+        self.chat.edits.append(text)
+        self.text = text
+
+class FakeChat:
+    def __init__(self):
+        self.messages = []
+        self.edits = []
+        self.typing = 0
+    
+    async def send(self, text):
+        message = FakeMessage(self, text)
+        self.messages.append(message)
+        return message
+    
+    async def send_typing(self):
+        self.typing += 1
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def make_reply(chat, clock, edit_interval=1.5):
+    # A poll interval of an hour keeps the background loop to its first
+    # tick; the tests drive every later tick themselves
+    return StreamingReply(chat.send, chat.send_typing, edit_interval=edit_interval, placeholder_delay=1.0,
+                          typing_interval=4.0, poll_interval=3600, clock=clock)
+
+def test_streams_progress_then_replaces_placeholder_with_answer():
+    async def scenario():
+        chat, clock = FakeChat(), FakeClock()
+        reply = make_reply(chat, clock)
+        reply.start()
+        await asyncio.sleep(0)
+        assert chat.typing == 1 and not chat.messages
+        
+        reply.update("🔧 Using Read Gmail…")
+        await asyncio.sleep(0)
+        clock.now = 0.25
+        await reply.tick()
+        assert [m.text for m in chat.messages] == [f"{PLACEHOLDER}\n\n🔧 Using Read Gmail…"]
+        
+        # An update every 0.25s is shown at most every 1.5s
+        for i in range(20):
+            reply.update(f"step {i}")
+            await asyncio.sleep(0)
+            clock.now = 0.25 * (i + 2)
+            await reply.tick()
+        clock.now += 1.5
+        await reply.tick()
+        
+        await reply.finish("x" * 4500)
+        return chat, reply
+    
+    chat, reply = asyncio.run(scenario())
+    
+    assert len(chat.messages) == 2
+    assert chat.messages[0].text == "x" * 4000 and chat.messages[1].text == "x" * 500
+    assert chat.edits == [f"{PLACEHOLDER}\n\nstep {i}" for i in (5, 11, 17, 19)] + ["x" * 4000]
+    assert reply.edits == 4
+    # Renewed at 4s, before Telegram drops the indicator
+    assert chat.typing == 2
+
+def test_fast_answers_and_disabled_streaming_skip_the_placeholder():
+    async def scenario(edit_interval):
+        chat = FakeChat()
+        reply = make_reply(chat, FakeClock(), edit_interval=edit_interval)
+        reply.start()
+        await asyncio.sleep(0)
+        reply.update("thinking")
+        await asyncio.sleep(0)
+        await reply.finish("Done")
+        return chat
+    
+    disabled = asyncio.run(scenario(None))
+    assert [m.text for m in disabled.messages] == ["Done"] and not disabled.edits
+    assert disabled.typing == 1
+    
+    streamed = asyncio.run(scenario(1.5))
+    assert [m.text for m in streamed.messages] == ["Done"] and not streamed.edits
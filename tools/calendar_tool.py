@@ -4,10 +4,10 @@ import pickle
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Type, Optional, ClassVar, List
+from crew_pool import tool_started
 
 class CalendarEventInput(BaseModel):
     summary: str = Field(description="Event title/summary")
@@ -24,12 +24,13 @@ class GoogleCalendarTool(BaseTool):
     
     SCOPES: ClassVar[List[str]] = ['https://www.googleapis.com/auth/calendar.events']
     
-    def _authenticate_calendar(self):
+    def _get_service(self):
         try:
-            from tools.google_auth import get_google_credentials
-            creds = get_google_credentials()
-            if creds:
-                return creds, None
+            from tools.google_clients import get_service
+            # Shared client, built once per thread
+            service = get_service('calendar', 'v3')
+            if service:
+                return service, None
             else:
                 return None, "Calendar credentials not found. Please set up credentials.json"
         except Exception as e:
@@ -44,13 +45,14 @@ class GoogleCalendarTool(BaseTool):
     
     def _run(self, summary: str, start_time: str, end_time: str, 
              description: str = "", location: str = "", attendees: str = "") -> str:
+        # Stops a cancelled run, and marks this one as having created an
+        # event so its answer is never cached
+        tool_started(self.name)
         try:
-            creds, error = self._authenticate_calendar()
+            service, error = self._get_service()
             if error:
                 return f"Error: {error}"
             
-            service = build('calendar', 'v3', credentials=creds)
-            
             event = {
                 'summary': summary,
                 'description': description,
@@ -89,25 +91,25 @@ class ListCalendarEventsTool(BaseTool):
     
     SCOPES: ClassVar[List[str]] = ['https://www.googleapis.com/auth/calendar.readonly']
     
-    def _authenticate_calendar(self):
+    def _get_service(self):
         try:
-            from tools.google_auth import get_google_credentials
-            creds = get_google_credentials()
-            if creds:
-                return creds, None
+            from tools.google_clients import get_service
+            # Shared client, built once per thread
+            service = get_service('calendar', 'v3')
+            if service:
+                return service, None
             else:
                 return None, "Calendar credentials not found. Please set up credentials.json"
         except Exception as e:
             return None, f"Authentication error: {str(e)}"
     
     def _run(self, days_ahead: int = 7) -> str:
+        tool_started(self.name)
         try:
-            creds, error = self._authenticate_calendar()
+            service, error = self._get_service()
             if error:
                 return f"Error: {error}"
             
-            service = build('calendar', 'v3', credentials=creds)
-            
             now = datetime.datetime.utcnow()
             time_min = now.isoformat() + 'Z'
             time_max = (now + datetime.timedelta(days=days_ahead)).isoformat() + 'Z'
@@ -0,0 +1,38 @@
+import datetime
+from typing import Optional
+from tools.google_clients import get_service
+
+def mail_marker() -> Optional[str]:
+    """
+    Gmail history id of the mailbox; it changes whenever mail arrives or
+    changes, so one cheap profile call tells whether there is anything new
+    """
+    try:
+        service = get_service('gmail', 'v1')
+        if service is None:
+            return None
+        return service.users().getProfile(userId='me').execute().get('historyId')
+    except Exception:
+        return None
+
+def calendar_marker(hours_ahead: int = 24) -> Optional[str]:
+    """
+    Ids and last-modified times of events starting in the next hours
+    """
+    try:
+        service = get_service('calendar', 'v3')
+        if service is None:
+            return None
+        
+        now = datetime.datetime.utcnow()
+        events_result = service.events().list(
+            calendarId='primary',
+            timeMin=now.isoformat() + 'Z',
+            timeMax=(now + datetime.timedelta(hours=hours_ahead)).isoformat() + 'Z',
+            maxResults=50,
+            singleEvents=True,
+            fields='items(id,updated)'
+        ).execute()
+        return ",".join(f"{event['id']}@{event.get('updated', '')}" for event in events_result.get('items', []))
+    except Exception:
+        return None
@@ -0,0 +1,302 @@
+import os
+import re
+import shlex
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, Set
+from googleapiclient.errors import HttpError
+from tools.gmail_read_tool import SUMMARY_HEADERS, fetch_messages, list_message_ids
+
+# Mail Gmail search leaves out unless asked for
+HIDDEN_LABELS = {'SPAM', 'TRASH'}
+# System labels whose ids are their names; user labels have opaque ids
+SEARCHABLE_LABELS = {'INBOX', 'SENT', 'DRAFT', 'STARRED', 'IMPORTANT', 'SPAM', 'TRASH'}
+
+def parse_query(query: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    Search filters for the simple Gmail queries the index can answer
+    (is:unread, is:read, from:, subject:, in:/label:, newer_than:, after:),
+    or None for anything else, which should go to the Gmail API
+    """
+    now = now or datetime.now()
+    try:
+        tokens = shlex.split(query or "")
+    except ValueError:
+        return None
+    
+    filters: Dict[str, Any] = {}
+    seen: Set[str] = set()
+    for token in tokens:
+        key, _, value = token.partition(':')
+        key = key.lower()
+        # Repeated operators are ANDed by Gmail; leave those to the API
+        if not value or key in seen:
+            return None
+        seen.add(key)
+        if key == 'is' and value.lower() in ('unread', 'read'):
+            filters['unread'] = value.lower() == 'unread'
+        elif key == 'from' and not value.startswith('('):
+            filters['senders'] = [value]
+        elif key == 'subject' and not value.startswith('('):
+            filters['subject'] = value
+        elif key in ('in', 'label') and value.upper() in SEARCHABLE_LABELS:
+            filters['label'] = value.upper()
+        elif key == 'newer_than' and 'after' not in seen:
+            match = re.fullmatch(r'(\d+)([dh])', value.lower())
+            if not match:
+                return None
+            amount = int(match.group(1))
+            filters['since'] = now - (timedelta(days=amount) if match.group(2) == 'd' else timedelta(hours=amount))
+        elif key == 'after' and 'newer_than' not in seen:
+            try:
+                filters['since'] = datetime.strptime(value.replace('-', '/'), '%Y/%m/%d')
+            except ValueError:
+                return None
+        else:
+            return None
+    return filters
+
+class MailboxIndex:
+    """
+    Local copy of recent message metadata (headers, labels, snippet), kept
+    current with users.history.list from the last seen historyId. It holds
+    every message of the last `window_days` plus all unread mail, so
+    searches within that window, or for unread mail, are answered locally
+    with one history call instead of a full search and a fetch per message.
+    A history id Gmail no longer has (about a week old) rebuilds the index.
+    Only one thread syncs at a time; searches arriving meanwhile go to the
+    Gmail API rather than waiting for it.
+    """
+    
+    def __init__(self, window_days: int = 7, max_messages: int = 5000, min_sync_interval: float = 15.0):
+        self.window_days = window_days
+        self.max_messages = max_messages
+        self.min_sync_interval = min_sync_interval
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._history_id: Optional[str] = None
+        self._covered_since: Optional[datetime] = None
+        self._unread_complete = False
+        self._synced_at = float('-inf')
+        # _sync_lock is held for a whole sync, _lock only while state changes
+        self._sync_lock = threading.Lock()
+        self._lock = threading.RLock()
+        
+        self.bootstraps = 0
+        self.syncs = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.window_days > 0
+    
+    def sync(self, service) -> bool:
+        """
+        Pull changes since the last sync; the first call builds the index.
+        Returns False without waiting when another thread is syncing.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return False
+        try:
+            if time.monotonic() - self._synced_at < self.min_sync_interval:
+                return True
+            if self._history_id is None:
+                self._bootstrap(service)
+            else:
+                try:
+                    self._apply_history(service)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    # History this old has expired; start over
+                    self._bootstrap(service)
+            with self._lock:
+                self._prune()
+            self._synced_at = time.monotonic()
+            self.syncs += 1
+            return True
+        finally:
+            self._sync_lock.release()
+    
+    def _bootstrap(self, service) -> None:
+        with self._lock:
+            self._history_id = None
+        # Take the history id first so changes made while listing are replayed
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+        ids = list_message_ids(service, f"newer_than:{self.window_days}d OR is:unread", limit=self.max_messages)
+        fetched = fetch_messages(service, ids, format='metadata', metadata_headers=SUMMARY_HEADERS)
+        
+        with self._lock:
+            self._messages = {}
+            self._store(fetched.values())
+            self._history_id = history_id
+            self._covered_since = datetime.now() - timedelta(days=self.window_days)
+            self._unread_complete = len(ids) < self.max_messages
+            if not self._unread_complete and self._messages:
+                # Truncated: only the newest messages are complete
+                self._covered_since = max(self._covered_since, min(entry['received'] for entry in self._messages.values()))
+        self.bootstraps += 1
+    
+    def _apply_history(self, service) -> None:
+        added: Set[str] = set()
+        page_token = None
+        while True:
+            response = service.users().history().list(
+                userId='me',
+                startHistoryId=self._history_id,
+                historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                pageToken=page_token
+            ).execute()
+            
+            with self._lock:
+                for record in response.get('history', []):
+                    for change in record.get('messagesAdded', []):
+                        added.add(change['message']['id'])
+                    for change in record.get('messagesDeleted', []):
+                        message_id = change['message']['id']
+                        added.discard(message_id)
+                        self._messages.pop(message_id, None)
+                    for change in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                        message = change['message']
+                        entry = self._messages.get(message['id'])
+                        if entry is not None:
+                            self._set_labels(entry, message.get('labelIds', []))
+                        elif 'UNREAD' in message.get('labelIds', []):
+                            # Older mail marked unread again joins the index
+                            added.add(message['id'])
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        fetched = {}
+        if added:
+            fetched = fetch_messages(service, list(added), format='metadata', metadata_headers=SUMMARY_HEADERS)
+        with self._lock:
+            self._store(fetched.values())
+            # Advanced only once every change is applied, so a failed sync is retried
+            self._history_id = response.get('historyId', self._history_id)
+    
+    def _store(self, messages) -> None:
+        for message in messages:
+            headers = {h['name']: h['value'] for h in message.get('payload', {}).get('headers', [])}
+            entry = {
+                'message': message,
+                'thread_id': message.get('threadId'),
+                'sender': headers.get('From', ''),
+                'subject': headers.get('Subject', ''),
+                'received': datetime.fromtimestamp(int(message.get('internalDate', 0)) / 1000),
+                'labels': set()
+            }
+            self._set_labels(entry, message.get('labelIds', []))
+            self._messages[message['id']] = entry
+    
+    @staticmethod
+    def _set_labels(entry: Dict[str, Any], label_ids: List[str]) -> None:
+        entry['labels'] = set(label_ids)
+        entry['message']['labelIds'] = list(label_ids)
+    
+    def _prune(self) -> None:
+        window_start = datetime.now() - timedelta(days=self.window_days)
+        self._covered_since = max(self._covered_since or window_start, window_start)
+        for message_id in [message_id for message_id, entry in self._messages.items()
+                           if entry['received'] < window_start and 'UNREAD' not in entry['labels']]:
+            del self._messages[message_id]
+    
+    def covers(self, since: Optional[datetime] = None, unread: Optional[bool] = None) -> bool:
+        """
+        Whether a search with these bounds sees everything Gmail would
+        """
+        if self._history_id is None:
+            return False
+        if since is not None and since >= self._covered_since:
+            return True
+        return unread is True and self._unread_complete
+    
+    def _may_cover(self, since: Optional[datetime], unread: Optional[bool]) -> bool:
+        if self._history_id is not None:
+            return self.covers(since, unread)
+        # Not built yet: whether the index will hold these once it is
+        window_start = datetime.now() - timedelta(days=self.window_days)
+        return (since is not None and since >= window_start) or unread is True
+    
+    def search(self, senders: Optional[List[str]] = None, subject: Optional[str] = None,
+               thread_id: Optional[str] = None, since: Optional[datetime] = None,
+               unread: Optional[bool] = None, label: Optional[str] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Indexed messages (Gmail metadata format) matching every given filter,
+        newest first. A sender with an @ must be the From address exactly
+        (or its domain, for "@example.com"); anything else, like a name or a
+        bare domain, matches part of the From header. The subject matches
+        case-insensitively.
+        """
+        senders = [sender.lower() for sender in senders or []]
+        subject = subject.lower() if subject else None
+        with self._lock:
+            entries = sorted(self._messages.values(), key=lambda entry: entry['received'], reverse=True)
+        
+        results = []
+        for entry in entries:
+            if entry['labels'] & HIDDEN_LABELS and label not in HIDDEN_LABELS:
+                continue
+            if since is not None and entry['received'] < since:
+                continue
+            if unread is not None and ('UNREAD' in entry['labels']) != unread:
+                continue
+            if label is not None and label not in entry['labels']:
+                continue
+            if thread_id is not None and entry['thread_id'] != thread_id:
+                continue
+            if subject and subject not in entry['subject'].lower():
+                continue
+            if senders:
+                sender = entry['sender'].lower()
+                address = parseaddr(sender)[1]
+                if not any(self._sender_matches(wanted, sender, address) for wanted in senders):
+                    continue
+            results.append(entry['message'])
+            if limit and len(results) >= limit:
+                break
+        return results
+    
+    @staticmethod
+    def _sender_matches(wanted: str, sender: str, address: str) -> bool:
+        if wanted.startswith('@'):
+            return address.endswith(wanted)
+        if '@' in wanted:
+            return wanted == address
+        return wanted in sender
+    
+    def query(self, service, limit: Optional[int] = None, **filters) -> Optional[List[Dict[str, Any]]]:
+        """
+        Sync and search, or None when the index is off, cannot answer the
+        search completely, is being synced by another thread, or Gmail could
+        not be reached
+        """
+        if not self.enabled:
+            return None
+        # Searches the index cannot answer skip the sync entirely
+        if not self._may_cover(filters.get('since'), filters.get('unread')):
+            return None
+        try:
+            if not self.sync(service):
+                return None
+        except Exception as e:
+            print(f"⚠️ Mailbox index sync failed: {e}")
+            return None
+        if not self.covers(filters.get('since'), filters.get('unread')):
+            return None
+        return self.search(limit=limit, **filters)
+    
+    def query_string(self, service, query: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        query() for a Gmail search string, or None if it is not a simple one
+        """
+        filters = parse_query(query) if self.enabled else None
+        if filters is None:
+            return None
+        return self.query(service, limit=limit, **filters)
+
+# Shared by the Gmail tools; GMAIL_INDEX_DAYS=0 sends every search to the API
+mailbox_index = MailboxIndex(window_days=int(os.getenv('GMAIL_INDEX_DAYS', '7')))
@@ -1,61 +1,175 @@
 import os
 import base64
+import json
+import time
+from email.utils import parseaddr
 from datetime import datetime, timedelta
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Type, Optional, ClassVar, List
+from typing import Type, Optional, ClassVar, Dict, List
+from crew_pool import tool_started
+
+# Gmail accepts up to 100 calls per batch but throttles large ones
+BATCH_SIZE = 50
+# Throttled calls are retried in smaller batches after a growing pause
+RETRY_ROUNDS = 4
+RETRY_DELAY = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A 403 is only retried for these reasons; others (e.g. insufficientPermissions) are permanent
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+def _retryable(error: Exception) -> bool:
+    if not isinstance(error, HttpError):
+        return True
+    if error.resp.status == 403:
+        try:
+            errors = json.loads(error.content)['error'].get('errors', [])
+            return any(item.get('reason') in RATE_LIMIT_REASONS for item in errors)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+    return error.resp.status in RETRY_STATUSES
+SUMMARY_HEADERS = ['Subject', 'From', 'Date']
+# Addresses per combined from:(a OR b ...) search, keeping queries short
+ADDRESSES_PER_QUERY = 20
+# Matches fetched per address searched, as the per-address searches allowed
+MESSAGES_PER_ADDRESS = 5
+
+def list_message_ids(service, query: str, limit: int = 1000) -> List[str]:
+    """
+    Ids of messages matching a search, newest first, following pages up to `limit`
+    """
+    ids: List[str] = []
+    page_token = None
+    while len(ids) < limit:
+        results = service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=min(500, limit - len(ids)),
+            pageToken=page_token
+        ).execute()
+        ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return ids
+
+def fetch_messages(service, message_ids: List[str], format: str = 'full',
+                   metadata_headers: Optional[List[str]] = None) -> Dict[str, dict]:
+    """
+    Get many messages in a few batch requests instead of one call each.
+    Returns messages by id; calls that fail inside a batch because Gmail is
+    throttling or unavailable are retried together in half-size batches
+    after a pause that doubles each round, and messages deleted in the
+    meantime are left out.
+    """
+    messages: Dict[str, dict] = {}
+    failed: Dict[str, Exception] = {}
+    
+    def collect(request_id, response, exception):
+        if exception is None:
+            messages[request_id] = response
+        elif not (isinstance(exception, HttpError) and exception.resp.status == 404):
+            failed[request_id] = exception
+    
+    def get(message_id):
+        return service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format=format,
+            metadataHeaders=metadata_headers if format == 'metadata' else None
+        )
+    
+    ids = list(dict.fromkeys(message_ids))
+    batch_size = BATCH_SIZE
+    for attempt in range(RETRY_ROUNDS + 1):
+        if attempt:
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+            batch_size = max(1, batch_size // 2)
+        failed.clear()
+        for start in range(0, len(ids), batch_size):
+            batch = service.new_batch_http_request(callback=collect)
+            for message_id in ids[start:start + batch_size]:
+                batch.add(get(message_id), request_id=message_id)
+            batch.execute()
+        
+        if not failed:
+            break
+        for error in failed.values():
+            if not _retryable(error):
+                raise error
+        ids = list(failed)
+    else:
+        raise next(iter(failed.values()))
+    return messages
 
 class GmailReadInput(BaseModel):
     query: Optional[str] = Field(default="is:unread", description="Gmail search query (e.g., 'is:unread', 'from:user@example.com', 'subject:meeting')")
     max_results: Optional[int] = Field(default=10, description="Maximum number of emails to retrieve")
+    include_body: Optional[bool] = Field(default=False, description="Also fetch each email's full text; the preview is usually enough")
     
 class GmailReadTool(BaseTool):
     name: str = "Read Gmail"
     description: str = "Read emails from Gmail inbox using search queries"
     args_schema: Type[BaseModel] = GmailReadInput
     
-    def _authenticate_gmail(self):
+    def _get_service(self):
         try:
-            from tools.google_auth import get_google_credentials
-            # Use unified authentication with all scopes
-            creds = get_google_credentials()
-            if creds:
-                return creds, None
+            from tools.google_clients import get_service
+            # Shared client, built once per thread
+            service = get_service('gmail', 'v1')
+            if service:
+                return service, None
             else:
                 return None, "Gmail credentials not found. Please set up credentials.json"
         except Exception as e:
             return None, f"Authentication error: {str(e)}"
     
-    def _run(self, query: str = "is:unread", max_results: int = 10) -> str:
+    def _run(self, query: str = "is:unread", max_results: int = 10, include_body: bool = False) -> str:
+        tool_started(self.name)
         try:
-            creds, error = self._authenticate_gmail()
+            service, error = self._get_service()
             if error:
                 return f"Error: {error}"
             
-            service = build('gmail', 'v1', credentials=creds)
+            # Simple searches are answered from the local mailbox index
+            from tools.gmail_index import mailbox_index
+            indexed = mailbox_index.query_string(service, query, limit=max_results)
             
-            # Search for messages
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
+            if indexed is not None:
+                messages = [{'id': message['id']} for message in indexed]
+            else:
+                # Search for messages
+                results = service.users().messages().list(
+                    userId='me',
+                    q=query,
+                    maxResults=max_results
+                ).execute()
+                
+                messages = results.get('messages', [])
             
             if not messages:
                 return f"No emails found matching query: {query}"
             
+            if indexed is not None and not include_body:
+                fetched = {message['id']: message for message in indexed}
+            else:
+                # Headers and snippet are all a summary needs unless the body was asked for
+                fetched = fetch_messages(
+                    service,
+                    [msg['id'] for msg in messages],
+                    format='full' if include_body else 'metadata',
+                    metadata_headers=SUMMARY_HEADERS
+                )
+            
             email_summaries = []
             
             for msg in messages:
-                # Get the full message
-                message = service.users().messages().get(
-                    userId='me',
-                    id=msg['id']
-                ).execute()
+                message = fetched.get(msg['id'])
+                if message is None:
+                    # Deleted since the search
+                    continue
                 
                 # Extract headers
                 headers = message['payload'].get('headers', [])
@@ -63,18 +177,19 @@ class GmailReadTool(BaseTool):
                 sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
                 date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown Date')
                 
-                # Extract body
-                body = self._extract_body(message['payload'])
-                
                 # Create summary
-                email_summaries.append({
+                summary = {
                     'id': msg['id'],
                     'subject': subject,
                     'from': sender,
                     'date': date,
-                    'snippet': message.get('snippet', '')[:200],  # First 200 chars
-                    'body': body[:500] if body else 'No text content'  # First 500 chars of body
-                })
+                    'snippet': message.get('snippet', '')[:200]  # First 200 chars
+                }
+                if include_body:
+                    # Extract body
+                    body = self._extract_body(message['payload'])
+                    summary['body'] = body[:500] if body else 'No text content'  # First 500 chars of body
+                email_summaries.append(summary)
             
             # Format the output
             output = f"Found {len(email_summaries)} email(s) matching '{query}':\n\n"
@@ -84,7 +199,8 @@ class GmailReadTool(BaseTool):
                 output += f"   Subject: {email['subject']}\n"
                 output += f"   Date: {email['date']}\n"
                 output += f"   Preview: {email['snippet']}\n"
-                output += f"   Body: {email['body']}\n"
+                if 'body' in email:
+                    output += f"   Body: {email['body']}\n"
                 output += "-" * 50 + "\n"
             
             return output
@@ -122,71 +238,74 @@ class CheckEmailResponsesTool(BaseTool):
     description: str = "Check if specific people have responded to emails"
     args_schema: Type[BaseModel] = CheckEmailResponsesInput
     
-    def _authenticate_gmail(self):
+    def _get_service(self):
         try:
-            from tools.google_auth import get_google_credentials
-            # Use unified authentication with all scopes
-            creds = get_google_credentials()
-            if creds:
-                return creds, None
+            from tools.google_clients import get_service
+            # Shared client, built once per thread
+            service = get_service('gmail', 'v1')
+            if service:
+                return service, None
             else:
                 return None, "Gmail credentials not found. Please set up credentials.json"
         except Exception as e:
             return None, f"Authentication error: {str(e)}"
     
     def _run(self, email_addresses: str, subject_keyword: str = "", since_hours: int = 24) -> str:
+        tool_started(self.name)
         try:
-            creds, error = self._authenticate_gmail()
+            service, error = self._get_service()
             if error:
                 return f"Error: {error}"
             
-            service = build('gmail', 'v1', credentials=creds)
-            
             # Parse email addresses
-            addresses = [addr.strip() for addr in email_addresses.split(',')]
+            addresses = list(dict.fromkeys(addr.strip() for addr in email_addresses.split(',') if addr.strip()))
             
             # Calculate date for query
-            since_date = (datetime.now() - timedelta(hours=since_hours)).strftime('%Y/%m/%d')
+            since = datetime.now() - timedelta(hours=since_hours)
+            since_date = since.strftime('%Y/%m/%d')
             
-            responses = {}
+            # Recent mail comes from the local mailbox index when it covers the period
+            from tools.gmail_index import mailbox_index
+            capped = set()
+            fetched = mailbox_index.query(service, senders=addresses, subject=subject_keyword or None, since=since)
             
-            for address in addresses:
-                # Build query
-                query = f"from:{address} after:{since_date}"
-                if subject_keyword:
-                    query += f" subject:{subject_keyword}"
-                
-                # Search for messages
-                results = service.users().messages().list(
-                    userId='me',
-                    q=query,
-                    maxResults=5
-                ).execute()
+            if fetched is None:
+                # One search for a group of senders instead of one per address
+                message_ids = []
+                for start in range(0, len(addresses), ADDRESSES_PER_QUERY):
+                    group = addresses[start:start + ADDRESSES_PER_QUERY]
+                    query = f"from:({' OR '.join(group)}) after:{since_date}"
+                    if subject_keyword:
+                        query += f" subject:{subject_keyword}"
+                    limit = MESSAGES_PER_ADDRESS * len(group)
+                    group_ids = list_message_ids(service, query, limit=limit)
+                    if len(group_ids) >= limit:
+                        # Older matches were left out; counts are lower bounds
+                        capped.update(group)
+                    message_ids.extend(group_ids)
                 
-                messages = results.get('messages', [])
+                fetched = list(fetch_messages(service, message_ids, format='metadata', metadata_headers=SUMMARY_HEADERS).values())
+            
+            responses = {address: {'responded': False, 'count': 0} for address in addresses}
+            
+            # Attribute each message to the address it came from
+            for message in fetched:
+                headers = message['payload'].get('headers', [])
+                sender = next((h['value'] for h in headers if h['name'] == 'From'), '')
+                address = self._match_sender(sender, addresses)
+                if address is None:
+                    continue
                 
-                if messages:
-                    # Get details of the most recent message
-                    latest = service.users().messages().get(
-                        userId='me',
-                        id=messages[0]['id']
-                    ).execute()
-                    
-                    headers = latest['payload'].get('headers', [])
-                    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-                    date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown Date')
-                    
-                    responses[address] = {
+                info = responses[address]
+                info['count'] += 1
+                received = int(message.get('internalDate', 0))
+                if received >= info.get('received', -1):
+                    info.update({
                         'responded': True,
-                        'count': len(messages),
-                        'latest_subject': subject,
-                        'latest_date': date
-                    }
-                else:
-                    responses[address] = {
-                        'responded': False,
-                        'count': 0
-                    }
+                        'received': received,
+                        'latest_subject': next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject'),
+                        'latest_date': next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown Date')
+                    })
             
             # Format output
             output = f"Email Response Status (last {since_hours} hours):\n\n"
@@ -196,7 +315,8 @@ class CheckEmailResponsesTool(BaseTool):
             
             for addr, info in responses.items():
                 if info['responded']:
-                    responded.append(f"✅ {addr}: {info['count']} email(s) - Latest: {info['latest_subject']} ({info['latest_date']})")
+                    count = f"{info['count']}+" if addr in capped else info['count']
+                    responded.append(f"✅ {addr}: {count} email(s) - Latest: {info['latest_subject']} ({info['latest_date']})")
                 else:
                     not_responded.append(f"❌ {addr}: No response yet")
             
@@ -210,4 +330,20 @@ class CheckEmailResponsesTool(BaseTool):
             return output
             
         except Exception as e:
-            return f"Error checking email responses: {str(e)}"
\ No newline at end of file
+            return f"Error checking email responses: {str(e)}"
+    
+    @staticmethod
+    def _match_sender(sender: str, addresses: List[str]) -> Optional[str]:
+        """
+        The requested address a From header belongs to: an exact address
+        match, or for entries that are not full addresses (a name or a
+        domain) the first one the header contains
+        """
+        sender_address = parseaddr(sender)[1].lower()
+        for address in addresses:
+            if '@' in address and address.lower() == sender_address:
+                return address
+        for address in addresses:
+            if '@' not in address and address.lower() in sender.lower():
+                return address
+        return None
\ No newline at end of file
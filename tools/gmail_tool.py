@@ -4,11 +4,11 @@ from email.mime.text import MIMEText
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import pickle
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Type, Optional, ClassVar, List
+from crew_pool import tool_started
 
 class GmailToolInput(BaseModel):
     to: str = Field(description="Recipient email address")
@@ -22,25 +22,27 @@ class GmailTool(BaseTool):
     
     SCOPES: ClassVar[List[str]] = ['https://www.googleapis.com/auth/gmail.send']
     
-    def _authenticate_gmail(self):
+    def _get_service(self):
         try:
-            from tools.google_auth import get_google_credentials
-            creds = get_google_credentials()
-            if creds:
-                return creds, None
+            from tools.google_clients import get_service
+            # Shared client, built once per thread
+            service = get_service('gmail', 'v1')
+            if service:
+                return service, None
             else:
                 return None, "Gmail credentials not found. Please set up credentials.json"
         except Exception as e:
             return None, f"Authentication error: {str(e)}"
     
     def _run(self, to: str, subject: str, body: str) -> str:
+        # Stops a cancelled run, and marks this one as having sent mail so
+        # its answer is never cached
+        tool_started(self.name)
         try:
-            creds, error = self._authenticate_gmail()
+            service, error = self._get_service()
             if error:
                 return f"Error: {error}"
             
-            service = build('gmail', 'v1', credentials=creds)
-            
             message = MIMEText(body)
             message['to'] = to
             message['subject'] = subject
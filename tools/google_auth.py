@@ -1,5 +1,8 @@
 import os
 import pickle
+import tempfile
+import threading
+from datetime import datetime, timedelta
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -13,46 +16,150 @@ ALL_SCOPES = [
     'https://www.googleapis.com/auth/calendar.readonly'
 ]
 
-def get_google_credentials(scopes: Optional[List[str]] = None) -> Optional[Credentials]:
+class CredentialManager:
     """
-    Get or refresh Google credentials with all necessary scopes
+    Google credentials kept in memory for the whole process. The token file
+    is read once; a background thread refreshes the access token
+    `refresh_margin` before it expires and saves it atomically, so callers
+    get valid credentials without waiting on a refresh. Only when there are
+    no usable credentials at all does get() load, refresh or
+    re-authenticate inline, and then only one thread does it while the
+    others wait for the result. Installing a new credentials object drops
+    every cached API client so none keeps using the old one.
     """
-    if scopes is None:
-        scopes = ALL_SCOPES
     
-    creds = None
-    token_path = 'google_token.pickle'
+    def __init__(self, token_path: str = 'google_token.pickle', refresh_margin: timedelta = timedelta(minutes=5)):
+        self.token_path = token_path
+        self.refresh_margin = refresh_margin
+        self._creds: Optional[Credentials] = None
+        self._rejected: Optional[Credentials] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
     
-    # Load existing token
-    if os.path.exists(token_path):
-        with open(token_path, 'rb') as token:
-            creds = pickle.load(token)
+    def get(self) -> Optional[Credentials]:
+        creds = self._creds
+        if creds is not None and creds.valid:
+            return creds
+        
+        with self._lock:
+            # Another thread may have loaded or refreshed them while we waited
+            previous = self._creds
+            if previous is None or not previous.valid:
+                self._creds = self._load()
+            creds = self._creds
+        
+        if creds is not previous:
+            # Imported here: google_clients imports this module
+            from tools.google_clients import reset_clients
+            reset_clients()
+        if creds is not None:
+            self._start_refresher()
+        return creds
     
-    # If there are no (valid) credentials available, let the user log in
-    if not creds or not creds.valid:
+    def invalidate(self, creds: Credentials) -> None:
+        """
+        Drop credentials Google refused to refresh (e.g. a revoked token);
+        the next get() re-authenticates instead of reusing them
+        """
+        with self._lock:
+            if self._creds is creds:
+                self._creds = None
+                self._rejected = creds
+    
+    def _load(self) -> Optional[Credentials]:
+        creds = self._creds
+        if creds is None and self._rejected is None and os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+        if creds is not None and creds.valid:
+            return creds
+        
         if creds and creds.expired and creds.refresh_token:
             try:
                 creds.refresh(Request())
-            except:
+                self._save(creds)
+                return creds
+            except Exception as e:
                 # If refresh fails, re-authenticate
-                creds = None
+                print(f"⚠️ Google token refresh failed: {e}")
         
-        if not creds:
-            credentials_path = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json')
-            if not os.path.exists(credentials_path):
-                print(f"❌ Google credentials file not found: {credentials_path}")
-                return None
-            
-            flow = InstalledAppFlow.from_client_secrets_file(
-                credentials_path, ALL_SCOPES)
-            
-            print("🔐 Opening browser for Google authentication...")
-            print("Please authorize access to Gmail AND Calendar")
-            creds = flow.run_local_server(port=0)
+        credentials_path = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json')
+        if not os.path.exists(credentials_path):
+            print(f"❌ Google credentials file not found: {credentials_path}")
+            return None
+        
+        flow = InstalledAppFlow.from_client_secrets_file(
+            credentials_path, ALL_SCOPES)
+        
+        print("🔐 Opening browser for Google authentication...")
+        print("Please authorize access to Gmail AND Calendar")
+        creds = flow.run_local_server(port=0)
         
         # Save the credentials for the next run
-        with open(token_path, 'wb') as token:
-            pickle.dump(creds, token)
+        self._save(creds)
+        self._rejected = None
         print("✅ Google authentication successful!")
+        return creds
+    
+    def _save(self, creds: Credentials) -> None:
+        # Write a temporary file next to the token and swap it in, so a crash
+        # mid-write never leaves a truncated token behind
+        directory = os.path.dirname(os.path.abspath(self.token_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.google_token.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as token:
+                pickle.dump(creds, token)
+                token.flush()
+                os.fsync(token.fileno())
+            os.replace(temp_path, self.token_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    def refresh(self) -> None:
+        """
+        Refresh the access token now and save it
+        """
+        with self._lock:
+            creds = self._creds
+            if creds is None or not creds.refresh_token:
+                return
+            # Refreshed in place: API clients holding these credentials pick up the new token
+            creds.refresh(Request())
+            self._save(creds)
     
-    return creds
\ No newline at end of file
+    def _seconds_until_refresh(self) -> float:
+        creds = self._creds
+        if creds is None or creds.expiry is None or not creds.refresh_token:
+            return self.refresh_margin.total_seconds()
+        # google-auth keeps expiry as naive UTC
+        due = creds.expiry - self.refresh_margin - datetime.utcnow()
+        return max(due.total_seconds(), 30.0)
+    
+    def _start_refresher(self) -> None:
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._stop.clear()
+                self._refresher = threading.Thread(target=self._refresh_loop, name="google-token-refresh", daemon=True)
+                self._refresher.start()
+    
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self._seconds_until_refresh()):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep the current token until it expires; a request may still refresh it
+                print(f"⚠️ Background Google token refresh failed: {e}")
+                self._stop.wait(60)
+    
+    def stop(self) -> None:
+        self._stop.set()
+
+credential_manager = CredentialManager()
+
+def get_google_credentials(scopes: Optional[List[str]] = None) -> Optional[Credentials]:
+    """
+    Get Google credentials with all necessary scopes, from memory once loaded
+    """
+    return credential_manager.get()
@@ -0,0 +1,77 @@
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+import httplib2
+from google.auth.exceptions import RefreshError
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import V2_DISCOVERY_URI, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from tools.google_auth import credential_manager, get_google_credentials
+
+# Parsed discovery documents are shared process-wide. Services wrap an
+# httplib2 connection, which is not thread-safe, so each thread builds its
+# own from the cached document and keeps it (and its keep-alive
+# connection) for later calls.
+_lock = threading.Lock()
+_documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_generation = 0
+_local = threading.local()
+
+def _discovery_document(api: str, version: str) -> Dict[str, Any]:
+    with _lock:
+        document = _documents.get((api, version))
+        if document is None:
+            content = get_static_doc(api, version)
+            if content is None:
+                # Not bundled with this client library version; fetch it once
+                response, content = httplib2.Http().request(V2_DISCOVERY_URI.format(api=api, apiVersion=version))
+                if response.status >= 400:
+                    raise RuntimeError(f"Could not fetch the {api} {version} discovery document: HTTP {response.status}")
+            document = _documents[(api, version)] = json.loads(content)
+        return document
+
+class _ManagedHttp(AuthorizedHttp):
+    """
+    AuthorizedHttp that hands credentials Google refuses to refresh back to
+    the credential manager, so the next get_service() re-authenticates
+    """
+    
+    def request(self, *args, **kwargs):
+        try:
+            return super().request(*args, **kwargs)
+        except RefreshError:
+            credential_manager.invalidate(self.credentials)
+            raise
+
+def get_service(api: str, version: str) -> Optional[Any]:
+    """
+    Google API client for this thread, built once per thread and reused
+    while the credentials stay the same object. Returns None when there are
+    no credentials.
+    """
+    # In-memory credentials, refreshed in place in the background
+    creds = get_google_credentials()
+    if not creds:
+        return None
+    
+    services = getattr(_local, "services", None)
+    if services is None or _local.generation != _generation:
+        services = _local.services = {}
+        _local.generation = _generation
+    
+    cached = services.get((api, version))
+    if cached is not None and cached[0] is creds:
+        return cached[1]
+    http = _ManagedHttp(creds, http=httplib2.Http())
+    service = build_from_document(_discovery_document(api, version), http=http)
+    services[(api, version)] = (creds, service)
+    return service
+
+def reset_clients() -> None:
+    """
+    Drop the services of every thread, e.g. after re-authenticating; each
+    thread rebuilds its services on its next call
+    """
+    global _generation
+    with _lock:
+        _generation += 1
@@ -4,6 +4,7 @@ from typing import Type, Optional
 import os
 import requests
 from dotenv import load_dotenv
+from crew_pool import tool_started
 
 load_dotenv()
 
@@ -16,6 +17,7 @@ class WeatherTool(BaseTool):
     args_schema: Type[BaseModel] = WeatherInput
     
     def _run(self, location: str) -> str:
+        tool_started(self.name)
         try:
             # Check if Serper API key is available
             api_key = os.getenv('SERPER_API_KEY')